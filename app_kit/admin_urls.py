@@ -36,6 +36,7 @@ urlpatterns = [
     # BUILD APP
     path('build-app/<int:meta_app_id>/', views.BuildApp.as_view(), name='build_app'),
     path('build-app/<int:meta_app_id>/<str:action>/', views.BuildApp.as_view(), name='build_app'),
+    path('cancel-app-build/<int:meta_app_id>/', views.CancelAppBuild.as_view(), name='cancel_app_build'),
     # NEW APP VERSION
     path('start-new-app-version/<int:meta_app_id>/', views.StartNewAppVersion.as_view(),
          name='start_new_app_version'),
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import AppKitStatus, AppKitJobs
+from .models import AppKitStatus, AppKitJobs, AppKitTasks
 
 class AppKitStatusAdmin(admin.ModelAdmin):
     pass
@@ -11,4 +11,10 @@ admin.site.register(AppKitStatus, AppKitStatusAdmin)
 class AppKitJobsAdmin(admin.ModelAdmin):
     pass
 
-admin.site.register(AppKitJobs, AppKitJobsAdmin)
\ No newline at end of file
+admin.site.register(AppKitJobs, AppKitJobsAdmin)
+
+class AppKitTasksAdmin(admin.ModelAdmin):
+    list_display = ('tenant_schema_name', 'action', 'status', 'created_at', 'worker')
+    list_filter = ('status', 'action')
+
+admin.site.register(AppKitTasks, AppKitTasksAdmin)
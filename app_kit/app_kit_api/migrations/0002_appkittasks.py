@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:12
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_kit_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppKitTasks',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('tenant_schema_name', models.CharField(max_length=63)),
+                ('meta_app_uuid', models.UUIDField(null=True)),
+                ('action', models.CharField(choices=[('create_app_version', 'Create app version'), ('start_new_app_version', 'Start new app version'), ('validate', 'Validate'), ('build', 'Build'), ('zip_import', 'Zip import')], max_length=50)),
+                ('parameters', models.JSONField(null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('in_progress', 'In progress'), ('success', 'Success'), ('failed', 'Failed')], default='queued', max_length=50)),
+                ('progress', models.JSONField(null=True)),
+                ('result', models.JSONField(null=True)),
+                ('worker', models.CharField(max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='app_kit_tasks_status_idx')],
+            },
+        ),
+    ]
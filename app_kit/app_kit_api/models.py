@@ -78,3 +78,58 @@ class AppKitJobs(models.Model):
         unique_together = ('meta_app_uuid', 'app_version', 'platform', 'job_type')
 
 
+
+
+'''--------------------------------------------------------------------------------------------------------------
+    APP KIT TASKS
+    - long running tasks started in the web interface: creating app versions, validating, building and
+      zip imports
+    - executed by the worker processes of manage.py app_kit_worker, see app_kit_api.task_queue
+--------------------------------------------------------------------------------------------------------------'''
+TASK_ACTIONS = (
+    ('create_app_version', _('Create app version')),
+    ('start_new_app_version', _('Start new app version')),
+    ('validate', _('Validate')),
+    ('build', _('Build')),
+    ('zip_import', _('Zip import')),
+)
+
+
+TASK_STATUS = (
+    ('queued', _('Queued')),
+    ('in_progress', _('In progress')),
+    ('success', _('Success')),
+    ('failed', _('Failed')),
+)
+
+class AppKitTasks(models.Model):
+
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    tenant_schema_name = models.CharField(max_length=63)
+    meta_app_uuid = models.UUIDField(null=True)
+
+    action = models.CharField(max_length=50, choices=TASK_ACTIONS)
+    parameters = models.JSONField(null=True)
+
+    status = models.CharField(max_length=50, choices=TASK_STATUS, default='queued')
+
+    # the current step of a running task, e.g. the build phase
+    progress = models.JSONField(null=True)
+    result = models.JSONField(null=True)
+
+    # hostname:pid of the worker process
+    worker = models.CharField(max_length=255, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return '[{0}] {1} {2}'.format(self.tenant_schema_name, self.action, self.status)
+
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='app_kit_tasks_status_idx'),
+        ]
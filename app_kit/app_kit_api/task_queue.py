@@ -0,0 +1,379 @@
+'''--------------------------------------------------------------------------------------------------------------
+    TASK QUEUE
+    - the web interface only enqueues long running tasks (AppKitTasks), they are executed by the worker processes
+      of manage.py app_kit_worker
+    - tasks survive restarts of the web server
+    - tasks of a killed worker are handled when the worker restarts on the same host: validations are queued
+      again, all other tasks are not safe to repeat and fail. The in_progress state of the app or the locked
+      generic content is reset.
+    - an app has at most one open (queued or in_progress) task per action, except zip imports
+    - settings.APP_KIT_WORKER_TENANT_CONCURRENCY limits the number of tasks running at the same time per tenant,
+      tasks of the same app never run at the same time
+    - running tasks report their current step in AppKitTasks.progress
+--------------------------------------------------------------------------------------------------------------'''
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from django_tenants.utils import get_tenant_model
+
+from app_kit.app_kit_api.models import AppKitTasks
+
+import os, socket, shutil, traceback
+
+# key of the postgres advisory lock which serializes claiming tasks
+TASK_QUEUE_LOCK_ID = 7420315
+
+# tasks which are queued again if their worker has been killed
+REPEATABLE_ACTIONS = ['validate']
+
+# each upload is imported, all other actions are queued only once per app
+MULTIPLE_OPEN_ACTIONS = ['zip_import']
+
+
+def get_worker_name():
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+def get_tenant_concurrency():
+    return getattr(settings, 'APP_KIT_WORKER_TENANT_CONCURRENCY', 1)
+
+
+# the queued or running task of meta_app, or None
+def get_open_task(meta_app, actions):
+    return AppKitTasks.objects.filter(meta_app_uuid=meta_app.uuid, action__in=actions,
+                                      status__in=['queued', 'in_progress']).order_by('created_at', 'pk').first()
+
+
+# returns the open task of meta_app if the action is already queued or running
+def enqueue_task(tenant, action, meta_app=None, parameters=None):
+
+    if parameters is None:
+        parameters = {}
+
+    meta_app_uuid = None
+    if meta_app:
+        meta_app_uuid = meta_app.uuid
+
+    with transaction.atomic():
+
+        # two requests must not both find no open task
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TASK_QUEUE_LOCK_ID])
+
+        if meta_app and action not in MULTIPLE_OPEN_ACTIONS:
+            open_task = get_open_task(meta_app, [action])
+            if open_task:
+                return open_task
+
+        task = AppKitTasks(
+            tenant_schema_name=tenant.schema_name,
+            meta_app_uuid=meta_app_uuid,
+            action=action,
+            parameters=parameters,
+        )
+
+        task.save()
+
+    return task
+
+
+# removes the queued tasks of meta_app before a worker claims them, returns the number of removed tasks
+def cancel_queued_tasks(meta_app, action):
+
+    with transaction.atomic():
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TASK_QUEUE_LOCK_ID])
+
+        removed, removed_per_model = AppKitTasks.objects.filter(status='queued', meta_app_uuid=meta_app.uuid,
+                                                                action=action).delete()
+
+    return removed
+
+
+# returns the next task which may run, marked as in_progress, or None
+def claim_task(worker_name):
+
+    concurrency = get_tenant_concurrency()
+
+    with transaction.atomic():
+
+        # only one worker claims at a time, otherwise the limits could be exceeded
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TASK_QUEUE_LOCK_ID])
+
+        running_tasks = AppKitTasks.objects.filter(status='in_progress')
+
+        tenant_counts = running_tasks.values('tenant_schema_name').annotate(count=Count('pk'))
+        full_tenants = [row['tenant_schema_name'] for row in tenant_counts if row['count'] >= concurrency]
+
+        busy_meta_apps = running_tasks.exclude(meta_app_uuid=None).values_list('meta_app_uuid', flat=True)
+
+        task = AppKitTasks.objects.filter(status='queued').exclude(tenant_schema_name__in=full_tenants).exclude(
+            meta_app_uuid__in=list(busy_meta_apps)).order_by('created_at', 'pk').first()
+
+        if task:
+            task.status = 'in_progress'
+            task.worker = worker_name
+            task.started_at = timezone.now()
+            task.save(update_fields=['status', 'worker', 'started_at'])
+
+    return task
+
+
+# tasks of dead worker processes on this host are queued again or fail, returns (requeued, failed)
+def requeue_stale_tasks():
+
+    hostname = socket.gethostname()
+
+    requeued = []
+    failed = []
+
+    running_tasks = AppKitTasks.objects.filter(status='in_progress', worker__startswith='{0}:'.format(hostname))
+
+    for task in running_tasks:
+
+        pid = int(task.worker.split(':')[-1])
+
+        try:
+            os.kill(pid, 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            # the process exists
+            continue
+
+        reset_stale_task(task)
+
+        if task.action in REPEATABLE_ACTIONS:
+            task.status = 'queued'
+            task.worker = None
+            task.started_at = None
+            task.progress = None
+            task.save(update_fields=['status', 'worker', 'started_at', 'progress'])
+
+            requeued.append(task)
+
+        else:
+            task.status = 'failed'
+            task.result = {
+                'error' : 'The worker {0} has been terminated during the task'.format(task.worker),
+            }
+            task.finished_at = timezone.now()
+            task.save(update_fields=['status', 'result', 'finished_at'])
+
+            failed.append(task)
+
+    return requeued, failed
+
+
+# a killed task leaves the app or the generic content in its in_progress state
+def reset_stale_task(task):
+
+    tenant = get_tenant_model().objects.filter(schema_name=task.tenant_schema_name).first()
+    if not tenant:
+        return
+
+    connection.set_tenant(tenant)
+
+    try:
+        if task.action == 'zip_import':
+            parameters = task.parameters
+
+            content_type = ContentType.objects.get(pk=parameters['content_type_id'])
+            generic_content = content_type.model_class().objects.filter(
+                pk=parameters['generic_content_id']).first()
+
+            if generic_content:
+                generic_content.unlock()
+
+            shutil.rmtree(parameters['unzip_path'], ignore_errors=True)
+            shutil.rmtree(parameters['zip_destination_dir'], ignore_errors=True)
+
+        elif task.action in ['validate', 'build']:
+            # avoid circular imports, app_kit.models imports app_kit_api.models
+            from app_kit.models import MetaApp
+            meta_app = MetaApp.objects.filter(uuid=task.meta_app_uuid).first()
+
+            if meta_app and task.action == 'validate' and meta_app.validation_status == 'in_progress':
+                meta_app.validation_status = None
+                meta_app.is_locked = False
+                meta_app.save()
+
+            elif meta_app and task.action == 'build' and meta_app.build_status == 'in_progress':
+                meta_app.build_status = None
+                meta_app.is_locked = False
+                meta_app.save()
+                meta_app.unlock_generic_contents()
+
+    finally:
+        connection.set_schema_to_public()
+
+
+def set_progress(task, step):
+    task.progress = {
+        'step' : step,
+        'updated_at' : timezone.now().isoformat(),
+    }
+    task.save(update_fields=['progress'])
+
+
+def run_task(task):
+
+    tenant = get_tenant_model().objects.get(schema_name=task.tenant_schema_name)
+    connection.set_tenant(tenant)
+
+    task_method = TASK_METHODS[task.action]
+
+    try:
+        result = task_method(task)
+        task.status = 'success'
+        task.result = result
+
+    except Exception as e:
+        task.status = 'failed'
+        task.result = {
+            'error' : str(e),
+            'traceback' : traceback.format_exc(),
+        }
+
+    finally:
+        connection.set_schema_to_public()
+
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'result', 'finished_at'])
+
+    return task
+
+
+###################################################################################################################
+# TASKS
+# - run with the connection set to the tenant of the task
+###################################################################################################################
+
+def get_meta_app(task):
+    # avoid circular imports, app_kit.models imports app_kit_api.models
+    from app_kit.models import MetaApp
+    return MetaApp.objects.get(uuid=task.meta_app_uuid)
+
+
+def create_app_version(task):
+
+    meta_app = get_meta_app(task)
+
+    # create the version specific folder on disk
+    # fails if the version already exists
+    set_progress(task, 'create_app_version')
+    app_builder = meta_app.get_app_builder()
+    app_builder.create_app_version()
+
+    # create preview
+    set_progress(task, 'preview')
+    app_preview_builder = meta_app.get_preview_builder()
+    app_preview_builder.build()
+
+    return None
+
+
+def start_new_app_version(task):
+
+    meta_app = get_meta_app(task)
+
+    create_app_version(task)
+
+    app_builder = meta_app.get_app_builder()
+
+    delete_version = task.parameters['new_version'] - 2
+    while delete_version > 0:
+        app_builder.delete_app_version(delete_version)
+        delete_version = delete_version - 1
+
+    return None
+
+
+def validate(task):
+
+    meta_app = get_meta_app(task)
+
+    set_progress(task, 'validate')
+    app_release_builder = meta_app.get_release_builder()
+    validation_result = app_release_builder.validate()
+
+    # another validation is in progress or the validation failed, see meta_app.validation_status
+    if not validation_result:
+        return None
+
+    return {
+        'errors' : len(validation_result['errors']),
+        'warnings' : len(validation_result['warnings']),
+    }
+
+
+def build(task):
+
+    meta_app = get_meta_app(task)
+
+    app_release_builder = meta_app.get_release_builder()
+    app_release_builder.progress_callback = lambda step: set_progress(task, step)
+
+    build_report = app_release_builder.build()
+
+    return {
+        'result' : build_report['result'],
+    }
+
+
+def zip_import(task):
+
+    parameters = task.parameters
+
+    content_type = ContentType.objects.get(pk=parameters['content_type_id'])
+    generic_content = content_type.get_object_for_this_type(pk=parameters['generic_content_id'])
+    user = get_user_model().objects.get(pk=parameters['user_id'])
+
+    unzip_path = parameters['unzip_path']
+    zip_destination_dir = parameters['zip_destination_dir']
+
+    try:
+        set_progress(task, 'validate')
+        zip_importer = generic_content.zip_import_class(user, generic_content, unzip_path,
+            ignore_nonexistent_images=parameters['ignore_nonexistent_images'])
+        zip_is_valid = zip_importer.validate()
+
+        if zip_is_valid == True:
+            set_progress(task, 'import')
+            zip_importer.import_generic_content()
+
+        # store errors in generic_content.messages
+        generic_content.messages['last_zip_import_errors'] = [str(error) for error in zip_importer.errors]
+
+    except Exception as e:
+        generic_content.messages['last_zip_import_errors'] = [str(e)]
+        raise e
+
+    finally:
+        # unlock saves messages
+        generic_content.unlock()
+
+        # remove zipfile and unzipped
+        shutil.rmtree(unzip_path, ignore_errors=True)
+        shutil.rmtree(zip_destination_dir, ignore_errors=True)
+
+    return {
+        'valid' : zip_is_valid,
+        'errors' : len(zip_importer.errors),
+    }
+
+
+TASK_METHODS = {
+    'create_app_version' : create_app_version,
+    'start_new_app_version' : start_new_app_version,
+    'validate' : validate,
+    'build' : build,
+    'zip_import' : zip_import,
+}
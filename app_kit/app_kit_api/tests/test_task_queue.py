@@ -0,0 +1,149 @@
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+from django.db import connection
+
+from app_kit.tests.common import test_settings
+from app_kit.tests.mixins import WithMetaApp
+
+from app_kit.app_kit_api.models import AppKitTasks
+from app_kit.app_kit_api.task_queue import (enqueue_task, claim_task, run_task, requeue_stale_tasks, set_progress,
+                                            get_worker_name, get_open_task)
+
+import socket
+
+
+class TestTaskQueue(WithMetaApp, TenantTestCase):
+
+    @test_settings
+    def test_enqueue_task(self):
+
+        task = enqueue_task(self.tenant, 'validate', meta_app=self.meta_app)
+
+        self.assertEqual(task.status, 'queued')
+        self.assertEqual(task.tenant_schema_name, self.tenant.schema_name)
+        self.assertEqual(task.meta_app_uuid, self.meta_app.uuid)
+        self.assertEqual(task.parameters, {})
+
+
+    @test_settings
+    def test_enqueue_open_task(self):
+
+        task = enqueue_task(self.tenant, 'build', meta_app=self.meta_app)
+
+        # the build is already queued
+        self.assertEqual(enqueue_task(self.tenant, 'build', meta_app=self.meta_app), task)
+        self.assertEqual(get_open_task(self.meta_app, ['build']), task)
+
+        task = claim_task('test:1')
+        self.assertEqual(enqueue_task(self.tenant, 'build', meta_app=self.meta_app), task)
+
+        task.status = 'success'
+        task.save()
+
+        self.assertIsNone(get_open_task(self.meta_app, ['build']))
+        self.assertNotEqual(enqueue_task(self.tenant, 'build', meta_app=self.meta_app), task)
+
+
+    @test_settings
+    def test_claim_task(self):
+
+        first_task = enqueue_task(self.tenant, 'validate', meta_app=self.meta_app)
+        second_task = enqueue_task(self.tenant, 'build', meta_app=self.meta_app)
+
+        task = claim_task('test:1')
+        self.assertEqual(task, first_task)
+        self.assertEqual(task.status, 'in_progress')
+        self.assertEqual(task.worker, 'test:1')
+
+        # the tenant limit is reached
+        self.assertIsNone(claim_task('test:2'))
+
+        with override_settings(APP_KIT_WORKER_TENANT_CONCURRENCY=2):
+            # the app is busy
+            self.assertIsNone(claim_task('test:2'))
+
+        task.status = 'success'
+        task.save()
+
+        self.assertEqual(claim_task('test:2'), second_task)
+
+
+    @test_settings
+    def test_requeue_stale_tasks(self):
+
+        task = enqueue_task(self.tenant, 'validate', meta_app=self.meta_app)
+        task = claim_task(get_worker_name())
+
+        # the worker of this test is alive
+        self.assertEqual(requeue_stale_tasks(), ([], []))
+
+        # pids are never this large
+        task.worker = '{0}:{1}'.format(socket.gethostname(), 2**30)
+        task.save()
+
+        self.assertEqual(requeue_stale_tasks(), ([task], []))
+        connection.set_tenant(self.tenant)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'queued')
+        self.assertIsNone(task.worker)
+
+
+    @test_settings
+    def test_fail_stale_build(self):
+
+        self.meta_app.build_status = 'in_progress'
+        self.meta_app.is_locked = True
+        self.meta_app.save()
+
+        task = enqueue_task(self.tenant, 'build', meta_app=self.meta_app)
+        task = claim_task('{0}:{1}'.format(socket.gethostname(), 2**30))
+
+        # a half finished build is not repeated
+        self.assertEqual(requeue_stale_tasks(), ([], [task]))
+        connection.set_tenant(self.tenant)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+        self.assertIn('error', task.result)
+        self.assertIsNotNone(task.finished_at)
+
+        self.meta_app.refresh_from_db()
+        self.assertIsNone(self.meta_app.build_status)
+        self.assertFalse(self.meta_app.is_locked)
+
+
+    @test_settings
+    def test_set_progress(self):
+
+        task = enqueue_task(self.tenant, 'build', meta_app=self.meta_app)
+        set_progress(task, 'common_www')
+
+        task.refresh_from_db()
+        self.assertEqual(task.progress['step'], 'common_www')
+
+
+    @test_settings
+    def test_run_task(self):
+
+        task = enqueue_task(self.tenant, 'validate', meta_app=self.meta_app)
+        task = claim_task('test:1')
+
+        run_task(task)
+        connection.set_tenant(self.tenant)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'success')
+        self.assertIsNotNone(task.finished_at)
+
+        # unknown apps fail
+        task = enqueue_task(self.tenant, 'validate', meta_app=self.meta_app)
+        task.meta_app_uuid = '00000000-0000-0000-0000-000000000000'
+        task.save()
+
+        run_task(task)
+        connection.set_tenant(self.tenant)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+        self.assertIn('error', task.result)
@@ -75,6 +75,8 @@ from app_kit.features.frontend.models import Frontend
 
 from localcosmos_cordova_builder import MetaAppDefinition, CordovaAppBuilder
 
+from app_kit.appbuilder.FrontendStaging import FrontendStaging
+
 import logging, os, json, shutil, traceback, inspect, threading
 
 # getting app specific API
@@ -531,6 +533,21 @@ class AppBuilderBase:
         filename = '{0}.zip'.format(self.meta_app.name)
         return os.path.join(self._build_packages_path, filename)
 
+    # archives of the previous build, ZipArchiver reuses their unchanged entries
+    # lies outside the builder path, which is deleted at the beginning of each build
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/{meta_app.current_version}/previous_archives/{release|preview}/
+    @property
+    def _previous_archives_path(self):
+        return os.path.join(self._app_version_root_path, 'previous_archives', self._builder_identifier)
+
+    @property
+    def _previous_browser_zip_filepath(self):
+        return os.path.join(self._previous_archives_path, 'browser.zip')
+
+    @property
+    def _previous_build_jobs_zipfile_filepath(self):
+        return os.path.join(self._previous_archives_path, 'build_jobs.zip')
+
     # {settings.APP_KIT_ROOT}/{meta_app.uuid}/{meta_app.current_version}/{release|preview}/cordova/
     @property
     def _cordova_build_path(self):
@@ -708,8 +725,9 @@ class AppBuilderBase:
     # building the frontend has to be possible on both AppPreviewBuilder (for TemplateContent preview) and AppReleaseBuilder
     def _build_Frontend(self):
 
-        # copy the frontends www folder to /preview
-        shutil.copytree(self._frontend_www_path, self._app_www_path, dirs_exist_ok=True)
+        # copy or link the frontends www folder to /preview, see FrontendStaging
+        frontend_staging = FrontendStaging(self._frontend_www_path, self._app_www_path)
+        self.frontend_staging_report = frontend_staging.stage()
 
         if not os.path.isdir(self._app_build_sources_cordova_assets_path):
             os.makedirs(self._app_build_sources_cordova_assets_path)
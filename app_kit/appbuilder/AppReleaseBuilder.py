@@ -23,9 +23,21 @@ from urllib import request
 from urllib.error import HTTPError, URLError
 
 from app_kit.appbuilder.ContentImageBuilder import ContentImageBuilder
+from app_kit.appbuilder.BuildCache import FeatureBuildCache
+from app_kit.appbuilder.FeatureBuildScheduler import FeatureBuildScheduler
+from app_kit.appbuilder.BuildProfiler import BuildProfiler
+from app_kit.appbuilder.JSONWriter import JSONWriter
+from app_kit.appbuilder.BuildContext import BuildContext
+from app_kit.appbuilder.LocaleStore import LocaleStore
+from app_kit.appbuilder.TaxonProfilePacks import TaxonProfilePackWriter
+from app_kit.appbuilder.ZipArchiver import ZipArchiver
+from app_kit.appbuilder.ValidationCache import FeatureValidationCache
+from app_kit.appbuilder.DeltaPackage import DeltaPackageBuilder
+from app_kit.appbuilder.ContentManifest import ContentManifest
 
 ### FEATURES
-from app_kit.features.nature_guides.models import NatureGuide, NatureGuidesTaxonTree, MatrixFilter, MetaNode
+from app_kit.features.nature_guides.models import (NatureGuide, NatureGuidesTaxonTree, MatrixFilter, MetaNode,
+                                                  MatrixFilterSpace, NatureGuideCrosslinks)
 from app_kit.features.generic_forms.models import (GenericForm, GenericFieldToGenericForm, FIELD_ROLES,
                                                        GenericValues, DJANGO_FIELD_CLASSES)
 
@@ -38,6 +50,8 @@ from app_kit.features.maps.models import Map, MapTaxonomicFilter
 from app_kit.appbuilder.JSONBuilders.NatureGuideJSONBuilder import NatureGuideJSONBuilder
 from app_kit.appbuilder.JSONBuilders.TemplateContentJSONBuilder import TemplateContentJSONBuilder
 from app_kit.appbuilder.TaxonBuilder import TaxaBuilder
+from app_kit.appbuilder.BuildCheckpoints import BuildCheckpoints, BuildCancelled
+from app_kit.appbuilder.BuildStorage import BuildStorage
 
 from localcosmos_server.template_content.models import TemplateContent, Navigation
 
@@ -54,13 +68,14 @@ from app_kit.generic_content_validation import ValidationError, ValidationWarnin
 from localcosmos_cordova_builder import MetaAppDefinition, CordovaAppBuilder
 from localcosmos_cordova_builder.required_assets import REQUIRED_ASSETS
 
-import os, json, base64, time, shutil, hashlib, zipfile
+import os, json, base64, time, shutil, hashlib
 
 from PIL import Image, ImageFile
 ImageFile.LOAD_TRUNCATED_IMAGES = settings.APP_KIT_LOAD_TRUNCATED_IMAGES
 
 # jobs
 from app_kit.app_kit_api.models import AppKitJobs
+from app_kit.app_kit_api.task_queue import cancel_queued_tasks
 
 import csv, uuid
 
@@ -88,6 +103,37 @@ class AppReleaseBuilder(AppBuilderBase):
         self.primary_vernacular_names = {}
         
         self.content_image_builder = ContentImageBuilder(self._app_content_images_cache_path)
+        self.feature_build_cache = None
+        self.feature_build_scheduler = None
+        self.build_profiler = BuildProfiler(self)
+        self.json_writer = JSONWriter()
+
+        # tables read per taxon, loaded once
+        self.build_context = BuildContext(meta_app)
+
+        # locale files of the built app, parsed once
+        self.locale_store = LocaleStore()
+
+        # called with the name of each top level build phase, e.g. by the task queue
+        self.progress_callback = None
+
+        # checkpoints and cancel flag of build()
+        self.build_checkpoints = None
+
+        # the search indices of BackboneTaxonomy are written item by item, set by BuildProfiler if the RSS of the
+        # build exceeds settings.APP_KIT_BUILD_MAX_RSS
+        # taxon profiles are not streamed, their registries are sorted over all taxa
+        self.streaming_output = False
+
+        # worker processes of FeatureBuildScheduler write into their own www folder
+        self.worker_www_path = None
+
+
+    @property
+    def _app_www_path(self):
+        if self.worker_www_path:
+            return self.worker_www_path
+        return super()._app_www_path
 
 
     @property
@@ -386,29 +432,17 @@ class AppReleaseBuilder(AppBuilderBase):
 
                 # iterate over all content and validate it
                 feature_links = MetaAppGenericContent.objects.filter(meta_app=self.meta_app)
+                published_feature_links = [feature_link for feature_link in feature_links
+                                           if feature_link.publication_status == 'publish']
 
-                for feature_link in feature_links:
-
-                    if feature_link.publication_status != 'publish':
-                        continue
-
-                    generic_content = feature_link.generic_content
-
-                    validation_method_name = 'validate_{0}'.format(generic_content.__class__.__name__)
-                    if not hasattr(self, validation_method_name):
-                        raise NotImplementedError('AppBuilder is missing the validation method {0}.'.format(validation_method_name))
-
-                    ValidationMethod = getattr(self, validation_method_name)
-                    feature_result = ValidationMethod(generic_content)
+                # unchanged features are not validated again if settings.APP_KIT_VALIDATION_CACHE is True
+                feature_validation_cache = FeatureValidationCache(self)
+                feature_results = feature_validation_cache.validate(published_feature_links)
 
+                for feature_result in feature_results:
                     result['errors'] += feature_result['errors']
                     result['warnings'] += feature_result['warnings']
 
-                    # validate options
-                    options_result = self.validate_options(generic_content)
-                    result['warnings'] += options_result['warnings']
-                    result['errors'] += options_result['errors']
-
                 template_content_result = self.validate_TemplateContent()
                 result['errors'] += template_content_result['errors']
                 result['warnings'] += template_content_result['warnings']
@@ -427,6 +461,7 @@ class AppReleaseBuilder(AppBuilderBase):
                     'errors' : [error.dump() for error in result['errors']],
                     'warnings' : [warning.dump() for warning in result['warnings']],
                     'finished_at' : int(time.time()),
+                    'cache' : feature_validation_cache.get_report(),
                 }
 
                 self.meta_app.validation_status = validation_result
@@ -466,6 +501,24 @@ class AppReleaseBuilder(AppBuilderBase):
         return None
     
 
+    # validates a published feature and its options
+    def _validate_feature(self, generic_content):
+
+        validation_method_name = 'validate_{0}'.format(generic_content.__class__.__name__)
+        if not hasattr(self, validation_method_name):
+            raise NotImplementedError('AppBuilder is missing the validation method {0}.'.format(validation_method_name))
+
+        ValidationMethod = getattr(self, validation_method_name)
+        result = ValidationMethod(generic_content)
+
+        # validate options
+        options_result = self.validate_options(generic_content)
+        result['warnings'] += options_result['warnings']
+        result['errors'] += options_result['errors']
+
+        return result
+
+
     ######################################################################################################
     #    - validate if the app is not empty
     #    - validate if LC private if the user runs LCPrivate
@@ -838,10 +891,31 @@ class AppReleaseBuilder(AppBuilderBase):
                 result['errors'].append(error)
 
 
+        # the tree is read with a few queries instead of several queries per node
+        meta_node_content_type = ContentType.objects.get_for_model(MetaNode)
+        meta_node_ids_with_image = set(ContentImage.objects.filter(content_type=meta_node_content_type,
+            object_id__in=MetaNode.objects.filter(nature_guide=nature_guide).values('pk'),
+            image_type='image').values_list('object_id', flat=True))
+
+        # tree children have the nuid of the parent plus 3 characters, crosslinked children are not in the branch
+        parent_nuids_with_children = set([taxon_nuid[:-3] for taxon_nuid in NatureGuidesTaxonTree.objects.filter(
+            nature_guide=nature_guide).values_list('taxon_nuid', flat=True)])
+        parent_ids_with_crosslinks = set(NatureGuideCrosslinks.objects.filter(
+            parent__nature_guide=nature_guide).values_list('parent_id', flat=True))
+
+        matrix_filters_by_meta_node = {}
+        for matrix_filter in MatrixFilter.objects.filter(meta_node__nature_guide=nature_guide).order_by(
+            'meta_node_id', 'position', 'pk'):
+            matrix_filters_by_meta_node.setdefault(matrix_filter.meta_node_id, []).append(matrix_filter)
+
+        matrix_filter_ids_with_space = set(MatrixFilterSpace.objects.filter(
+            matrix_filter__meta_node__nature_guide=nature_guide).values_list('matrix_filter_id', flat=True))
+
         nodes = NatureGuidesTaxonTree.objects.filter(nature_guide=nature_guide,
-                                                     meta_node__node_type__in=['node', 'root']).order_by('taxon_nuid')
+            meta_node__node_type__in=['node', 'root']).select_related('meta_node').order_by('taxon_nuid')
 
-        inactive_branch_nuids = []
+        # parents come before their children, a node is inactive if any of its ancestors is inactive
+        inactive_branch_nuids = set([])
         
         for parent in nodes:
 
@@ -851,27 +925,26 @@ class AppReleaseBuilder(AppBuilderBase):
                 is_active = parent.additional_data.get('is_active', True)
 
             if is_active == True:
-                for inactive_taxon_nuid in inactive_branch_nuids:
-                    if parent.taxon_nuid.startswith(inactive_taxon_nuid):
+                for nuid_length in range(3, len(parent.taxon_nuid), 3):
+                    if parent.taxon_nuid[:nuid_length] in inactive_branch_nuids:
                         is_active = False
                         break
             
             if is_active == False:
-                inactive_branch_nuids.append(parent.taxon_nuid)
+                inactive_branch_nuids.add(parent.taxon_nuid)
                 continue
 
             # check for image, except for the start node
             if not parent.meta_node.node_type == 'root':
-                image = parent.meta_node.image()
-                if not image:
+                if parent.meta_node_id not in meta_node_ids_with_image:
                     warning_message = _('Image is missing.')
                     warning = ValidationWarning(nature_guide, parent, [warning_message])
                     result['warnings'].append(warning)
             
             
-            children = parent.children
+            has_children = parent.taxon_nuid in parent_nuids_with_children or parent.pk in parent_ids_with_crosslinks
             
-            if not children:
+            if not has_children:
 
                 if parent.meta_node.node_type == 'root':
                     error_message = _('The nature guide is empty.')
@@ -884,7 +957,7 @@ class AppReleaseBuilder(AppBuilderBase):
 
 
             # iterate over all filters
-            matrix_filters = MatrixFilter.objects.filter(meta_node=parent.meta_node)
+            matrix_filters = matrix_filters_by_meta_node.get(parent.meta_node_id, [])
 
             for matrix_filter in matrix_filters:
 
@@ -892,9 +965,7 @@ class AppReleaseBuilder(AppBuilderBase):
                     continue
 
                 # check if the matrix_filter does have a space assigned
-                space = matrix_filter.get_space()
-
-                if space:
+                if matrix_filter.pk in matrix_filter_ids_with_space:
                     # future: check if the space makes sense
                     pass
                 else:
@@ -904,7 +975,7 @@ class AppReleaseBuilder(AppBuilderBase):
                     
 
         ng_results = NatureGuidesTaxonTree.objects.filter(nature_guide=nature_guide,
-                                                          meta_node__node_type='result')
+                                                          meta_node__node_type='result').select_related('meta_node')
         
         for ng_result in ng_results:
 
@@ -916,8 +987,7 @@ class AppReleaseBuilder(AppBuilderBase):
             if is_active == False:
                 continue
             
-            image = ng_result.meta_node.image()
-            if not image:
+            if ng_result.meta_node_id not in meta_node_ids_with_image:
                 warning_message = _('Image is missing.')
                 warning = ValidationWarning(nature_guide, ng_result, [warning_message])
                 result['warnings'].append(warning)
@@ -1144,16 +1214,25 @@ class AppReleaseBuilder(AppBuilderBase):
     ###############################################################################################################
     def build(self):
 
+        # resume an interrupted build of this version if settings.APP_KIT_RESUMABLE_BUILDS is True
+        self.build_checkpoints = BuildCheckpoints(self)
+        resume_build = self.build_checkpoints.load()
+
+        # a build which has been killed leaves its cancel flag behind
+        self.build_checkpoints.clear_cancel()
+
         # LOCK app an features
         self.meta_app.is_locked = True
         self.meta_app.build_status = 'in_progress'
 
-        # update build #
-        if not self.meta_app.build_number:
-            self.meta_app.build_number = 1
+        # update build #, a resumed build keeps the build number of the interrupted build
+        if resume_build == False:
 
-        else:
-            self.meta_app.build_number = self.meta_app.build_number + 1
+            if not self.meta_app.build_number:
+                self.meta_app.build_number = 1
+
+            else:
+                self.meta_app.build_number = self.meta_app.build_number + 1
 
         self.meta_app.save()
         self.meta_app.lock_generic_contents()
@@ -1167,10 +1246,16 @@ class AppReleaseBuilder(AppBuilderBase):
 
         success = True
         app_is_valid = True
+        cancelled = False
         
         build_report = self.get_empty_result()
         build_report['result'] = 'success'
 
+        # per phase timings, queries, written files and memory
+        self.streaming_output = False
+        self.build_profiler = BuildProfiler(self)
+        self.build_profiler.start()
+
         try:
             
             # SECURITY CHECK
@@ -1180,7 +1265,8 @@ class AppReleaseBuilder(AppBuilderBase):
             
 
             # check if the app is valid
-            validation_result = self.validate()
+            with self.build_profiler.phase('validate'):
+                validation_result = self.validate()
 
             # do not attempt to build an invalid app
             if not validation_result:
@@ -1209,63 +1295,74 @@ class AppReleaseBuilder(AppBuilderBase):
 
                 raise AppBuildFailed(msg)
             
-            # builders with cache that are required across building components
-            self.taxa_builder = TaxaBuilder(self)
-
-            # imageFilename : { "creator":"", "licence":"", "licence_link":""}
-            # will be filled by build_* methods
-            self.licence_registry = {
-                'licences' : {},
-            }
-            
-            # cache taxon slugs
-            self.taxon_slugs = {
-                'taxon_latname' : {},
-                'vernacular' : {},
-            }
+            # a resumed build keeps the builder path
+            if resume_build == True:
+                self.logger.info('Resuming build, skipping the completed phases {0}'.format(
+                    ','.join(self.build_checkpoints.report['skipped'])))
+                self._prepare_resumed_build()
+            else:
+                self.build_checkpoints.start()
+                self._prepare_build()
 
-            # make the settings available to all methods
-            # settings will be filled by build_* methods
-            self.app_settings = self._get_app_settings(preview=False)
+            # build_common_www has to come first, the www folder is complete after the images have been rendered
+            build_report.update(self._build_phase('www', self._build_www, [self._app_build_sources_path],
+                                                  profile=False))
 
-            self.build_features = {}
-            self.aggregated_node_filter_space_cache = {}
-            self.inactivated_nuids = set([])
-            
-            # 
-            
-            # create build folder
-            # {settings.APP_KIT_ROOT}/{meta_app.uuid}/{meta_app.current_version}/release/common/www/
-            # a build of a specific version always kills the previous build
-            self.logger.info('deleting and recreating {0}'.format(self._app_builder_path))
-            self.deletecreate_folder(self._app_builder_path)
+            cordova_builder = self.get_cordova_builder()
+            browser_outputs = [cordova_builder._browser_built_www_path, self._build_packages_path]
 
-            # build_common_www has to come first
-            self._build_common_www()
+            # build browser app
+            self._build_phase('browser', self._build_browser, browser_outputs)
 
-            # build app assets
-            self._build_app_assets()
+            # json sizes, .gz and .br siblings of the served browser app if settings.APP_KIT_PRECOMPRESS_JSON,
+            # skipped if neither settings.APP_KIT_MINIFY_JSON nor settings.APP_KIT_PRECOMPRESS_JSON is set
+            build_report['json'] = self._build_phase('compress_json',
+                lambda: self.json_writer.compress_folder(self._review_browser_served_www_path), browser_outputs)
 
-            # build browser app
-            self._build_browser()
+            # content manifest and delta package, both are computed from the same hashes
+            build_report.update(self._build_phase('manifests', self._build_manifests, browser_outputs,
+                                                  profile=False))
 
             # build ios, done on a mac
             if 'ios' in settings.APP_KIT_SUPPORTED_PLATFORMS and 'ios' in self.meta_app.build_settings['platforms']:
-                self._create_ios_build_job()
+                self._build_phase('ios_build_job', self._create_ios_build_job, [self._app_build_jobs_path])
 
             # build android
             if 'android' in self.meta_app.build_settings['platforms']:
-                self._build_android()
+                self._build_phase('android', self._build_android, [self._review_android_served_path])
 
-            # empty image cache
-            self.content_image_builder.clean_on_disk_cache()
+            self.check_cancelled(force=True)
+
+            # evict from the shared image cache
+            with self.build_profiler.phase('image_cache'):
+                self.content_image_builder.remove_on_disk_cache()
+                build_report['image_cache'] = self.content_image_builder.shared_image_cache.maintain()
+
+            # a successful build is never resumed
+            self.build_checkpoints.clear()
+            build_report['checkpoints'] = self.build_checkpoints.get_report()
+
+        except BuildCancelled as e:
+            success = False
+            cancelled = True
+            self.logger.info(str(e))
+
+            if self.feature_build_cache:
+                self.feature_build_cache.discard()
+
+            build_report['result'] = 'cancelled'
+            build_report['checkpoints'] = self.build_checkpoints.get_report()
 
         
         except Exception as e:
             success = False
             self.logger.error(e, exc_info=True)
 
+            if self.feature_build_cache:
+                self.feature_build_cache.discard()
+
             build_report['result'] = 'failure'
+            build_report['checkpoints'] = self.build_checkpoints.get_report()
             
             # send email! only if app building failed and validation was successful
             if app_is_valid == True:
@@ -1276,19 +1373,38 @@ class AppReleaseBuilder(AppBuilderBase):
                 except Exception as emailException:
                     pass
 
+        self.build_checkpoints.clear_cancel()
+
+        # retention and deduplication of the version folders if settings.APP_KIT_MAINTAIN_BUILD_STORAGE
+        if success == True and BuildStorage.is_enabled():
+            try:
+                with self.build_profiler.phase('build_storage'):
+                    build_report['storage'] = BuildStorage(self).maintain()
+            except Exception as e:
+                self.logger.error('Failed to maintain the build storage', exc_info=True)
+
         # LOCK app an features
         self.meta_app.is_locked = False
         if success == True:
             self.meta_app.build_status = 'passing'
         else:
 
-            if app_is_valid == True:
+            if app_is_valid == True and cancelled == False:
                 self.meta_app.build_status = 'failing'
             else:
-                # no build has been performed
+                # no build has been performed, or the build has been cancelled
                 self.meta_app.build_status = None
                 
         build_report['finished_at'] = int(time.time())
+
+        try:
+            self.build_profiler.finish()
+        except Exception as e:
+            self.logger.error('Failed to save the build profile', exc_info=True)
+
+        build_report['phases'] = self.build_profiler.get_report()
+        build_report['memory'] = self.build_profiler.get_memory_report()
+
         self.meta_app.last_build_report = build_report
         
         
@@ -1303,6 +1419,165 @@ class AppReleaseBuilder(AppBuilderBase):
         return build_report
 
     
+    # resets the state which is filled by the _build_* methods and recreates the build folder
+    # also used by BuildBenchmark, which runs the phases of build() without building the platforms
+    def _prepare_build(self):
+
+        # builders with cache that are required across building components
+        self.build_context = BuildContext(self.meta_app)
+        self.locale_store = LocaleStore()
+        self.taxa_builder = TaxaBuilder(self)
+
+        # imageFilename : { "creator":"", "licence":"", "licence_link":""}
+        # will be filled by build_* methods
+        self.licence_registry = {
+            'licences' : {},
+        }
+        self.content_image_builder.reset_licences()
+
+        # the hashes of the written json files are reused by the content manifest
+        self.json_writer.written_files = None
+        if ContentManifest.is_enabled() or DeltaPackageBuilder.is_enabled():
+            self.json_writer.record_written_files()
+
+        # cache taxon slugs
+        self.taxon_slugs = {
+            'taxon_latname' : {},
+            'vernacular' : {},
+        }
+
+        # make the settings available to all methods
+        # settings will be filled by build_* methods
+        self.app_settings = self._get_app_settings(preview=False)
+
+        self.build_features = {}
+        self.aggregated_node_filter_space_cache = {}
+        self.inactivated_nuids = set([])
+
+        # images are rendered in parallel before the browser app is built
+        image_processes = getattr(settings, 'APP_KIT_IMAGE_PROCESSES', 1)
+        if image_processes > 1:
+            self.content_image_builder.defer_image_processing()
+
+        # reuses the output of unchanged features if settings.APP_KIT_INCREMENTAL_BUILDS is True
+        self.feature_build_cache = FeatureBuildCache(self)
+        self.feature_build_cache.prepare()
+
+        # the zipfiles of the previous build are reused by ZipArchiver
+        self._keep_previous_archives()
+
+        # create build folder
+        # {settings.APP_KIT_ROOT}/{meta_app.uuid}/{meta_app.current_version}/release/common/www/
+        # a build of a specific version always kills the previous build
+        self.logger.info('deleting and recreating {0}'.format(self._app_builder_path))
+        self.deletecreate_folder(self._app_builder_path)
+
+
+    # a resumed build keeps the builder path and skips at least the www phase, the state filled while building
+    # the www folder is not restored:
+    # - the content manifest hashes all files, the hashes recorded by JSONWriter are lost
+    def _prepare_resumed_build(self):
+
+        self.json_writer.written_files = None
+
+        self.content_image_builder.image_cache = {}
+        self.content_image_builder.reset_image_report()
+
+
+    # runs a top level phase of build() and records it as completed
+    # a resumed build skips the phases completed by the interrupted build and returns their stored report
+    def _build_phase(self, name, build_method, outputs, profile=True):
+
+        self.check_cancelled(force=True)
+
+        if self.build_checkpoints.is_completed(name):
+            self.logger.info('Skipping completed phase {0}'.format(name))
+            return self.build_checkpoints.get_phase_report(name)
+
+        if profile == True:
+            with self.build_profiler.phase(name):
+                report = build_method()
+        else:
+            report = build_method()
+
+        self.build_checkpoints.complete(name, outputs, report=report)
+
+        return report
+
+
+    # common www, app assets and images, the images are queued while building the common www
+    def _build_www(self):
+
+        image_processes = getattr(settings, 'APP_KIT_IMAGE_PROCESSES', 1)
+
+        with self.build_profiler.phase('common_www'):
+            self._build_common_www()
+
+        self.check_cancelled(force=True)
+
+        # build app assets
+        with self.build_profiler.phase('app_assets'):
+            self._build_app_assets()
+
+        self.check_cancelled(force=True)
+
+        # render all queued images, the www folder is complete afterwards
+        self.logger.info('Rendering images')
+        with self.build_profiler.phase('images', processes=image_processes):
+            self.content_image_builder.process_image_jobs(processes=image_processes)
+
+        # the records match the complete www folder and can be reused even if a later phase fails
+        self.feature_build_cache.finish()
+
+        report = {
+            'frontend_staging' : self.frontend_staging_report,
+            'images' : self.content_image_builder.image_report,
+            'incremental' : self.feature_build_cache.get_report(),
+            'parallel' : self.feature_build_scheduler.get_report(),
+        }
+
+        return report
+
+
+    # content hashes of the browser app if settings.APP_KIT_CONTENT_MANIFEST, also used by delta packages
+    # changes since the published version if settings.APP_KIT_DELTA_PACKAGES
+    def _build_manifests(self):
+
+        report = {}
+
+        content_manifest = None
+        if ContentManifest.is_enabled() or DeltaPackageBuilder.is_enabled():
+            with self.build_profiler.phase('content_manifest'):
+                content_manifest = self._build_content_manifest()
+            report['manifest'] = content_manifest.get_report()
+
+        if DeltaPackageBuilder.is_enabled():
+            with self.build_profiler.phase('delta_package'):
+                report['delta'] = self._build_delta_package(content_manifest.files)
+
+        return report
+
+
+    # raises BuildCancelled if the build has been cancelled, see BuildCheckpoints
+    def check_cancelled(self, force=False):
+        if self.build_checkpoints:
+            self.build_checkpoints.check_cancelled(force=force)
+
+
+    # a queued build task is removed, the running build stops at the next check of the cancel flag
+    # returns 'dequeued', 'requested' or None if there is no build to cancel
+    def cancel_build(self):
+
+        if cancel_queued_tasks(self.meta_app, 'build') > 0:
+            return 'dequeued'
+
+        if self.meta_app.build_status == 'in_progress':
+            BuildCheckpoints(self).request_cancel()
+            return 'requested'
+
+        return None
+
+
     ###############################################################################################################
     # BUILDING COMMON WWW
     # - www folder with the contents that all app builds (we, android, ios) use
@@ -1317,17 +1592,23 @@ class AppReleaseBuilder(AppBuilderBase):
         # build the frontend first
         self.logger.info('Building the Frontend')
         frontend_content_type = ContentType.objects.get_for_model(Frontend)
-        self._build_Frontend()
+        with self.build_profiler.phase('Frontend'):
+            self._build_Frontend()
         self.logger.info('Done.')
 
         ### BUILDING LOCALES ###
         # the translations are already complete
         self.logger.info('Building locales {0}'.format(','.join(self.meta_app.languages())))
-        self._build_locales()
+        with self.build_profiler.phase('locales'):
+            self._build_locales()
         self.logger.info('Done.')
 
         # build the glossary first in case a generic_content_json needs hard coded localized texts
         # instead of i18next keys
+        # FeatureBuildScheduler builds the glossary and the backbone taxonomy first, independent features run in
+        # parallel if settings.APP_KIT_BUILD_PROCESSES > 1
+        feature_links = []
+
         glossary_content_type = ContentType.objects.get_for_model(Glossary)
         # there is only 1 glossary per app
         glossary_link = MetaAppGenericContent.objects.filter(meta_app=self.meta_app,
@@ -1338,7 +1619,7 @@ class AppReleaseBuilder(AppBuilderBase):
                                                  glossary_link.generic_content.uuid))
 
             # options are on the link, pass the link
-            self._build_Glossary(glossary_link)
+            feature_links.append((glossary_link, self._build_Glossary))
             
         # build the backbone taxonomy
         backbone_taxonomy_content_type = ContentType.objects.get_for_model(BackboneTaxonomy)
@@ -1346,7 +1627,7 @@ class AppReleaseBuilder(AppBuilderBase):
                                                                   content_type=backbone_taxonomy_content_type)
         backbone_taxonomy = backbone_taxonomy_link.generic_content
         
-        self._build_BackboneTaxonomy(backbone_taxonomy_link)
+        feature_links.append((backbone_taxonomy_link, self._build_BackboneTaxonomy))
         
         # iterate over all features (except glossary) and create the necessary json files
         exclude_content_types = [taxon_profiles_content_type, glossary_content_type, frontend_content_type, backbone_taxonomy_content_type]
@@ -1363,30 +1644,29 @@ class AppReleaseBuilder(AppBuilderBase):
 
             # options are on the link, pass the link
             build_method = getattr(self, '_build_{0}'.format(generic_content.__class__.__name__))
-            build_method(link)
+            feature_links.append((link, build_method))
+
+        self.feature_build_scheduler = FeatureBuildScheduler(self)
+        self.feature_build_scheduler.build(feature_links)
 
 
         # build TaxonProfiles
         taxon_profiles_link = MetaAppGenericContent.objects.get(meta_app=self.meta_app,
                                                                     content_type=taxon_profiles_content_type)
 
-        self._build_TaxonProfiles(taxon_profiles_link)        
+        self._build_feature(taxon_profiles_link, self._build_TaxonProfiles)
 
         # build TemplateContent
-        self._build_TemplateContent()
+        with self.build_profiler.phase('TemplateContent'):
+            self._build_TemplateContent()
 
         # store settings as json
         
-        app_settings_string = json.dumps(self.app_settings, indent=4, ensure_ascii=False)
-
-        with open(self._app_settings_json_filepath, 'w', encoding='utf-8') as settings_json_file:
-            settings_json_file.write(app_settings_string)
+        self.json_writer.write(self._app_settings_json_filepath, self.app_settings)
         
         # store features as json
-        app_features_string = json.dumps(self.build_features, indent=4, ensure_ascii=False)
         app_features_json_file = self._app_features_json_filepath
-        with open(app_features_json_file, 'w', encoding='utf-8') as f:
-            f.write(app_features_string)
+        self.json_writer.write(app_features_json_file, self.build_features)
             
             
         self._save_taxon_slugs(backbone_taxonomy)
@@ -1395,8 +1675,7 @@ class AppReleaseBuilder(AppBuilderBase):
         # save licence registry
         # registry has been filled byt the build_ methods *
 
-        with open(self._app_licence_registry_filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.licence_registry, f, indent=4)
+        self.json_writer.write(self._app_licence_registry_filepath, self.licence_registry, ensure_ascii=True)
 
 
     ###############################################################################################################
@@ -1449,23 +1728,29 @@ class AppReleaseBuilder(AppBuilderBase):
         for key, localization in frontend_primary_locale.items():
             primary_locale[key] = localization
 
-        with open(app_complete_primary_locale_filepath, 'w') as app_complete_primary_locale_file:
-            app_complete_primary_locale_file.write(json.dumps(primary_locale))
-            
-        # remove all taxon_text_* entries
-        reduced_primary_locale = primary_locale.copy()
-        for key, value in primary_locale.items():
-            if key.startswith('taxon_text_'):
-                del reduced_primary_locale[key]
-                
-
-        with open(app_primary_locale_filepath, 'w') as app_primary_locale_file:
-            app_primary_locale_file.write(json.dumps(reduced_primary_locale))
-            
+        self._write_locale_files(primary_locale, app_complete_primary_locale_filepath, app_primary_locale_filepath)
 
         localized_content_images = self.meta_app.get_localized_content_images()
 
-        for language_code in self.meta_app.secondary_languages():
+        secondary_languages = self.meta_app.secondary_languages()
+
+        # all LocalizedContentImages of all secondary languages in one query
+        # {content_image_id : {language_code : LocalizedContentImage}}
+        localized_content_images_by_content_image = {}
+
+        if localized_content_images and secondary_languages:
+
+            content_image_ids = [image_definition['content_image_id'] for image_definition
+                                 in localized_content_images.values()]
+
+            localized_images = LocalizedContentImage.objects.filter(content_image_id__in=content_image_ids,
+                language_code__in=secondary_languages).select_related('image_store')
+
+            for localized_content_image in localized_images:
+                localized_content_images_by_content_image.setdefault(localized_content_image.content_image_id,
+                    {})[localized_content_image.language_code] = localized_content_image
+
+        for language_code in secondary_languages:
             
             locale = self.meta_app.localizations[language_code].copy()
             
@@ -1489,30 +1774,57 @@ class AppReleaseBuilder(AppBuilderBase):
             for locale_key, image_definition in localized_content_images.items():
 
                 content_image_id = image_definition['content_image_id']
-                content_image = ContentImage.objects.get(pk=content_image_id)
 
-                localized_content_image = LocalizedContentImage.objects.get(content_image=content_image,
-                    language_code=language_code)
+                localized_content_image = localized_content_images_by_content_image.get(content_image_id,
+                    {}).get(language_code, None)
 
+                if localized_content_image is None:
+                    raise LocalizedContentImage.DoesNotExist(
+                        'LocalizedContentImage does not exist: content_image_id={0}, language_code={1}'.format(
+                            content_image_id, language_code))
+
+                # queued in the image pipeline, rendered by content_image_builder.process_image_jobs
                 relative_urls = self.build_localized_content_image(localized_content_image)
 
-                image_definition['mediaUrl'] = relative_urls
+                # the definition is shared by all languages, do not alter it
+                localized_image_definition = dict(image_definition)
+                localized_image_definition['mediaUrl'] = relative_urls
 
-                locale[locale_key] = image_definition
+                locale[locale_key] = localized_image_definition
 
             locale_filepath = self._app_locale_filepath(language_code)
             complete_locale_filepath = self._app_complete_locale_filepath(language_code)
 
-            with open(complete_locale_filepath, 'w') as complete_locale_file:
-                complete_locale_file.write(json.dumps(locale))
-                
-            reduced_locale = locale.copy()
+            self._write_locale_files(locale, complete_locale_filepath, locale_filepath)
+
+
+    # writes the complete locale and the locale without taxon_text_* entries in one pass over locale,
+    # the output is identical to json.dumps(locale) and json.dumps(reduced_locale)
+    def _write_locale_files(self, locale, complete_locale_filepath, locale_filepath):
+
+        with open(complete_locale_filepath, 'w') as complete_locale_file, open(locale_filepath, 'w') as locale_file:
+
+            complete_locale_file.write('{')
+            locale_file.write('{')
+
+            complete_separator = ''
+            separator = ''
+
             for key, value in locale.items():
-                if key.startswith('taxon_text_'):
-                    del reduced_locale[key]
-                    
-            with open(locale_filepath, 'w') as locale_file:
-                locale_file.write(json.dumps(reduced_locale))
+
+                entry = '{0}: {1}'.format(json.dumps(key), json.dumps(value))
+
+                complete_locale_file.write(complete_separator)
+                complete_locale_file.write(entry)
+                complete_separator = ', '
+
+                if not key.startswith('taxon_text_'):
+                    locale_file.write(separator)
+                    locale_file.write(entry)
+                    separator = ', '
+
+            complete_locale_file.write('}')
+            locale_file.write('}')
 
 
     def _get_frontend_locale(self, language_code):
@@ -1532,14 +1844,15 @@ class AppReleaseBuilder(AppBuilderBase):
     def _add_to_locale(self, dictionary, language_code):
         locale_filepath = self._app_locale_filepath(language_code)
 
-        with open(locale_filepath, 'r') as locale_file:
-            locale = json.loads(locale_file.read())
+        locale = self.locale_store.load(locale_filepath)
 
         for key, value in dictionary.items():
             locale[key] = value
         
-        with open(locale_filepath, 'w') as locale_file:
-            locale_file.write(json.dumps(locale))
+        self.locale_store.write(locale_filepath, locale)
+
+        if self.feature_build_cache:
+            self.feature_build_cache.record_locale_addition(dictionary, language_code)
 
 
     # add a localization of nature guide taxa directly to the locale
@@ -1560,7 +1873,7 @@ class AppReleaseBuilder(AppBuilderBase):
                 
                 key = '{0} {1}'.format(taxon.taxon_latname, taxon.taxon_author or '')
 
-                vernacular_name = taxon.vernacular(language=language_code, meta_app=self.meta_app)
+                vernacular_name = self.build_context.get_vernacular_name(taxon, language_code)
                 
                 if not vernacular_name:
                     vernacular_name = key
@@ -1600,6 +1913,18 @@ class AppReleaseBuilder(AppBuilderBase):
     # - fill build_featres{} which will be dumped as www/features.js
     ###############################################################################################################
 
+    # build a generic content using build_method, or restore it from the previous build if it did not change
+    def _build_feature(self, app_generic_content, build_method):
+
+        generic_content = app_generic_content.generic_content
+
+        with self.build_profiler.phase(generic_content.__class__.__name__, uuid=str(generic_content.uuid)):
+            if self.feature_build_cache:
+                self.feature_build_cache.build_feature(app_generic_content, build_method)
+            else:
+                build_method(app_generic_content)
+
+
     def get_json_builder(self, app_generic_content):
 
         generic_content = app_generic_content.generic_content
@@ -1723,8 +2048,7 @@ class AppReleaseBuilder(AppBuilderBase):
         filename = '{0}.json'.format(filename_identifier)
         content_dump_file = os.path.join(absolute_generic_content_folder, filename)            
         
-        with open(content_dump_file, 'w', encoding='utf-8') as f:
-            json.dump(generic_content_json, f, indent=4, ensure_ascii=False)
+        self.json_writer.write(content_dump_file, generic_content_json)
 
 
         #get the json entry for features.js
@@ -1776,8 +2100,7 @@ class AppReleaseBuilder(AppBuilderBase):
             self.taxon_slugs['vernacular'][language_code] = {}
 
 
-        vernacular_name = lazy_taxon.vernacular(language=language_code,
-                                                        meta_app=self.meta_app)
+        vernacular_name = self.build_context.get_vernacular_name(lazy_taxon, language_code)
         
         if vernacular_name:
             
@@ -1812,8 +2135,7 @@ class AppReleaseBuilder(AppBuilderBase):
         
         absolute_slugs_path = os.path.join(absolute_generic_content_path, slugs_filename)
         
-        with open(absolute_slugs_path, 'w', encoding='utf-8') as f:
-            json.dump(self.taxon_slugs['taxon_latname'], f, indent=4, ensure_ascii=False)
+        self.json_writer.write(absolute_slugs_path, self.taxon_slugs['taxon_latname'])
             
             
         absolute_vernacular_slugs_folder = os.path.join(absolute_generic_content_path, 'slugs')
@@ -1831,8 +2153,7 @@ class AppReleaseBuilder(AppBuilderBase):
             vernacular_slugs_filename = '{0}.json'.format(language_code)
             absolute_localized_slugs_path = os.path.join(absolute_vernacular_slugs_folder, vernacular_slugs_filename)
             
-            with open(absolute_localized_slugs_path, 'w', encoding='utf-8') as f:
-                json.dump(localized_slugs, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(absolute_localized_slugs_path, localized_slugs)
                 
     
     def _build_BackboneTaxonomy(self, app_generic_content):
@@ -1896,14 +2217,24 @@ class AppReleaseBuilder(AppBuilderBase):
         if not os.path.isdir(absolute_lookup_folder_path):
             os.makedirs(absolute_lookup_folder_path)
         
-        taxon_latname_search_index = jsonbuilder.build_taxon_latname_search_index()
-        
-        for start_letter, letter_taxa in taxon_latname_search_index.items():
-            letter_file = os.path.join(absolute_latname_search_folder_path, '{0}.json'.format(
-                start_letter))
+        # large apps write the search indices while the taxa are serialized
+        self.build_profiler.check_memory()
+
+        if self.streaming_output == True:
+            self._stream_search_index(jsonbuilder.iter_taxon_latname_search_index(),
+                                      absolute_latname_search_folder_path)
+
+        else:
+            taxon_latname_search_index = jsonbuilder.build_taxon_latname_search_index()
+            
+            for start_letter, letter_taxa in taxon_latname_search_index.items():
+
+                self.check_cancelled()
 
-            with open(letter_file, 'w', encoding='utf-8') as f:
-                json.dump(letter_taxa, f, indent=4, ensure_ascii=False)
+                letter_file = os.path.join(absolute_latname_search_folder_path, '{0}.json'.format(
+                    start_letter))
+
+                self.json_writer.write(letter_file, letter_taxa)
                 
         
         for language_code in self.meta_app.languages():
@@ -1916,18 +2247,26 @@ class AppReleaseBuilder(AppBuilderBase):
             relative_vernacular_search_language_folder_path = os.path.join(relative_vernacular_search_folder_path, language_code)
             relative_vernacular_lookup_language_filepath = os.path.join(relative_lookup_folder_path, '{0}.json'.format(language_code))
             
-            vernacular_search_index, vernacular_lookup = jsonbuilder.build_vernacular_search_index(language_code)
-            
-            for start_letter, vernacular_letter_taxa in vernacular_search_index.items():
-                vernacular_letter_file = os.path.join(absolute_vernacular_language_folder_path, '{0}.json'.format(
-                    start_letter))
+            if self.streaming_output == True:
+                vernacular_lookup = {}
+                self._stream_search_index(jsonbuilder.iter_vernacular_search_index(language_code,
+                    vernacular_lookup), absolute_vernacular_language_folder_path)
+
+            else:
+                vernacular_search_index, vernacular_lookup = jsonbuilder.build_vernacular_search_index(
+                    language_code)
+                
+                for start_letter, vernacular_letter_taxa in vernacular_search_index.items():
+
+                    self.check_cancelled()
 
-                with open(vernacular_letter_file, 'w', encoding='utf-8') as f:
-                    json.dump(vernacular_letter_taxa, f, indent=4, ensure_ascii=False)
+                    vernacular_letter_file = os.path.join(absolute_vernacular_language_folder_path,
+                        '{0}.json'.format(start_letter))
+
+                    self.json_writer.write(vernacular_letter_file, vernacular_letter_taxa)
                     
             absolute_lookup_file_path = os.path.join(absolute_lookup_folder_path, '{0}.json'.format(language_code))
-            with open(absolute_lookup_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(vernacular_lookup, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(absolute_lookup_file_path, vernacular_lookup)
                     
             feature_entry['search']['vernacular'][language_code] = '/{0}'.format(relative_vernacular_search_language_folder_path)
             feature_entry['lookup']['vernacular'][language_code] = '/{0}'.format(relative_vernacular_lookup_language_filepath)
@@ -1936,6 +2275,28 @@ class AppReleaseBuilder(AppBuilderBase):
         self.build_features[backbone_taxonomy.__class__.__name__] =  feature_entry
 
 
+    # search_index: iterable of (start_letter, search_taxon), one file per start letter is written item by item
+    # the files are identical to those written from the complete index
+    def _stream_search_index(self, search_index, folder):
+
+        letter_files = {}
+
+        try:
+            for start_letter, search_taxon in search_index:
+
+                self.check_cancelled()
+
+                if start_letter not in letter_files:
+                    letter_filepath = os.path.join(folder, '{0}.json'.format(start_letter))
+                    letter_files[start_letter] = self.json_writer.open_array(letter_filepath)
+
+                letter_files[start_letter].append(search_taxon)
+
+        finally:
+            for letter_file in letter_files.values():
+                letter_file.close()
+
+
 
     ###############################################################################################################
     # TAXON PROFILES
@@ -1948,35 +2309,12 @@ class AppReleaseBuilder(AppBuilderBase):
         if taxon.taxon_source != 'app_kit.features.nature_guides':
             return False
 
-        is_inactive = False
-        
-        nature_guide_links = self.meta_app.get_generic_content_links(NatureGuide)
-        
-
-        for nuid in self.inactivated_nuids:            
-            if taxon.taxon_nuid.startswith(nuid):                
-                is_inactive = True
-                break
+        is_inactive = self.build_context.is_in_inactive_branch(taxon.taxon_nuid, self.inactivated_nuids)
         
-        # chekc if there is an active node
+        # check if there is an active node
         if is_inactive == True:
-            for nature_guide_link in nature_guide_links:
-                nature_guide = nature_guide_link.generic_content
-                nodes = NatureGuidesTaxonTree.objects.filter(pk=nature_guide.id, meta_node__name_uuid=taxon.name_uuid)
-                
-                for node in nodes:
-                    for nuid in self.inactivated_nuids:
-                        
-                        if not node.taxon_nuid.startswith(nuid):
-                            is_inactive = False
-                            break
-                    
-                    if is_inactive == False:
-                        break
-                    
-                if is_inactive == False:
-                    break
-                    
+            if self.build_context.has_active_node(taxon.name_uuid, self.inactivated_nuids):
+                is_inactive = False
 
         return is_inactive
     
@@ -2009,11 +2347,7 @@ class AppReleaseBuilder(AppBuilderBase):
         
         glossarized_locale_filepath = self._app_glossarized_locale_filepath(language_code)
                     
-        glossarized_locale = {}
-        
-        if os.path.isfile(glossarized_locale_filepath):
-            with open(glossarized_locale_filepath, 'r') as f:
-                glossarized_locale = json.loads(f.read())
+        glossarized_locale = self.locale_store.load(glossarized_locale_filepath)
         
         app_locale = self.meta_app.localizations[language_code]
         
@@ -2111,17 +2445,17 @@ class AppReleaseBuilder(AppBuilderBase):
                                                     'include_only_taxon_profiles_from_nature_guides')
         
         nature_guide_content_type = ContentType.objects.get_for_model(NatureGuide)
-        nature_guide_ids = MetaAppGenericContent.objects.filter(content_type=nature_guide_content_type,
-                                                             meta_app=self.meta_app).values_list('object_id')
+        has_nature_guides = MetaAppGenericContent.objects.filter(content_type=nature_guide_content_type,
+                                                             meta_app=self.meta_app).exists()
 
 
         taxon_profile_id_to_taxon_map = {}
         
         for profile_taxon in collected_taxa:
 
-            db_profile = TaxonProfile.objects.filter(taxon_profiles=taxon_profiles,
-                taxon_source=profile_taxon.taxon_source, taxon_latname=profile_taxon.taxon_latname,
-                taxon_author=profile_taxon.taxon_author).first()
+            self.check_cancelled()
+
+            db_profile = self.build_context.get_taxon_profile(profile_taxon)
         
             if db_profile and db_profile.publication_status == 'draft':
                 continue
@@ -2139,8 +2473,8 @@ class AppReleaseBuilder(AppBuilderBase):
                 if profile_taxon.taxon_source == 'app_kit.features.nature_guides':
                     # the profile might exist, but the taxon in the nature guide might
                     # already have been deleted
-                    exists_in_nature_guide = NatureGuidesTaxonTree.objects.filter(
-                        name_uuid=profile_taxon.name_uuid).exists()
+                    exists_in_nature_guide = self.build_context.exists_in_nature_guides(
+                        profile_taxon.name_uuid)
                     
                     if not exists_in_nature_guide:
                         add = False
@@ -2153,28 +2487,10 @@ class AppReleaseBuilder(AppBuilderBase):
                 
                 # taxa from all sources except app_kit.features.nature_guides
                 else:
-                    if nature_guide_ids.exists():
+                    if has_nature_guides:
                         
-                        meta_nodes = MetaNode.objects.filter(
-                                nature_guide_id__in=nature_guide_ids, name_uuid=profile_taxon.name_uuid)
-                        
-                        if self.inactivated_nuids:
-                        
-                            is_active = False
-                            for meta_node in meta_nodes:                            
-                                for inactive_nuid in self.inactivated_nuids:
-                                    
-                                    meta_node_tree_nuid = meta_node.natureguidestaxontree.taxon_nuid
-                                    
-                                    if not meta_node_tree_nuid.startswith(inactive_nuid):
-                                        is_active = True
-                                        break
-                                    
-                                if is_active == True:
-                                    break
-                        else:
-                            if meta_nodes.exists():
-                                is_active = True
+                        is_active = self.build_context.has_active_node(profile_taxon.name_uuid,
+                                                                       self.inactivated_nuids)
                             
                         if is_active == False:
                             add = False
@@ -2187,14 +2503,47 @@ class AppReleaseBuilder(AppBuilderBase):
         
         self.build_features[generic_content_type]['localizedFiles'] = {}
         
+        languages = self.meta_app.languages()
+        
+        # optionally, the profiles are appended to a few pack files instead of one file per profile
+        use_profile_packs = TaxonProfilePackWriter.is_enabled()
+        
+        if use_profile_packs == True:
+            
+            relative_packs_folder = os.path.join(app_relative_taxonprofiles_folder, 'packs')
+            absolute_packs_folder = os.path.join(app_absolute_taxonprofiles_path, 'packs')
+            
+            def get_pack_writer(*path):
+                return TaxonProfilePackWriter(os.path.join(absolute_packs_folder, *path),
+                                              os.path.join(relative_packs_folder, *path), self.json_writer)
+            
+            profile_packs = get_pack_writer('profiles')
+            localized_profile_packs = {}
+            localized_morphotype_packs = {}
+            
+            for language_code in languages:
+                localized_profile_packs[language_code] = get_pack_writer(language_code)
+                localized_morphotype_packs[language_code] = get_pack_writer('morphotypes', language_code)
+        
         for profile_taxon in active_collected_taxa:
+
+            self.check_cancelled()
             
             morphotype = None
 
             profile_json = jsonbuilder.build_taxon_profile(profile_taxon, morphotype,
-                                                           languages=self.meta_app.languages())
+                                                           languages=languages)
 
-            if profile_json is not None:
+            if profile_json is not None and use_profile_packs == True:
+                
+                profile_key = str(profile_taxon.name_uuid)
+                profile_packs.add(profile_taxon, profile_key, profile_json)
+                
+                for language_code in languages:
+                    localized_profile_json = self.get_localized_taxon_profile(profile_json, language_code)
+                    localized_profile_packs[language_code].add(profile_taxon, profile_key, localized_profile_json)
+
+            elif profile_json is not None:
 
                 # dump the profile
                 source_folder = os.path.join(app_absolute_taxonprofiles_path, profile_taxon.taxon_source)
@@ -2203,12 +2552,11 @@ class AppReleaseBuilder(AppBuilderBase):
 
                 profile_filepath = os.path.join(source_folder, '{0}.json'.format(profile_taxon.name_uuid))
 
-                with open(profile_filepath, 'w', encoding='utf-8') as f:
-                    json.dump(profile_json, f, indent=4, ensure_ascii=False)
+                self.json_writer.write(profile_filepath, profile_json)
                 
                 
                 # localized taxon profiles for faster language load
-                for language_code in self.meta_app.languages():
+                for language_code in languages:
                     
                     localized_profile_json = self.get_localized_taxon_profile(profile_json, language_code)
                     
@@ -2233,27 +2581,33 @@ class AppReleaseBuilder(AppBuilderBase):
                     localized_profile_filepath = os.path.join(localized_source_folder,
                                                               '{0}.json'.format(profile_taxon.name_uuid))
 
-                    with open(localized_profile_filepath, 'w', encoding='utf-8') as f:
-                        json.dump(localized_profile_json, f, indent=4, ensure_ascii=False)
+                    self.json_writer.write(localized_profile_filepath, localized_profile_json)
                         
             # build morphotype profiles
             morphotypes = []
-            taxon_profile = TaxonProfile.objects.filter(taxon_profiles=taxon_profiles,
-                taxon_source=profile_taxon.taxon_source, taxon_latname=profile_taxon.taxon_latname,
-                taxon_author=profile_taxon.taxon_author).first()
+            taxon_profile = self.build_context.get_taxon_profile(profile_taxon)
 
-            if taxon_profile and taxon_profile.morphotype_profiles:
-                morphotypes = taxon_profile.morphotype_profiles.values_list('morphotype', flat=True)
+            if taxon_profile:
+                morphotypes = [morphotype_profile.morphotype for morphotype_profile in
+                               self.build_context.get_morphotype_profiles(taxon_profile)]
                 
                 
             for morphotype in morphotypes:
 
                 morphotype_profile_json = jsonbuilder.build_taxon_profile(profile_taxon, morphotype,
-                                                           languages=self.meta_app.languages())
+                                                           languages=languages)
+
+                if morphotype_profile_json is not None and use_profile_packs == True:
+                    
+                    morphotype_key = '{0}_{1}'.format(profile_taxon.name_uuid, morphotype)
+                    
+                    for language_code in languages:
+                        localized_morphotype_packs[language_code].add(profile_taxon, morphotype_key,
+                                                                      morphotype_profile_json)
 
-                if morphotype_profile_json is not None:
+                elif morphotype_profile_json is not None:
 
-                    for language_code in self.meta_app.languages():
+                    for language_code in languages:
                         
                         localized_profile_json = self.get_localized_taxon_profile(morphotype_profile_json, language_code)
                         
@@ -2279,8 +2633,20 @@ class AppReleaseBuilder(AppBuilderBase):
                         localized_morphotype_profile_filepath = os.path.join(localized_source_folder,
                                                               '{0}_{1}.json'.format(profile_taxon.name_uuid, morphotype))
                         
-                        with open(localized_morphotype_profile_filepath, 'w', encoding='utf-8') as f:
-                            json.dump(morphotype_profile_json, f, indent=4, ensure_ascii=False)
+                        self.json_writer.write(localized_morphotype_profile_filepath, morphotype_profile_json)
+
+        # paths of the pack indices for the frontend
+        if use_profile_packs == True:
+            
+            self.build_features[generic_content_type]['profilePacks'] = {
+                'profiles' : profile_packs.close(),
+                'localized' : {},
+                'localizedMorphotypes' : {},
+            }
+            
+            for language_code in languages:
+                self.build_features[generic_content_type]['profilePacks']['localized'][language_code] = localized_profile_packs[language_code].close()
+                self.build_features[generic_content_type]['profilePacks']['localizedMorphotypes'][language_code] = localized_morphotype_packs[language_code].close()
 
 
         # build search index and registry
@@ -2291,8 +2657,7 @@ class AppReleaseBuilder(AppBuilderBase):
         # store the general registry
         registry_absolute_filepath = os.path.join(app_absolute_taxonprofiles_path, 'registry.json')
         
-        with open(registry_absolute_filepath, 'w', encoding='utf-8') as f:
-            json.dump(taxon_profiles_registry, f, indent=4, ensure_ascii=False)
+        self.json_writer.write(registry_absolute_filepath, taxon_profiles_registry)
 
         
         # store the localized_registries
@@ -2314,8 +2679,7 @@ class AppReleaseBuilder(AppBuilderBase):
             absolute_localized_registry_filepath = os.path.join(absolute_localized_registries_root,
                 localized_registry_filename)
 
-            with open(absolute_localized_registry_filepath, 'w', encoding='utf-8') as f:
-                json.dump(localized_registry, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(absolute_localized_registry_filepath, localized_registry)
 
             
             self.build_features[generic_content_type]['localizedRegistries'][language_code] = '/{0}'.format(relative_localized_registry_filepath)
@@ -2341,16 +2705,14 @@ class AppReleaseBuilder(AppBuilderBase):
             navigation_filename = '{0}.json'.format(navigation_key)
             absolute_navigation_node_filepath = os.path.join(absolute_navigation_folder, navigation_filename)
 
-            with open(absolute_navigation_node_filepath, 'w', encoding='utf-8') as f:
-                json.dump(navigation_node, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(absolute_navigation_node_filepath, navigation_node)
         
         self.build_features[generic_content_type]['navigation'] = '/{0}'.format(relative_navigation_folder)
         
         # featured taxon profiles
         featured_taxon_profiles = jsonbuilder.build_featured_taxon_profiles_list(languages=self.meta_app.languages())
         featured_taxon_profiles_absolute_filepath = os.path.join(app_absolute_taxonprofiles_path, 'featured_profiles.json')
-        with open(featured_taxon_profiles_absolute_filepath, 'w', encoding='utf-8') as f:
-            json.dump(featured_taxon_profiles, f, indent=4, ensure_ascii=False)
+        self.json_writer.write(featured_taxon_profiles_absolute_filepath, featured_taxon_profiles)
         
         relative_featured_taxon_profiles_path = os.path.join(app_relative_taxonprofiles_folder, 'featured_profiles.json')
         self.build_features[generic_content_type]['featuredProfiles'] = '/{0}'.format(relative_featured_taxon_profiles_path)
@@ -2372,8 +2734,7 @@ class AppReleaseBuilder(AppBuilderBase):
         absolute_taxon_profiles_filepath = os.path.join(app_absolute_taxonprofiles_path, filename)
         relative_taxon_profiles_filepath = os.path.join(app_relative_taxonprofiles_folder, filename)
         
-        with open(absolute_taxon_profiles_filepath, 'w', encoding='utf-8') as f:
-            json.dump(taxon_profiles_extended_json, f, indent=4, ensure_ascii=False)
+        self.json_writer.write(absolute_taxon_profiles_filepath, taxon_profiles_extended_json)
         
         self.build_features[generic_content_type]['lookup'] = {}
         self.build_features[generic_content_type]['lookup'][str(taxon_profiles.uuid)] = '/{0}'.format(relative_taxon_profiles_filepath)
@@ -2382,8 +2743,7 @@ class AppReleaseBuilder(AppBuilderBase):
         taxon_profiles_map_filename = 'id_to_taxon_map.json'
         absolute_taxon_profiles_map_filepath = os.path.join(app_absolute_taxonprofiles_path, taxon_profiles_map_filename)
         relative_taxon_profiles_map_filepath = os.path.join(app_relative_taxonprofiles_folder, taxon_profiles_map_filename)
-        with open(absolute_taxon_profiles_map_filepath, 'w', encoding='utf-8') as f:
-            json.dump(taxon_profile_id_to_taxon_map, f, indent=4, ensure_ascii=False)
+        self.json_writer.write(absolute_taxon_profiles_map_filepath, taxon_profile_id_to_taxon_map)
             
         self.build_features[generic_content_type]['idToTaxonMap'] = '/{0}'.format(relative_taxon_profiles_map_filepath)
 
@@ -2438,9 +2798,7 @@ class AppReleaseBuilder(AppBuilderBase):
 
                         absolute_json_filepath = os.path.join(template_content_template_path, filename)
 
-                        with open(absolute_json_filepath, 'w') as template_content_file:
-                            template_content_file.write(json.dumps(localized_template_content_json, indent=4,
-                                ensure_ascii=False))
+                        self.json_writer.write(absolute_json_filepath, localized_template_content_json)
 
                         relative_json_filepath = os.path.join(app_relative_template_contents_path, template_content_subpath,
                             filename)
@@ -2487,9 +2845,8 @@ class AppReleaseBuilder(AppBuilderBase):
 
                     absolute_navigation_json_filepath = os.path.join(absolute_navigations_folder_path, filename)
 
-                    with open(absolute_navigation_json_filepath, 'w') as navigation_file:
-                        navigation_file.write(json.dumps(localized_navigation.published_navigation, indent=4,
-                                ensure_ascii=False))
+                    self.json_writer.write(absolute_navigation_json_filepath,
+                                           localized_navigation.published_navigation)
 
                     template_contents_json['navigations'][navigation.navigation_type][language_code] = '/{0}'.format(relative_navigation_json_filepath)
 
@@ -2562,8 +2919,8 @@ class AppReleaseBuilder(AppBuilderBase):
             glossarized_locale_filepath = self._app_glossarized_locale_filepath(language_code)
 
 
-            with open(glossarized_locale_filepath, 'w', encoding='utf-8') as f:
-                json.dump(glossarized_locale, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(glossarized_locale_filepath, glossarized_locale)
+            self.locale_store.remember(glossarized_locale_filepath, glossarized_locale)
 
 
             # localized glossary
@@ -2575,8 +2932,7 @@ class AppReleaseBuilder(AppBuilderBase):
             # store localized glossary which only contains used terms
             used_terms_glossary_filepath = self._app_used_terms_glossary_filepath(glossary, language_code)
 
-            with open(used_terms_glossary_filepath, 'w', encoding='utf-8') as f:
-                json.dump(used_terms_glossary, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(used_terms_glossary_filepath, used_terms_glossary)
 
 
             used_terms_glossary_relative_path = self._app_relative_used_terms_glossary_filepath(glossary, language_code)
@@ -2603,8 +2959,7 @@ class AppReleaseBuilder(AppBuilderBase):
             localized_glossary = jsonbuilder.build_localized_glossary(jsonbuilder.primary_locale_glossary, language_code)
             localized_glossary_filepath = self._app_localized_glossary_filepath(glossary, language_code)
             
-            with open(localized_glossary_filepath, 'w', encoding='utf-8') as f:
-                json.dump(localized_glossary, f, indent=4, ensure_ascii=False)
+            self.json_writer.write(localized_glossary_filepath, localized_glossary)
 
 
             localized_glossary_relative_path = self._app_relative_localized_glossary_filepath(glossary, language_code)
@@ -2623,8 +2978,7 @@ class AppReleaseBuilder(AppBuilderBase):
                 
                 categorized_localized_glossary_filepath = self._app_categorized_localized_glossary_filepath(glossary, category, language_code)
                 
-                with open(categorized_localized_glossary_filepath, 'w', encoding='utf-8') as f:
-                    json.dump(categorized_glossary, f, indent=4, ensure_ascii=False)
+                self.json_writer.write(categorized_localized_glossary_filepath, categorized_glossary)
 
                 categorized_localized_glossary_relative_path = self._app_relative_localized_categorized_localized_glossary_filepath(glossary,
                     category, language_code)
@@ -2729,7 +3083,8 @@ class AppReleaseBuilder(AppBuilderBase):
         if lc_private == True:
             build_zip=True
         
-        browser_built_folder, browser_zip_filepath = cordova_builder.build_browser(rebuild=True, build_zip=build_zip)
+        # the zipfile is created by ZipArchiver, which reuses the entries of the previous browser zipfile
+        browser_built_folder, browser_zip_filepath = cordova_builder.build_browser(rebuild=True, build_zip=False)
 
         if not os.path.isdir(self._review_served_root):
             os.makedirs(self._review_served_root)
@@ -2739,12 +3094,20 @@ class AppReleaseBuilder(AppBuilderBase):
 
         os.symlink(browser_built_folder, self._review_browser_served_www_path)
 
-        if os.path.isfile(browser_zip_filepath):
+        if build_zip == True:
 
             if not os.path.exists(self._build_packages_path):
                 os.makedirs(self._build_packages_path)
 
-            shutil.move(browser_zip_filepath, self._build_browser_zip_filepath)
+            # the zipfile of an interrupted build, see build_checkpoints
+            self._keep_previous_archives()
+
+            self.logger.info('Creating zipfile for browser')
+            zip_archiver = ZipArchiver(self._build_browser_zip_filepath,
+                                       previous_zip_filepath=self._previous_browser_zip_filepath)
+            report = zip_archiver.create(browser_built_folder, prefix='www')
+            self.logger.info('Browser zipfile: {0}'.format(report))
+
             self.serve_review_browser_zip()
             
         # set localcosmos_server.app.review_version_path
@@ -2759,6 +3122,56 @@ class AppReleaseBuilder(AppBuilderBase):
         os.symlink(self._build_browser_zip_filepath, self._review_browser_zip_served_filepath)
 
 
+    ###############################################################################################################
+    # DELTA PACKAGES
+    # - manifest of the browser app and the changed files since the published version, see DeltaPackage
+    ###############################################################################################################
+
+    def _build_content_manifest(self):
+
+        self.logger.info('Building content manifest')
+
+        cordova_builder = self.get_cordova_builder()
+
+        content_manifest = ContentManifest(cordova_builder._browser_built_www_path, self.meta_app.current_version,
+            json_writer=self.json_writer,
+            source_folders=[self._app_www_path, self._review_browser_served_www_path])
+
+        report = content_manifest.create()
+
+        self.logger.info('Content manifest: {0}'.format(report))
+
+        return content_manifest
+
+
+    def _build_delta_package(self, files):
+
+        self.logger.info('Building delta package')
+
+        cordova_builder = self.get_cordova_builder()
+
+        delta_package_builder = DeltaPackageBuilder(self)
+        report = delta_package_builder.create(cordova_builder._browser_built_www_path, files=files)
+
+        self.serve_delta_package(delta_package_builder.get_delta_path(), self._review_delta_served_path)
+
+        self.logger.info('Delta package: {0}'.format(report))
+
+        return report
+
+
+    def serve_delta_package(self, delta_path, served_path):
+
+        if os.path.islink(served_path):
+            os.unlink(served_path)
+
+        served_root = os.path.dirname(served_path)
+        if not os.path.isdir(served_root):
+            os.makedirs(served_root)
+
+        os.symlink(delta_path, served_path)
+
+
     ##############################################################################################################
     # NGINX paths
 
@@ -2903,6 +3316,15 @@ class AppReleaseBuilder(AppBuilderBase):
     def _published_browser_zip_served_filepath(self):
         return os.path.join(self._published_served_packages_path, self._browser_zipfile_name)
     
+    # delta packages
+    @property
+    def _review_delta_served_path(self):
+        return os.path.join(self._review_served_packages_path, 'delta')
+
+    @property
+    def _published_delta_served_path(self):
+        return os.path.join(self._published_served_packages_path, 'delta')
+
     @property
     def _browser_zipfile_name(self):
         zipfile_name = '{0}.zip'.format(self.meta_app.name)
@@ -2914,22 +3336,42 @@ class AppReleaseBuilder(AppBuilderBase):
     #
     ###############################################################################################################
 
+    # move the zipfiles of the previous build out of the builder path, which is deleted before they are
+    # created again. The build jobs zipfile name contains the build number.
+    def _keep_previous_archives(self):
+
+        previous_archives = [(self._build_browser_zip_filepath, self._previous_browser_zip_filepath)]
+
+        if os.path.isdir(self._app_build_jobs_path):
+            for filename in sorted(os.listdir(self._app_build_jobs_path)):
+                if filename.endswith('.zip'):
+                    previous_archives.append((os.path.join(self._app_build_jobs_path, filename),
+                                              self._previous_build_jobs_zipfile_filepath))
+
+        for zip_filepath, previous_zip_filepath in previous_archives:
+
+            # the served zipfiles are symlinks
+            if os.path.isfile(zip_filepath) and not os.path.islink(zip_filepath):
+
+                if not os.path.isdir(self._previous_archives_path):
+                    os.makedirs(self._previous_archives_path)
+
+                os.replace(zip_filepath, previous_zip_filepath)
+
+
     def _create_build_jobs_zipfile(self):
 
         self.logger.info('Creating zipfile for build jobs')
 
-        with zipfile.ZipFile(self._build_jobs_zipfile_filepath, 'w', zipfile.ZIP_DEFLATED) as www_zip:
-
-            # add www
-            for root, dirs, files in os.walk(self._app_build_sources_path, followlinks=True):
+        # media is stored, text files are deflated in parallel, unchanged entries are copied from the
+        # previous zipfile of this version
+        zip_archiver = ZipArchiver(self._build_jobs_zipfile_filepath,
+                                   previous_zip_filepath=self._previous_build_jobs_zipfile_filepath)
+        report = zip_archiver.create(self._app_build_sources_path)
 
-                for filename in files:
-                    # Create the full filepath by using os module.
-                    app_file_path = os.path.join(root, filename)
-                    arcname = app_file_path.split(self._app_build_sources_path)[-1]
-                    www_zip.write(app_file_path, arcname=arcname)
+        self.logger.info('Successfully created zipfile: {0}'.format(report))
 
-        self.logger.info('Successfully created zipfile.')
+        return report
             
 
     ###############################################################################################################
@@ -2940,6 +3382,9 @@ class AppReleaseBuilder(AppBuilderBase):
     
     def _create_ios_build_job(self):
 
+        # the zipfile of an interrupted build, see build_checkpoints
+        self._keep_previous_archives()
+
         self.deletecreate_folder(self._app_build_jobs_path)
         
         self._create_build_jobs_zipfile()
@@ -3088,6 +3533,12 @@ class AppReleaseBuilder(AppBuilderBase):
 
         os.symlink(browser_built_www_path, served_published_www_folder)
 
+        delta_path = DeltaPackageBuilder(self).get_delta_path()
+        if os.path.isdir(delta_path):
+            self.serve_delta_package(delta_path, self._published_delta_served_path)
+        elif os.path.islink(self._published_delta_served_path):
+            os.unlink(self._published_delta_served_path)
+
         # update app.url, if hosted on LC
         localcosmos_private = self.meta_app.get_global_option('localcosmos_private')
 
@@ -0,0 +1,569 @@
+###################################################################################################################
+#
+# RELEASE BUILDER BENCHMARK
+# - SyntheticAppGenerator creates an app of a given size: backbone taxa of the custom taxonomy, a nature guide
+#   with matrix filters, taxon profiles, glossary terms, secondary languages and images
+# - BuildBenchmark times validate(), _build_common_www() with the nested _build_* phases, the app assets and
+#   the image rendering, with query counts (see BuildProfiler); the platforms are only built with full=True
+# - results are stored as json, two results can be compared phase by phase
+# - see the management command benchmark_release_builder
+#
+###################################################################################################################
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from app_kit.models import MetaApp, MetaAppGenericContent, ImageStore, ContentImage
+from app_kit.settings import ADDABLE_FEATURES
+from app_kit.utils import import_module
+
+from app_kit.appbuilder.AppReleaseBuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildProfiler import BuildProfiler
+
+from app_kit.features.backbonetaxonomy.models import BackboneTaxonomy, BackboneTaxa
+from app_kit.features.nature_guides.models import (NatureGuide, MetaNode, NatureGuidesTaxonTree, MatrixFilter,
+    MatrixFilterSpace, NodeFilterSpace, ChildrenCacheManager)
+from app_kit.features.taxon_profiles.models import TaxonProfiles, TaxonProfile, TaxonTextType, TaxonText
+from app_kit.features.glossary.models import Glossary, GlossaryEntry
+
+from taxonomy.models import TaxonomyModelRouter
+from taxonomy.lazy import LazyTaxon
+
+from PIL import Image
+
+import os, io, json, time, hashlib
+
+# bump this if the structure of the results changes
+BENCHMARK_VERSION = 1
+
+DEFAULT_SIZES = {
+    'taxa' : 500,
+    'nature_guide_nodes' : 1000,
+    'matrix_filters' : 3,
+    'taxon_profiles' : 300,
+    'glossary_terms' : 200,
+    'languages' : 2,
+    'images' : 100,
+}
+
+SECONDARY_LANGUAGES = ['de', 'fr', 'it', 'es', 'nl', 'pt', 'cs', 'pl', 'da', 'sv']
+
+# children per group of the nature guide, species per genus of the taxonomy
+BRANCHING = 10
+
+TEXT_TYPES = ['Description', 'Habitat', 'Distribution']
+
+# these settings change the build performance and are stored with each result
+BENCHMARK_SETTINGS = ['APP_KIT_BUILD_PROCESSES', 'APP_KIT_IMAGE_PROCESSES', 'APP_KIT_INCREMENTAL_BUILDS',
+    'APP_KIT_VALIDATION_CACHE', 'APP_KIT_VALIDATION_THREADS', 'APP_KIT_MINIFY_JSON',
+    'APP_KIT_TAXON_PROFILE_PACKS', 'APP_KIT_PRECOMPRESS_JSON']
+
+
+class SyntheticAppGenerator:
+
+    taxon_source = 'taxonomy.sources.custom'
+
+    def __init__(self, tenant, user, subdomain, sizes={}):
+        self.tenant = tenant
+        self.user = user
+        self.subdomain = subdomain
+
+        self.sizes = DEFAULT_SIZES.copy()
+        self.sizes.update(sizes)
+
+        self.meta_app = None
+        self.taxa = []
+        self.image_targets = []
+
+
+    def generate(self):
+
+        self.create_meta_app()
+        self.create_taxa()
+        self.create_backbone_taxa()
+        self.create_nature_guide()
+        self.create_taxon_profiles()
+        self.create_glossary()
+        self.create_images()
+        self.create_localizations()
+
+        return self.meta_app
+
+
+    def get_generic_content(self, Model):
+        content_type = ContentType.objects.get_for_model(Model)
+        link = MetaAppGenericContent.objects.get(meta_app=self.meta_app, content_type=content_type)
+        return link.generic_content
+
+
+    def create_meta_app(self):
+
+        name = 'Benchmark {0}'.format(self.subdomain)
+        domain_name = '{0}.{1}'.format(self.subdomain, self.tenant.get_primary_domain().domain)
+
+        secondary_languages = SECONDARY_LANGUAGES[:max(self.sizes['languages'] - 1, 0)]
+
+        self.meta_app = MetaApp.objects.create(name, 'en', domain_name, self.tenant, self.subdomain,
+                                               secondary_languages=secondary_languages)
+
+        for feature_module in ADDABLE_FEATURES:
+
+            FeatureModel = import_module(feature_module).models.FeatureModel
+            content_type = ContentType.objects.get_for_model(FeatureModel)
+
+            if MetaAppGenericContent.objects.filter(meta_app=self.meta_app, content_type=content_type).exists():
+                continue
+
+            generic_content_name = '{0} {1}'.format(name, FeatureModel._meta.verbose_name)
+            generic_content = FeatureModel.objects.create(generic_content_name, self.meta_app.primary_language)
+
+            link = MetaAppGenericContent(
+                meta_app=self.meta_app,
+                content_type=content_type,
+                object_id=generic_content.id,
+            )
+
+            link.save()
+
+
+    # species of the custom taxonomy, BRANCHING species per genus, below one root taxon per subdomain
+    def create_taxa(self):
+
+        models = TaxonomyModelRouter(self.taxon_source)
+
+        root_latname = 'Benchmarkia {0}'.format(self.subdomain)
+        root_taxon = models.TaxonTreeModel.objects.filter(taxon_latname=root_latname, is_root_taxon=True).first()
+
+        if not root_taxon:
+            root_taxon = models.TaxonTreeModel.objects.create(root_latname, None, is_root_taxon=True,
+                                                              rank='kingdom')
+
+        genus = None
+
+        for counter in range(self.sizes['taxa']):
+
+            if counter % BRANCHING == 0:
+                genus_latname = 'Genus{0:05d}'.format(counter // BRANCHING)
+                genus = models.TaxonTreeModel.objects.create(genus_latname, 'Benchmark', parent=root_taxon,
+                                                             rank='genus')
+
+            species_latname = '{0} species{1:05d}'.format(genus.taxon_latname, counter)
+            species = models.TaxonTreeModel.objects.create(species_latname, 'Benchmark', parent=genus,
+                                                           rank='species')
+
+            for language_code in self.meta_app.languages():
+                models.TaxonLocaleModel.objects.create(species, '{0} {1}'.format(language_code, counter),
+                                                       language_code, preferred=True)
+
+            self.taxa.append(LazyTaxon(instance=species))
+
+
+    def create_backbone_taxa(self):
+
+        backbonetaxonomy = self.get_generic_content(BackboneTaxonomy)
+
+        for lazy_taxon in self.taxa:
+            backbone_taxon = BackboneTaxa(
+                backbonetaxonomy=backbonetaxonomy,
+            )
+            backbone_taxon.set_taxon(lazy_taxon)
+            backbone_taxon.save()
+
+
+    def create_node(self, parent_node, name, node_type, lazy_taxon=None):
+
+        meta_node = MetaNode(
+            name=name,
+            nature_guide=parent_node.nature_guide,
+            node_type=node_type,
+        )
+
+        if lazy_taxon:
+            meta_node.set_taxon(lazy_taxon)
+
+        meta_node.save()
+
+        node = NatureGuidesTaxonTree(
+            nature_guide=parent_node.nature_guide,
+            meta_node=meta_node,
+        )
+
+        node.save(parent_node)
+
+        return node
+
+
+    # groups with BRANCHING children each, the results are distributed over the groups without group children
+    def create_nature_guide(self):
+
+        nature_guide = self.get_generic_content(NatureGuide)
+        root_node = nature_guide.root_node
+
+        node_count = self.sizes['nature_guide_nodes']
+        group_count = max(node_count // BRANCHING, 1)
+        result_count = node_count - group_count
+
+        children = {root_node.pk : []}
+        parents = [root_node]
+        groups = []
+
+        for counter in range(group_count):
+
+            parent = parents[0]
+            group = self.create_node(parent, 'Group {0}'.format(counter), 'node')
+
+            children[parent.pk].append(group)
+            children[group.pk] = []
+            groups.append(group)
+            parents.append(group)
+
+            if len(children[parent.pk]) >= BRANCHING:
+                parents.pop(0)
+
+        leaf_groups = [group for group in groups if not children[group.pk]]
+
+        for counter in range(result_count):
+
+            parent = leaf_groups[counter % len(leaf_groups)]
+            lazy_taxon = None
+            if self.taxa:
+                lazy_taxon = self.taxa[counter % len(self.taxa)]
+
+            result = self.create_node(parent, 'Result {0}'.format(counter), 'result', lazy_taxon=lazy_taxon)
+            children[parent.pk].append(result)
+
+        for parent in [root_node] + groups:
+
+            for counter in range(self.sizes['matrix_filters']):
+                self.create_matrix_filter(parent, children[parent.pk], counter)
+
+            ChildrenCacheManager(parent.meta_node).rebuild_cache()
+
+        self.image_targets += [group.meta_node for group in groups]
+
+
+    def create_matrix_filter(self, parent, children, counter):
+
+        matrix_filter = MatrixFilter(
+            meta_node=parent.meta_node,
+            name='Filter {0}'.format(counter),
+            filter_type='DescriptiveTextAndImagesFilter',
+            position=counter,
+        )
+
+        matrix_filter.save()
+
+        spaces = []
+        for space_counter in range(BRANCHING):
+            space = MatrixFilterSpace(
+                matrix_filter=matrix_filter,
+                encoded_space='Trait {0} {1}'.format(counter, space_counter),
+                position=space_counter,
+            )
+            space.save()
+            spaces.append(space)
+
+        for child_counter, child in enumerate(children):
+            node_filter_space = NodeFilterSpace(
+                node=child,
+                matrix_filter=matrix_filter,
+            )
+            node_filter_space.save()
+            node_filter_space.values.add(spaces[child_counter % len(spaces)])
+
+
+    def create_taxon_profiles(self):
+
+        taxon_profiles = self.get_generic_content(TaxonProfiles)
+
+        text_types = []
+        for position, text_type_name in enumerate(TEXT_TYPES):
+            text_type = TaxonTextType(
+                taxon_profiles=taxon_profiles,
+                text_type=text_type_name,
+                position=position,
+            )
+            text_type.save()
+            text_types.append(text_type)
+
+        for lazy_taxon in self.taxa[:self.sizes['taxon_profiles']]:
+
+            taxon_profile = TaxonProfile(
+                taxon_profiles=taxon_profiles,
+                taxon=lazy_taxon,
+            )
+            taxon_profile.save()
+
+            for text_type in text_types:
+                taxon_text = TaxonText(
+                    taxon_profile=taxon_profile,
+                    taxon_text_type=text_type,
+                    text='{0} of {1}. Term 1 and Term 2 are glossary terms.'.format(text_type.text_type,
+                        lazy_taxon.taxon_latname),
+                    long_text='Long {0} of {1}.'.format(text_type.text_type.lower(), lazy_taxon.taxon_latname),
+                )
+                taxon_text.save()
+
+            self.image_targets.append(taxon_profile)
+
+
+    def create_glossary(self):
+
+        glossary = self.get_generic_content(Glossary)
+
+        for counter in range(self.sizes['glossary_terms']):
+            entry = GlossaryEntry(
+                glossary=glossary,
+                term='Term {0}'.format(counter),
+                definition='Definition of term {0}, see Term {1}.'.format(counter, (counter + 1) % max(
+                    self.sizes['glossary_terms'], 1)),
+            )
+            entry.save()
+
+
+    def get_image_file(self, counter):
+
+        color = ((counter * 37) % 256, (counter * 91) % 256, (counter * 53) % 256)
+        image = Image.new('RGB', (1200, 900), color)
+
+        image_file = io.BytesIO()
+        image.save(image_file, 'JPEG')
+
+        md5 = hashlib.md5(image.tobytes()).hexdigest()
+
+        return image_file.getvalue(), md5
+
+
+    # one image per target, groups first, then taxon profiles
+    def create_images(self):
+
+        for counter, target in enumerate(self.image_targets[:self.sizes['images']]):
+
+            content, md5 = self.get_image_file(counter)
+
+            image_store = ImageStore(
+                source_image=SimpleUploadedFile(name='benchmark-{0}.jpg'.format(counter), content=content,
+                                                content_type='image/jpeg'),
+                uploaded_by=self.user,
+                md5=md5,
+            )
+            image_store.save()
+
+            content_image = ContentImage(
+                image_store=image_store,
+                content_type=ContentType.objects.get_for_model(target),
+                object_id=target.id,
+                image_type='image',
+            )
+            content_image.save()
+
+
+    # the secondary languages are complete
+    def create_localizations(self):
+
+        builder = AppReleaseBuilder(self.meta_app)
+        builder.fill_primary_localization()
+
+        self.meta_app.refresh_from_db()
+        primary_localization = self.meta_app.localizations[self.meta_app.primary_language]
+
+        for language_code in self.meta_app.secondary_languages():
+
+            localization = {}
+
+            for key, value in primary_localization.items():
+                if isinstance(value, str):
+                    localization[key] = '[{0}] {1}'.format(language_code, value)
+
+            self.meta_app.localizations[language_code] = localization
+
+        self.meta_app.save()
+
+
+
+class BuildBenchmark:
+
+    def __init__(self, meta_app, label=None):
+        self.meta_app = meta_app
+        self.label = label
+
+
+    # {settings.APP_KIT_ROOT}/benchmarks/{app uid}/
+    @classmethod
+    def get_results_path(cls, meta_app):
+        return os.path.join(settings.APP_KIT_ROOT, 'benchmarks', meta_app.app.uid)
+
+
+    def get_app_sizes(self):
+
+        backbonetaxonomy = self.meta_app.backbone()
+
+        sizes = {
+            'taxa' : BackboneTaxa.objects.filter(backbonetaxonomy=backbonetaxonomy).count(),
+            'languages' : len(self.meta_app.languages()),
+            'nature_guide_nodes' : 0,
+            'matrix_filters' : 0,
+            'taxon_profiles' : 0,
+            'glossary_terms' : 0,
+        }
+
+        for link in MetaAppGenericContent.objects.filter(meta_app=self.meta_app):
+
+            generic_content = link.generic_content
+
+            if isinstance(generic_content, NatureGuide):
+                sizes['nature_guide_nodes'] += NatureGuidesTaxonTree.objects.filter(
+                    nature_guide=generic_content).count()
+                sizes['matrix_filters'] += MatrixFilter.objects.filter(
+                    meta_node__nature_guide=generic_content).count()
+
+            elif isinstance(generic_content, TaxonProfiles):
+                sizes['taxon_profiles'] += TaxonProfile.objects.filter(taxon_profiles=generic_content).count()
+
+            elif isinstance(generic_content, Glossary):
+                sizes['glossary_terms'] += GlossaryEntry.objects.filter(glossary=generic_content).count()
+
+        return sizes
+
+
+    # full=True runs build() including the browser and the platforms
+    def run(self, full=False):
+
+        started_at = time.time()
+
+        builder = AppReleaseBuilder(self.meta_app)
+        builder.logger = builder._get_logger('benchmark')
+
+        validation = None
+
+        if full == True:
+            build_report = builder.build()
+            phases = build_report['phases']
+
+        else:
+            builder.build_profiler = BuildProfiler(builder)
+
+            with builder.build_profiler.phase('validate'):
+                validation_result = builder.validate()
+
+            if validation_result:
+                validation = {
+                    'errors' : len(validation_result['errors']),
+                    'warnings' : len(validation_result['warnings']),
+                }
+
+            builder._prepare_build()
+
+            image_processes = getattr(settings, 'APP_KIT_IMAGE_PROCESSES', 1)
+
+            with builder.build_profiler.phase('common_www'):
+                builder._build_common_www()
+
+            with builder.build_profiler.phase('app_assets'):
+                builder._build_app_assets()
+
+            with builder.build_profiler.phase('images', processes=image_processes):
+                builder.content_image_builder.process_image_jobs(processes=image_processes)
+
+            phases = builder.build_profiler.get_report()
+
+        top_level_phases = [phase for phase in phases if phase['depth'] == 0]
+
+        result = {
+            'version' : BENCHMARK_VERSION,
+            'label' : self.label,
+            'full' : full,
+            'app' : {
+                'uid' : self.meta_app.app.uid,
+                'app_version' : self.meta_app.current_version,
+                'sizes' : self.get_app_sizes(),
+            },
+            'settings' : dict([(name, getattr(settings, name, None)) for name in BENCHMARK_SETTINGS]),
+            'validation' : validation,
+            'started_at' : int(started_at),
+            'wall_time' : round(time.time() - started_at, 3),
+            'queries' : sum([phase.get('queries', 0) for phase in top_level_phases]),
+            'phases' : phases,
+        }
+
+        return result
+
+
+    def save(self, result, filepath=None):
+
+        if not filepath:
+            filename = '{0}.json'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(result['started_at'])))
+            filepath = os.path.join(self.get_results_path(self.meta_app), filename)
+
+        folder = os.path.dirname(filepath)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        with open(filepath, 'w', encoding='utf-8') as result_file:
+            json.dump(result, result_file, indent=4)
+
+        return filepath
+
+
+    @classmethod
+    def load(cls, filepath):
+        with open(filepath, 'r', encoding='utf-8') as result_file:
+            return json.load(result_file)
+
+
+# phases with the same name and depth are summed up, e.g. all NatureGuide phases
+def aggregate_phases(phases):
+
+    aggregated = {}
+
+    for phase in phases:
+
+        key = (phase['depth'], phase['name'])
+
+        if key not in aggregated:
+            aggregated[key] = {
+                'name' : phase['name'],
+                'depth' : phase['depth'],
+                'wall_time' : 0,
+                'queries' : 0,
+            }
+
+        aggregated[key]['wall_time'] += phase.get('wall_time', 0)
+        aggregated[key]['queries'] += phase.get('queries', 0)
+
+    return aggregated
+
+
+# returns one row per phase: name, depth, wall times and queries of both results, in the order of result
+def compare_results(previous_result, result):
+
+    previous_phases = aggregate_phases(previous_result['phases'])
+    phases = aggregate_phases(result['phases'])
+
+    rows = []
+
+    for key, phase in phases.items():
+
+        previous_phase = previous_phases.get(key, None)
+
+        row = {
+            'name' : phase['name'],
+            'depth' : phase['depth'],
+            'previous_wall_time' : None,
+            'wall_time' : round(phase['wall_time'], 3),
+            'wall_time_change' : None,
+            'previous_queries' : None,
+            'queries' : phase['queries'],
+        }
+
+        if previous_phase:
+            row['previous_wall_time'] = round(previous_phase['wall_time'], 3)
+            row['previous_queries'] = previous_phase['queries']
+
+            if previous_phase['wall_time']:
+                row['wall_time_change'] = round(
+                    (phase['wall_time'] - previous_phase['wall_time']) / previous_phase['wall_time'], 3)
+
+        rows.append(row)
+
+    return rows
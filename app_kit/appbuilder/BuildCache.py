@@ -0,0 +1,761 @@
+###################################################################################################################
+#
+# INCREMENTAL BUILDS
+# - every published MetaAppGenericContent gets a fingerprint: its database rows, options, the locale slice
+#   it depends on and the fingerprints of the features it depends on
+# - while a feature is built, its side effects are recorded: written files, changes of the builder
+#   accumulators (build_features, licence_registry, taxon_slugs, ...) and additions to the locale files
+#   only the output paths of the feature are compared before and after building it, see get_output_paths
+# - taxonomic features also depend on the state of the taxonomic sources (settings.TAXONOMY_DATABASES), see
+#   get_taxonomy_fingerprint
+# - if the fingerprint of a feature did not change since the previous build of the same app version,
+#   the recorded files are restored from the previous www folder and the recorded changes are replayed
+#
+###################################################################################################################
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.contrib.contenttypes.models import ContentType
+
+from app_kit.models import MetaAppGenericContent, ContentImage
+from app_kit.generic import AppContentTaxonomicRestriction
+from app_kit.taxonomy.models import MetaVernacularNames
+
+from taxonomy.models import TaxonomyModelRouter
+
+from app_kit.features.nature_guides.models import (NatureGuidesTaxonTree, MetaNode, MatrixFilter,
+    MatrixFilterSpace, NodeFilterSpace, NatureGuideCrosslinks, MatrixFilterRestriction)
+from app_kit.features.generic_forms.models import GenericFieldToGenericForm, GenericField, GenericValues
+from app_kit.features.glossary.models import GlossaryEntry, GlossaryEntryCategory, TermSynonym
+from app_kit.features.backbonetaxonomy.models import BackboneTaxa, TaxonRelationshipType, TaxonRelationship
+from app_kit.features.taxon_profiles.models import (TaxonTextTypeCategory, TaxonTextType, TaxonTextSet,
+    TaxonTextSetTaxonTextType, TaxonProfile, TaxonText, TaxonProfilesNavigation, TaxonProfilesNavigationEntry,
+    TaxonProfilesNavigationEntryTaxa)
+from app_kit.features.maps.models import MapGeometries, MapTaxonomicFilter, FilterTaxon
+
+from app_kit.appbuilder.TaxonProfilePacks import TaxonProfilePackWriter
+
+import os, json, hashlib, shutil, copy
+
+# bump this if the output of any _build_* method changes, this invalidates all stored records
+BUILD_CACHE_VERSION = 1
+
+# fields of GenericContent which change during build() without changing the built output
+VOLATILE_GENERIC_CONTENT_FIELDS = ['is_locked', 'published_version']
+
+# these features use the complete app localization, e.g. for glossarizing texts
+FULL_LOCALIZATION_FEATURES = ['Glossary', 'TaxonProfiles']
+
+# these features collect data of all other features, e.g. taxa or inactivated nuids
+DEPENDS_ON_ALL_FEATURES = ['BackboneTaxonomy', 'TaxonProfiles']
+
+# these features are built before all other features, as in the sequential build:
+# - the glossary adds its entries to the locale first
+# - taxon slugs are assigned first come, the backbone taxonomy assigns the slugs of all taxa of the app
+READ_BY_ALL_FEATURES = ['Glossary', 'BackboneTaxonomy']
+
+# the models of each taxonomic source read by the taxonomic features: names, synonyms and vernacular names
+TAXONOMY_SOURCE_MODELS = ['TaxonTreeModel', 'TaxonSynonymModel', 'TaxonLocaleModel']
+
+# these features read the taxonomy of the app, including MetaVernacularNames
+TAXONOMIC_FEATURES = ['BackboneTaxonomy', 'TaxonProfiles', 'NatureGuide', 'GenericForm', 'Map']
+
+
+###################################################################################################################
+# ACCUMULATOR DELTAS
+# - a delta is a list of [path, operation, value] entries
+# - operations: set, delete, extend (list), merge (list of dicts with uuid), update (set)
+# - deltas are stored as json
+###################################################################################################################
+
+def get_delta(before, after, path=[]):
+
+    delta = []
+
+    if isinstance(before, dict) and isinstance(after, dict):
+
+        for key, value in after.items():
+
+            if key not in before:
+                delta.append([path + [key], 'set', _encode_value(value)])
+
+            elif before[key] != value:
+                delta += get_delta(before[key], value, path + [key])
+
+        for key in before.keys():
+            if key not in after:
+                delta.append([path + [key], 'delete', None])
+
+    elif isinstance(before, list) and isinstance(after, list) and after[:len(before)] == before:
+        delta.append([path, 'extend', after[len(before):]])
+
+    # e.g. build_features[GenericForm]['list'], isDefault of existing entries might have changed
+    elif isinstance(before, list) and isinstance(after, list) and _is_uuid_list(before + after):
+        changed = [entry for entry in after if entry not in before]
+        delta.append([path, 'merge', copy.deepcopy(changed)])
+
+    elif isinstance(before, set) and isinstance(after, set) and before.issubset(after):
+        delta.append([path, 'update', sorted(after - before)])
+
+    else:
+        delta.append([path, 'set', _encode_value(after)])
+
+    return delta
+
+
+def _is_uuid_list(entries):
+    for entry in entries:
+        if not isinstance(entry, dict) or 'uuid' not in entry:
+            return False
+    return True
+
+
+def _merge_uuid_list(entries, changed_entries):
+    for changed_entry in copy.deepcopy(changed_entries):
+        for index, entry in enumerate(entries):
+            if entry['uuid'] == changed_entry['uuid']:
+                entries[index] = changed_entry
+                break
+        else:
+            entries.append(changed_entry)
+
+
+# sets are not json serializable
+def _encode_value(value):
+    if isinstance(value, set):
+        return {'__set__' : sorted(value)}
+    return copy.deepcopy(value)
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and list(value.keys()) == ['__set__']:
+        return set(value['__set__'])
+    return copy.deepcopy(value)
+
+
+# returns the new value, the passed value is modified in place if possible
+def apply_delta(value, delta):
+
+    for path, operation, delta_value in delta:
+
+        if not path:
+            if operation == 'extend':
+                value.extend(copy.deepcopy(delta_value))
+            elif operation == 'merge':
+                _merge_uuid_list(value, delta_value)
+            elif operation == 'update':
+                value.update(delta_value)
+            else:
+                value = _decode_value(delta_value)
+            continue
+
+        parent = value
+        for key in path[:-1]:
+            parent = parent[key]
+
+        key = path[-1]
+
+        if operation == 'set':
+            # the key has been added by another feature since, e.g. the taxon slugs of a language
+            if isinstance(parent.get(key, None), dict) and isinstance(delta_value, dict) and \
+                    list(delta_value.keys()) != ['__set__']:
+                parent[key].update(_decode_value(delta_value))
+            else:
+                parent[key] = _decode_value(delta_value)
+        elif operation == 'delete':
+            if key in parent:
+                del parent[key]
+        elif operation == 'extend':
+            parent[key].extend(copy.deepcopy(delta_value))
+        elif operation == 'merge':
+            _merge_uuid_list(parent[key], delta_value)
+        elif operation == 'update':
+            parent[key].update(delta_value)
+
+    return value
+
+
+
+class FeatureBuildCache:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+        self.meta_app = app_release_builder.meta_app
+
+        self.enabled = getattr(settings, 'APP_KIT_INCREMENTAL_BUILDS', False)
+
+        self.previous_records = {}
+        self.records = {}
+
+        # filled by _add_to_locale while a feature is recorded
+        self.locale_additions = None
+
+        self.content_fingerprints = {}
+        self.full_localization_fingerprint = None
+        self.taxonomy_fingerprint = None
+
+        self.report = {
+            'enabled' : self.enabled,
+            'built' : [],
+            'reused' : [],
+        }
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/build_cache/release/
+    # lies outside the builder path, which is deleted at the beginning of each build
+    @property
+    def cache_path(self):
+        return os.path.join(self.app_release_builder._app_version_root_path, 'build_cache',
+            self.app_release_builder._builder_identifier)
+
+    @property
+    def records_filepath(self):
+        return os.path.join(self.cache_path, 'features.json')
+
+    @property
+    def previous_www_path(self):
+        return os.path.join(self.cache_path, 'previous_www')
+
+    @property
+    def www_path(self):
+        return self.app_release_builder._app_www_path
+
+
+    ###############################################################################################################
+    # BUILD LIFECYCLE
+    ###############################################################################################################
+
+    # has to be called before the builder path is deleted
+    def prepare(self):
+
+        if os.path.isdir(self.previous_www_path):
+            shutil.rmtree(self.previous_www_path)
+
+        if not self.enabled:
+            if os.path.isdir(self.cache_path):
+                shutil.rmtree(self.cache_path)
+            return
+
+        if not os.path.isdir(self.cache_path):
+            os.makedirs(self.cache_path)
+
+        if os.path.isfile(self.records_filepath):
+
+            with open(self.records_filepath, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+
+            # records of a failed build are never reused
+            os.remove(self.records_filepath)
+
+            if stored.get('version') == BUILD_CACHE_VERSION and os.path.isdir(self.www_path):
+                self.previous_records = stored['features']
+
+                # keep the previous www folder, it is the source for restoring unchanged features
+                os.replace(self.www_path, self.previous_www_path)
+
+
+    def finish(self):
+
+        if not self.enabled:
+            return
+
+        stored = {
+            'version' : BUILD_CACHE_VERSION,
+            'features' : self.records,
+        }
+
+        with open(self.records_filepath, 'w', encoding='utf-8') as f:
+            json.dump(stored, f)
+
+        self.discard()
+
+
+    def discard(self):
+        if os.path.isdir(self.previous_www_path):
+            shutil.rmtree(self.previous_www_path)
+
+
+    def get_report(self):
+        return self.report
+
+
+    ###############################################################################################################
+    # BUILDING A FEATURE
+    # - build_method is one of the AppReleaseBuilder._build_* methods
+    ###############################################################################################################
+
+    def build_feature(self, app_generic_content, build_method):
+
+        if not self.enabled:
+            build_method(app_generic_content)
+            return
+
+        if self.restore_feature(app_generic_content):
+            return
+
+        record = self.record(app_generic_content, build_method)
+        self.add_record(app_generic_content, record)
+
+
+    def get_report_entry(self, app_generic_content):
+
+        generic_content = app_generic_content.generic_content
+
+        report_entry = {
+            'type' : generic_content.__class__.__name__,
+            'uuid' : str(generic_content.uuid),
+        }
+
+        return report_entry
+
+
+    # returns True if the feature has been restored from the previous build
+    def restore_feature(self, app_generic_content):
+
+        if not self.enabled:
+            return False
+
+        record_key = str(app_generic_content.generic_content.uuid)
+        previous_record = self.previous_records.get(record_key, None)
+
+        if previous_record and previous_record['fingerprint'] == self.get_fingerprint(app_generic_content):
+
+            if self.restore(previous_record):
+                self.records[record_key] = previous_record
+                self.report['reused'].append(self.get_report_entry(app_generic_content))
+                return True
+
+        return False
+
+
+    # store the record of a freshly built feature for the next build
+    def add_record(self, app_generic_content, record):
+
+        if not self.enabled:
+            return
+
+        self.report['built'].append(self.get_report_entry(app_generic_content))
+
+        # only json serializable records can be stored
+        try:
+            json.dumps(record)
+        except (TypeError, ValueError):
+            return
+
+        record_key = str(app_generic_content.generic_content.uuid)
+        record['fingerprint'] = self.get_fingerprint(app_generic_content)
+        self.records[record_key] = record
+
+
+    def get_accumulators(self):
+
+        builder = self.app_release_builder
+
+        accumulators = {
+            'build_features' : builder.build_features,
+            'licence_registry' : builder.licence_registry,
+            'taxon_slugs' : builder.taxon_slugs,
+            'app_settings' : builder.app_settings,
+            'aggregated_node_filter_space_cache' : builder.aggregated_node_filter_space_cache,
+            'inactivated_nuids' : builder.inactivated_nuids,
+            'image_cache' : builder.content_image_builder.image_cache,
+        }
+
+        return accumulators
+
+
+    def set_accumulator(self, name, value):
+        if name == 'image_cache':
+            self.app_release_builder.content_image_builder.image_cache = value
+        else:
+            setattr(self.app_release_builder, name, value)
+
+
+    # the files and folders a feature writes, its images are recorded by ContentImageBuilder
+    def get_output_paths(self, app_generic_content):
+
+        builder = self.app_release_builder
+        generic_content = app_generic_content.generic_content
+
+        output_paths = [builder._app_absolute_generic_content_path(generic_content)]
+
+        if generic_content.__class__.__name__ == 'Glossary':
+            for language_code in self.meta_app.languages():
+                output_paths.append(builder._app_glossarized_locale_filepath(language_code))
+
+        return output_paths
+
+
+    # returns {relative_path : [size, mtime]} of all files of output_paths
+    def get_www_snapshot(self, output_paths):
+
+        snapshot = {}
+
+        def add_file(filepath):
+            stat = os.stat(filepath)
+            relative_path = os.path.relpath(filepath, self.www_path)
+            snapshot[relative_path] = [stat.st_size, stat.st_mtime_ns]
+
+        for output_path in output_paths:
+
+            if os.path.isfile(output_path):
+                add_file(output_path)
+
+            for root, dirs, files in os.walk(output_path):
+                for filename in files:
+                    add_file(os.path.join(root, filename))
+
+        return snapshot
+
+
+    # the locale files are modified by _add_to_locale, those additions are replayed instead of restored
+    def get_replayed_files(self):
+
+        replayed_files = set([])
+
+        for language_code in self.meta_app.languages():
+            locale_filepath = self.app_release_builder._app_locale_filepath(language_code)
+            replayed_files.add(os.path.relpath(locale_filepath, self.www_path))
+
+        return replayed_files
+
+
+    def record(self, app_generic_content, build_method):
+
+        builder = self.app_release_builder
+        content_image_builder = builder.content_image_builder
+
+        accumulators_before = copy.deepcopy(self.get_accumulators())
+
+        output_paths = self.get_output_paths(app_generic_content)
+        snapshot_before = self.get_www_snapshot(output_paths)
+
+        self.locale_additions = []
+        content_image_builder.recorded_image_urls = set([])
+
+        try:
+            build_method(app_generic_content)
+        finally:
+            recorded_image_urls = content_image_builder.recorded_image_urls
+            content_image_builder.recorded_image_urls = None
+            locale_additions = self.locale_additions
+            self.locale_additions = None
+
+        snapshot_after = self.get_www_snapshot(output_paths)
+        replayed_files = self.get_replayed_files()
+
+        files = set([])
+        for relative_path, stat in snapshot_after.items():
+            if relative_path not in replayed_files and snapshot_before.get(relative_path, None) != stat:
+                files.add(relative_path)
+
+        # images might have been built by a previous feature, they are required nevertheless
+        for image_url in recorded_image_urls:
+            files.add(image_url.lstrip('/'))
+
+        image_licences = {}
+        for image_url in recorded_image_urls:
+            if image_url in builder.licence_registry['licences']:
+                image_licences[image_url] = builder.licence_registry['licences'][image_url]
+
+        deltas = {}
+        for name, value in self.get_accumulators().items():
+            deltas[name] = get_delta(accumulators_before[name], value)
+
+        record = {
+            'files' : sorted(files),
+            'deltas' : deltas,
+            'locale_additions' : locale_additions,
+            'image_licences' : image_licences,
+        }
+
+        return record
+
+
+    def record_locale_addition(self, dictionary, language_code):
+        if self.locale_additions is not None:
+            self.locale_additions.append([language_code, copy.deepcopy(dictionary)])
+
+
+    # returns False if the previous build output is incomplete, the feature has to be rebuilt then
+    def restore(self, record):
+
+        for relative_path in record['files']:
+            if not os.path.isfile(os.path.join(self.previous_www_path, relative_path)):
+                return False
+
+        for relative_path in record['files']:
+
+            source_filepath = os.path.join(self.previous_www_path, relative_path)
+            destination_filepath = os.path.join(self.www_path, relative_path)
+
+            destination_folder = os.path.dirname(destination_filepath)
+            if not os.path.isdir(destination_folder):
+                os.makedirs(destination_folder)
+
+            shutil.copy2(source_filepath, destination_filepath)
+
+        self.replay(record)
+
+        return True
+
+
+    # apply the recorded changes of accumulators and locales
+    def replay(self, record):
+
+        accumulators = self.get_accumulators()
+
+        for name, delta in record['deltas'].items():
+            value = apply_delta(accumulators[name], delta)
+            self.set_accumulator(name, value)
+
+        self.app_release_builder.licence_registry['licences'].update(record['image_licences'])
+
+        for language_code, dictionary in record['locale_additions']:
+            self.app_release_builder._add_to_locale(dictionary, language_code)
+
+
+    ###############################################################################################################
+    # FINGERPRINTS
+    ###############################################################################################################
+
+    def get_fingerprint(self, app_generic_content):
+
+        generic_content = app_generic_content.generic_content
+        generic_content_type = generic_content.__class__.__name__
+
+        hasher = hashlib.sha256()
+        hasher.update(self.get_content_fingerprint(app_generic_content).encode())
+
+        if generic_content_type in FULL_LOCALIZATION_FEATURES:
+            hasher.update(self.get_full_localization_fingerprint().encode())
+
+        if generic_content_type in TAXONOMIC_FEATURES:
+            hasher.update(self.get_taxonomy_fingerprint().encode())
+
+        if generic_content_type in DEPENDS_ON_ALL_FEATURES:
+
+            links = MetaAppGenericContent.objects.filter(meta_app=self.meta_app).order_by('pk')
+
+            for link in links:
+                if link.pk != app_generic_content.pk:
+                    hasher.update(link.publication_status.encode())
+                    hasher.update(self.get_content_fingerprint(link).encode())
+
+        return hasher.hexdigest()
+
+
+    def get_content_fingerprint(self, app_generic_content):
+
+        if app_generic_content.pk in self.content_fingerprints:
+            return self.content_fingerprints[app_generic_content.pk]
+
+        generic_content = app_generic_content.generic_content
+        generic_content_type = generic_content.__class__.__name__
+
+        hasher = hashlib.sha256()
+
+        # the json output format is part of the output
+        json_writer = self.app_release_builder.json_writer
+
+        self._update_hasher(hasher, [BUILD_CACHE_VERSION, generic_content_type, self.meta_app.languages(),
+            self.meta_app.global_options, app_generic_content.options, json_writer.minify,
+            TaxonProfilePackWriter.is_enabled()])
+
+        fields = [field.attname for field in generic_content._meta.concrete_fields
+                  if field.attname not in VOLATILE_GENERIC_CONTENT_FIELDS]
+        self._update_hasher_with_queryset(hasher,
+            generic_content.__class__.objects.filter(pk=generic_content.pk), fields=fields)
+
+        # the locale slice of this feature, all languages
+        primary_localization = generic_content.get_primary_localization(meta_app=self.meta_app)
+        localizations = self.meta_app.localizations or {}
+
+        for language_code in self.meta_app.languages():
+            locale = localizations.get(language_code, {})
+            locale_slice = [[key, locale.get(key, None)] for key in sorted(primary_localization.keys())]
+            self._update_hasher(hasher, [language_code, locale_slice])
+
+        fingerprint_method = getattr(self, '_fingerprint_{0}'.format(generic_content_type), None)
+        if fingerprint_method:
+            fingerprint_method(hasher, generic_content)
+
+        fingerprint = hasher.hexdigest()
+        self.content_fingerprints[app_generic_content.pk] = fingerprint
+
+        return fingerprint
+
+
+    def get_full_localization_fingerprint(self):
+
+        if self.full_localization_fingerprint is None:
+            hasher = hashlib.sha256()
+            self._update_hasher(hasher, self.meta_app.localizations or {})
+            self.full_localization_fingerprint = hasher.hexdigest()
+
+        return self.full_localization_fingerprint
+
+
+    # the taxonomic sources are too large to be hashed row by row, the state of their tables is used instead
+    def get_taxonomy_fingerprint(self):
+
+        if self.taxonomy_fingerprint is None:
+            hasher = hashlib.sha256()
+            self._update_hasher_with_queryset(hasher, MetaVernacularNames.objects.all())
+
+            for taxon_source in [database[0] for database in settings.TAXONOMY_DATABASES]:
+
+                models = TaxonomyModelRouter(taxon_source)
+
+                for model_name in TAXONOMY_SOURCE_MODELS:
+                    model = getattr(models, model_name, None)
+                    if model is not None:
+                        self._update_hasher(hasher, [taxon_source, model_name, self.get_table_state(model)])
+
+            self.taxonomy_fingerprint = hasher.hexdigest()
+
+        return self.taxonomy_fingerprint
+
+
+    # number of rows, highest primary key and the modification counters of postgres
+    # the counters also change if existing rows are updated, e.g. renamed taxa
+    def get_table_state(self, model):
+
+        queryset = model.objects.all()
+        table_state = queryset.aggregate(count=Count('pk'), max_pk=Max('pk'))
+
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('SELECT n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables WHERE relid = to_regclass(%s)',
+                           [model._meta.db_table])
+            table_state['modifications'] = cursor.fetchone()
+
+        return table_state
+
+
+    def _update_hasher(self, hasher, data):
+        hasher.update(json.dumps(data, sort_keys=True, default=str).encode())
+
+
+    def _update_hasher_with_queryset(self, hasher, queryset, fields=[]):
+        for row in queryset.order_by('pk').values_list(*fields).iterator():
+            self._update_hasher(hasher, row)
+
+
+    # content images of all instances of queryset, including the hash of the source image
+    def _update_hasher_with_content_images(self, hasher, queryset):
+
+        content_type = ContentType.objects.get_for_model(queryset.model)
+
+        content_images = ContentImage.objects.filter(content_type=content_type,
+            object_id__in=queryset.values('pk'))
+
+        fields = [field.attname for field in ContentImage._meta.concrete_fields] + ['image_store__md5']
+
+        self._update_hasher_with_queryset(hasher, content_images, fields=fields)
+
+
+    def _update_hasher_with_querysets(self, hasher, querysets, image_querysets=[]):
+
+        for queryset in querysets:
+            self._update_hasher_with_queryset(hasher, queryset)
+
+        for queryset in image_querysets:
+            self._update_hasher_with_content_images(hasher, queryset)
+
+
+    def _fingerprint_NatureGuide(self, hasher, nature_guide):
+
+        nature_guides = nature_guide.__class__.objects.filter(pk=nature_guide.pk)
+        meta_nodes = MetaNode.objects.filter(nature_guide=nature_guide)
+        nodes = NatureGuidesTaxonTree.objects.filter(nature_guide=nature_guide)
+        matrix_filters = MatrixFilter.objects.filter(meta_node__nature_guide=nature_guide)
+        spaces = MatrixFilterSpace.objects.filter(matrix_filter__meta_node__nature_guide=nature_guide)
+
+        querysets = [
+            meta_nodes,
+            nodes,
+            matrix_filters,
+            spaces,
+            NodeFilterSpace.objects.filter(node__nature_guide=nature_guide),
+            NatureGuideCrosslinks.objects.filter(parent__nature_guide=nature_guide),
+            MatrixFilterRestriction.objects.filter(restricted_matrix_filter__meta_node__nature_guide=nature_guide),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets,
+            image_querysets=[nature_guides, meta_nodes, nodes, spaces])
+
+
+    def _fingerprint_GenericForm(self, hasher, generic_form):
+
+        generic_fields = GenericField.objects.filter(genericfieldtogenericform__generic_form=generic_form)
+
+        querysets = [
+            GenericFieldToGenericForm.objects.filter(generic_form=generic_form),
+            generic_fields,
+            GenericValues.objects.filter(generic_field__genericfieldtogenericform__generic_form=generic_form),
+            AppContentTaxonomicRestriction.objects.filter(
+                content_type=ContentType.objects.get_for_model(GenericField),
+                object_id__in=generic_fields.values('pk')),
+            AppContentTaxonomicRestriction.objects.filter(
+                content_type=ContentType.objects.get_for_model(generic_form), object_id=generic_form.pk),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets)
+
+
+    def _fingerprint_Glossary(self, hasher, glossary):
+
+        glossary_entries = GlossaryEntry.objects.filter(glossary=glossary)
+
+        querysets = [
+            glossary_entries,
+            GlossaryEntryCategory.objects.filter(glossary=glossary),
+            TermSynonym.objects.filter(glossary_entry__glossary=glossary),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets, image_querysets=[glossary_entries])
+
+
+    def _fingerprint_BackboneTaxonomy(self, hasher, backbone_taxonomy):
+
+        querysets = [
+            BackboneTaxa.objects.filter(backbonetaxonomy=backbone_taxonomy),
+            TaxonRelationshipType.objects.filter(backbonetaxonomy=backbone_taxonomy),
+            TaxonRelationship.objects.filter(backbonetaxonomy=backbone_taxonomy),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets)
+
+
+    def _fingerprint_TaxonProfiles(self, hasher, taxon_profiles):
+
+        taxon_profiles_queryset = TaxonProfile.objects.filter(taxon_profiles=taxon_profiles)
+        taxon_texts = TaxonText.objects.filter(taxon_profile__taxon_profiles=taxon_profiles)
+        navigation_entries = TaxonProfilesNavigationEntry.objects.filter(
+            navigation__taxon_profiles=taxon_profiles)
+
+        querysets = [
+            TaxonTextTypeCategory.objects.filter(taxon_profiles=taxon_profiles),
+            TaxonTextType.objects.filter(taxon_profiles=taxon_profiles),
+            TaxonTextSet.objects.filter(taxon_profiles=taxon_profiles),
+            TaxonTextSetTaxonTextType.objects.filter(taxon_text_set__taxon_profiles=taxon_profiles),
+            taxon_profiles_queryset,
+            taxon_texts,
+            TaxonProfilesNavigation.objects.filter(taxon_profiles=taxon_profiles),
+            navigation_entries,
+            TaxonProfilesNavigationEntryTaxa.objects.filter(
+                navigation_entry__navigation__taxon_profiles=taxon_profiles),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets,
+            image_querysets=[taxon_profiles_queryset, taxon_texts, navigation_entries])
+
+
+    def _fingerprint_Map(self, hasher, map):
+
+        querysets = [
+            MapGeometries.objects.filter(map=map),
+            MapTaxonomicFilter.objects.filter(map=map),
+            FilterTaxon.objects.filter(taxonomic_filter__map=map),
+        ]
+
+        self._update_hasher_with_querysets(hasher, querysets)
@@ -0,0 +1,297 @@
+###################################################################################################################
+#
+# BUILD CHECKPOINTS
+# - optional, enabled by settings.APP_KIT_RESUMABLE_BUILDS = True
+# - AppReleaseBuilder.build() records each completed top level phase, the report of the phase and a digest of
+#   the files the phase has written:
+#   {
+#       "version" : 1,
+#       "app_version" : 3,
+#       "build_number" : 12,
+#       "fingerprint" : "...",
+#       "phases" : [
+#           {"name" : "www", "outputs" : ["/abs/path"], "digest" : "...", "report" : {...}}
+#       ]
+#   }
+# - if a build dies, the next build of the same app version resumes after the last completed phase, if
+#     - the content of the app has not changed, see get_build_fingerprint
+#     - the outputs of the completed phases are unchanged. Later phases write into the outputs of earlier
+#       phases, so the digests of all completed phases are refreshed after each phase. A phase with modified
+#       outputs, e.g. by a phase which died halfway, is built again, including all following phases.
+# - a resumed build keeps the build number of the interrupted build
+# - the checkpoints are removed after a successful build
+#
+# CANCELLATION
+# - AppReleaseBuilder.cancel_build() removes a queued build task or creates a flag file, the running build
+#   checks the flag between the phases and while looping over taxa and raises BuildCancelled
+# - the flag is removed when a build starts and when it ends, a killed build leaves its flag behind
+# - checkpoints and flag lie outside the builder path, which is deleted at the beginning of each build
+#
+###################################################################################################################
+from django.conf import settings
+
+from app_kit.models import MetaAppGenericContent
+from app_kit.appbuilder.BuildCache import FeatureBuildCache
+
+import os, json, hashlib, time
+
+CHECKPOINT_VERSION = 1
+
+# seconds between two checks of the cancel flag inside loops
+CANCEL_CHECK_INTERVAL = 1
+
+
+class BuildCancelled(Exception):
+    pass
+
+
+# sha256 over the relative paths, sizes and modification times of all files of paths
+# paths can be files or folders, missing paths are part of the digest
+def get_outputs_digest(paths):
+
+    hasher = hashlib.sha256()
+
+    for path in paths:
+
+        hasher.update(path.encode())
+
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            hasher.update('{0}:{1}'.format(stat.st_size, stat.st_mtime_ns).encode())
+
+        elif os.path.isdir(path):
+
+            for root, dirs, filenames in os.walk(path, followlinks=True):
+
+                dirs.sort()
+
+                for filename in sorted(filenames):
+                    filepath = os.path.join(root, filename)
+                    relative_path = os.path.relpath(filepath, path)
+                    stat = os.stat(filepath)
+                    hasher.update('{0}:{1}:{2}'.format(relative_path, stat.st_size, stat.st_mtime_ns).encode())
+
+        else:
+            hasher.update(b'missing')
+
+    return hasher.hexdigest()
+
+
+class BuildCheckpoints:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+        self.meta_app = app_release_builder.meta_app
+
+        self.enabled = getattr(settings, 'APP_KIT_RESUMABLE_BUILDS', False)
+
+        self.fingerprint = None
+        self.phases = []
+
+        # time of the last check of the cancel flag
+        self.cancel_checked_at = 0
+
+        self.report = {
+            'enabled' : self.enabled,
+            'resumed' : False,
+            'skipped' : [],
+        }
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/build_checkpoints/release/
+    @property
+    def checkpoints_path(self):
+        return os.path.join(self.app_release_builder._app_version_root_path, 'build_checkpoints',
+            self.app_release_builder._builder_identifier)
+
+    @property
+    def checkpoints_filepath(self):
+        return os.path.join(self.checkpoints_path, 'checkpoints.json')
+
+    @property
+    def cancel_filepath(self):
+        return os.path.join(self.checkpoints_path, 'cancel')
+
+
+    def get_report(self):
+        return self.report
+
+
+    ###############################################################################################################
+    # CANCELLATION
+    ###############################################################################################################
+
+    def request_cancel(self):
+
+        if not os.path.isdir(self.checkpoints_path):
+            os.makedirs(self.checkpoints_path)
+
+        with open(self.cancel_filepath, 'w') as f:
+            f.write(str(int(time.time())))
+
+
+    def clear_cancel(self):
+        if os.path.isfile(self.cancel_filepath):
+            os.remove(self.cancel_filepath)
+
+
+    def is_cancel_requested(self):
+        return os.path.isfile(self.cancel_filepath)
+
+
+    # called frequently inside loops, the flag is read at most once per CANCEL_CHECK_INTERVAL
+    def check_cancelled(self, force=False):
+
+        now = time.time()
+
+        if force == False and now - self.cancel_checked_at < CANCEL_CHECK_INTERVAL:
+            return
+
+        self.cancel_checked_at = now
+
+        if self.is_cancel_requested():
+            raise BuildCancelled('The build of meta_app.id={0} has been cancelled'.format(self.meta_app.id))
+
+
+    ###############################################################################################################
+    # CHECKPOINTS
+    ###############################################################################################################
+
+    # the build number is not part of the fingerprint, a resumed build keeps the build number
+    def get_build_fingerprint(self):
+
+        hasher = hashlib.sha256()
+
+        feature_build_cache = FeatureBuildCache(self.app_release_builder)
+
+        data = [CHECKPOINT_VERSION, self.meta_app.current_version, self.meta_app.languages(),
+                self.meta_app.build_settings, self.meta_app.global_options]
+        hasher.update(json.dumps(data, sort_keys=True, default=str).encode())
+
+        links = MetaAppGenericContent.objects.filter(meta_app=self.meta_app).order_by('pk')
+
+        for link in links:
+            hasher.update('{0}:{1}'.format(link.pk, link.publication_status).encode())
+            hasher.update(feature_build_cache.get_fingerprint(link).encode())
+
+        return hasher.hexdigest()
+
+
+    # returns True if the build resumes from the stored checkpoints
+    def load(self):
+
+        self.phases = []
+
+        if not self.enabled:
+            self.clear()
+            return False
+
+        if not os.path.isfile(self.checkpoints_filepath):
+            return False
+
+        try:
+            with open(self.checkpoints_filepath, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except ValueError:
+            self.clear()
+            return False
+
+        if stored.get('version') != CHECKPOINT_VERSION or stored.get('app_version') != self.meta_app.current_version \
+            or stored.get('build_number') != self.meta_app.build_number:
+            self.clear()
+            return False
+
+        self.fingerprint = self.get_build_fingerprint()
+
+        if stored.get('fingerprint') != self.fingerprint:
+            self.clear()
+            return False
+
+        # the first phase with modified outputs and all following phases are built again
+        for phase in stored['phases']:
+
+            if get_outputs_digest(phase['outputs']) != phase['digest']:
+                break
+
+            self.phases.append(phase)
+
+        if not self.phases:
+            self.clear()
+            return False
+
+        self.report['resumed'] = True
+        self.report['skipped'] = [phase['name'] for phase in self.phases]
+
+        return True
+
+
+    # called by a build which does not resume, before the builder path is deleted
+    def start(self):
+
+        self.clear()
+
+        if self.enabled:
+            self.fingerprint = self.get_build_fingerprint()
+
+
+    def get_phase(self, name):
+
+        for phase in self.phases:
+            if phase['name'] == name:
+                return phase
+
+        return None
+
+
+    def is_completed(self, name):
+        return self.get_phase(name) is not None
+
+
+    def get_phase_report(self, name):
+        return self.get_phase(name)['report']
+
+
+    # outputs: files or folders written by the phase
+    # report: json serializable report of the phase, restored if the phase is skipped by a resumed build
+    def complete(self, name, outputs=[], report=None):
+
+        if not self.enabled:
+            return
+
+        self.phases.append({
+            'name' : name,
+            'outputs' : outputs,
+            'digest' : None,
+            'report' : report,
+        })
+
+        for phase in self.phases:
+            phase['digest'] = get_outputs_digest(phase['outputs'])
+
+        self.save()
+
+
+    def save(self):
+
+        if not os.path.isdir(self.checkpoints_path):
+            os.makedirs(self.checkpoints_path)
+
+        stored = {
+            'version' : CHECKPOINT_VERSION,
+            'app_version' : self.meta_app.current_version,
+            'build_number' : self.meta_app.build_number,
+            'fingerprint' : self.fingerprint,
+            'phases' : self.phases,
+        }
+
+        # a build dying while saving must not leave a truncated file
+        temp_filepath = '{0}.tmp'.format(self.checkpoints_filepath)
+
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            json.dump(stored, f)
+
+        os.replace(temp_filepath, self.checkpoints_filepath)
+
+
+    def clear(self):
+        if os.path.isfile(self.checkpoints_filepath):
+            os.remove(self.checkpoints_filepath)
@@ -0,0 +1,446 @@
+###################################################################################################################
+#
+# BUILD CONTEXT
+# - the release build reads taxon profiles, nature guide nodes, content images and vernacular names once per
+#   taxon, which results in several queries per taxon
+# - BuildContext loads each of these tables once per build into in-memory maps, indexed by name_uuid,
+#   by (taxon_source, taxon_latname, taxon_author) and by image_store_id
+# - each table is loaded on first access
+# - the app and its generic contents are locked during a build, the maps do not go stale
+# - the lookups return the same objects in the same order as the queries they replace
+#
+###################################################################################################################
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from app_kit.models import ContentImage
+from app_kit.features.nature_guides.models import NatureGuide, MetaNode, NatureGuidesTaxonTree
+from app_kit.features.taxon_profiles.models import TaxonProfile, TaxonProfiles
+
+from taxonomy.models import MetaVernacularNames
+
+import bisect
+
+
+def get_taxon_key(taxon):
+    return (taxon.taxon_source, taxon.taxon_latname, taxon.taxon_author)
+
+
+# the branches below the nature guide nodes which are set to inactive
+# - nested prefixes are dropped, the remaining prefixes are sorted
+# - the only prefix which can match a nuid is the largest prefix <= nuid
+class InactiveBranches:
+
+    def __init__(self, inactivated_nuids):
+
+        self.prefixes = []
+
+        for nuid in sorted(inactivated_nuids):
+            if self.prefixes and nuid.startswith(self.prefixes[-1]):
+                continue
+            self.prefixes.append(nuid)
+
+
+    def __contains__(self, taxon_nuid):
+
+        index = bisect.bisect_right(self.prefixes, taxon_nuid) - 1
+
+        if index >= 0 and taxon_nuid.startswith(self.prefixes[index]):
+            return True
+
+        return False
+
+
+class BuildContext:
+
+    def __init__(self, meta_app):
+        self.meta_app = meta_app
+        self.installed_taxonomic_sources = [s[0] for s in settings.TAXONOMY_DATABASES]
+
+        self.loaded = set([])
+
+        self.taxon_profiles = None
+        self.nature_guide_ids = []
+
+        # TaxonProfile
+        self.taxon_profiles_by_taxon = {}
+        self.taxon_profiles_by_name_uuid = {}
+        self.morphotype_profiles = {}
+
+        # nature guides
+        self.meta_nodes_by_name_uuid = {}
+        self.nodes_by_name_uuid = {}
+        self.result_nodes_by_name_uuid = {}
+        self.result_nodes_by_taxon = {}
+        self.tree_name_uuids = set([])
+
+        # ContentImage
+        self.content_images_by_object = {}
+        self.content_images_by_taxon = {}
+        self.image_stores = {}
+
+        # MetaVernacularNames
+        self.meta_vernacular_names = {}
+
+        # active taxa, computed for a set of inactivated nuids
+        self.inactivated_nuids = None
+        self.inactivated_nuids_count = 0
+        self.inactive_branches = InactiveBranches([])
+        self.active_name_uuids = set([])
+
+
+    def load(self, table):
+
+        if table in self.loaded:
+            return
+
+        loader = getattr(self, 'load_{0}'.format(table))
+        loader()
+
+        self.loaded.add(table)
+
+
+    def load_generic_contents(self):
+
+        taxon_profiles_link = self.meta_app.get_generic_content_links(TaxonProfiles).first()
+        if taxon_profiles_link:
+            self.taxon_profiles = taxon_profiles_link.generic_content
+
+        nature_guide_links = self.meta_app.get_generic_content_links(NatureGuide)
+        self.nature_guide_ids = list(nature_guide_links.values_list('object_id', flat=True))
+
+
+    # .first() of an unordered queryset returns the entry with the lowest pk
+    def load_taxon_profiles(self):
+
+        self.load('generic_contents')
+
+        taxon_profiles = TaxonProfile.objects.filter(taxon_profiles=self.taxon_profiles).order_by('pk')
+
+        for taxon_profile in taxon_profiles:
+
+            taxon_key = get_taxon_key(taxon_profile)
+            name_uuid = str(taxon_profile.name_uuid)
+
+            for key in [taxon_key, taxon_key + (taxon_profile.morphotype,)]:
+                if key not in self.taxon_profiles_by_taxon:
+                    self.taxon_profiles_by_taxon[key] = taxon_profile
+
+            for key in [name_uuid, (name_uuid, taxon_profile.morphotype)]:
+                if key not in self.taxon_profiles_by_name_uuid:
+                    self.taxon_profiles_by_name_uuid[key] = taxon_profile
+
+            if taxon_profile.morphotype:
+                morphotype_key = (taxon_profile.taxon_source, name_uuid)
+                if morphotype_key not in self.morphotype_profiles:
+                    self.morphotype_profiles[morphotype_key] = []
+                self.morphotype_profiles[morphotype_key].append(taxon_profile)
+
+
+    def load_nature_guides(self):
+
+        self.load('generic_contents')
+
+        meta_nodes = MetaNode.objects.filter(nature_guide_id__in=self.nature_guide_ids).order_by('pk')
+
+        for meta_node in meta_nodes:
+            if meta_node.name_uuid:
+                name_uuid = str(meta_node.name_uuid)
+                if name_uuid not in self.meta_nodes_by_name_uuid:
+                    self.meta_nodes_by_name_uuid[name_uuid] = []
+                self.meta_nodes_by_name_uuid[name_uuid].append(meta_node)
+
+        nodes = NatureGuidesTaxonTree.objects.filter(nature_guide_id__in=self.nature_guide_ids,
+            meta_node__nature_guide_id__in=self.nature_guide_ids).select_related('meta_node').order_by('pk')
+
+        for node in nodes:
+
+            meta_node = node.meta_node
+
+            if meta_node.name_uuid:
+                name_uuid = str(meta_node.name_uuid)
+                if name_uuid not in self.nodes_by_name_uuid:
+                    self.nodes_by_name_uuid[name_uuid] = []
+                self.nodes_by_name_uuid[name_uuid].append(node)
+
+            if meta_node.node_type == 'result':
+
+                if meta_node.name_uuid:
+                    name_uuid = str(meta_node.name_uuid)
+                    if name_uuid not in self.result_nodes_by_name_uuid:
+                        self.result_nodes_by_name_uuid[name_uuid] = []
+                    self.result_nodes_by_name_uuid[name_uuid].append(node)
+
+                taxon_key = (node.taxon_latname, node.taxon_author)
+                if taxon_key not in self.result_nodes_by_taxon:
+                    self.result_nodes_by_taxon[taxon_key] = []
+                self.result_nodes_by_taxon[taxon_key].append(node)
+
+        # taxa of the source app_kit.features.nature_guides, across all nature guides
+        self.tree_name_uuids = set([str(name_uuid) for name_uuid in
+                                    NatureGuidesTaxonTree.objects.values_list('name_uuid', flat=True)])
+
+
+    # images of taxon profiles and meta nodes, and all images which have a taxon
+    def load_content_images(self):
+
+        self.load('generic_contents')
+
+        taxon_profile_type = ContentType.objects.get_for_model(TaxonProfile)
+        meta_node_type = ContentType.objects.get_for_model(MetaNode)
+
+        taxon_profile_ids = TaxonProfile.objects.filter(taxon_profiles=self.taxon_profiles).values('pk')
+        meta_node_ids = MetaNode.objects.filter(nature_guide_id__in=self.nature_guide_ids).values('pk')
+
+        object_images = ContentImage.objects.filter(image_type='image', content_type=taxon_profile_type,
+            object_id__in=taxon_profile_ids).select_related('image_store').order_by('position', 'pk')
+
+        meta_node_images = ContentImage.objects.filter(image_type='image', content_type=meta_node_type,
+            object_id__in=meta_node_ids).select_related('image_store').order_by('position', 'pk')
+
+        for content_image in list(object_images) + list(meta_node_images):
+            object_key = (content_image.content_type_id, content_image.object_id)
+            if object_key not in self.content_images_by_object:
+                self.content_images_by_object[object_key] = []
+            self.content_images_by_object[object_key].append(content_image)
+            self.image_stores[content_image.image_store_id] = content_image.image_store
+
+        taxon_images = ContentImage.objects.filter(image_store__taxon_latname__isnull=False).select_related(
+            'image_store').order_by('pk')
+
+        for content_image in taxon_images:
+            taxon_key = get_taxon_key(content_image.image_store)
+            if taxon_key not in self.content_images_by_taxon:
+                self.content_images_by_taxon[taxon_key] = []
+            self.content_images_by_taxon[taxon_key].append(content_image)
+            self.image_stores[content_image.image_store_id] = content_image.image_store
+
+
+    def load_vernacular_names(self):
+
+        meta_vernacular_names = MetaVernacularNames.objects.all().order_by('pk')
+
+        for meta_vernacular_name in meta_vernacular_names:
+            key = (meta_vernacular_name.taxon_source, str(meta_vernacular_name.name_uuid))
+            if key not in self.meta_vernacular_names:
+                self.meta_vernacular_names[key] = []
+            self.meta_vernacular_names[key].append(meta_vernacular_name)
+
+
+    ###############################################################################################################
+    # TAXON PROFILES
+    ###############################################################################################################
+
+    # same as TaxonProfile.objects.filter(taxon_source, taxon_latname, taxon_author[, morphotype]).first()
+    def get_taxon_profile(self, taxon, morphotype=None):
+        self.load('taxon_profiles')
+
+        key = get_taxon_key(taxon)
+        if morphotype:
+            key = key + (morphotype,)
+
+        return self.taxon_profiles_by_taxon.get(key, None)
+
+
+    # same as TaxonProfile.objects.filter(name_uuid[, morphotype]).first()
+    def get_taxon_profile_by_name_uuid(self, name_uuid, morphotype=None):
+        self.load('taxon_profiles')
+
+        key = str(name_uuid)
+        if morphotype:
+            key = (key, morphotype)
+
+        return self.taxon_profiles_by_name_uuid.get(key, None)
+
+
+    # same as TaxonProfile.morphotype_profiles
+    def get_morphotype_profiles(self, taxon_profile):
+        self.load('taxon_profiles')
+
+        if taxon_profile.morphotype:
+            return []
+
+        key = (taxon_profile.taxon_source, str(taxon_profile.name_uuid))
+        return self.morphotype_profiles.get(key, [])
+
+
+    ###############################################################################################################
+    # NATURE GUIDES
+    ###############################################################################################################
+
+    def exists_in_nature_guides(self, name_uuid):
+        self.load('nature_guides')
+        return str(name_uuid) in self.tree_name_uuids
+
+
+    # MetaNodes of the nature guides of the app with this name_uuid
+    def get_meta_nodes(self, name_uuid):
+        self.load('nature_guides')
+        return self.meta_nodes_by_name_uuid.get(str(name_uuid), [])
+
+
+    # NatureGuidesTaxonTree entries of the nature guides of the app, whose meta_node has this name_uuid
+    def get_nature_guide_nodes(self, name_uuid):
+        self.load('nature_guides')
+        return self.nodes_by_name_uuid.get(str(name_uuid), [])
+
+
+    # same as TaxaBuilder.get_nature_guide_occurrences
+    def get_nature_guide_occurrences(self, lazy_taxon, morphotype=None):
+        self.load('nature_guides')
+
+        if lazy_taxon.taxon_source in self.installed_taxonomic_sources:
+
+            nodes = self.result_nodes_by_name_uuid.get(str(lazy_taxon.name_uuid), [])
+
+            if morphotype:
+                nodes = [node for node in nodes if node.meta_node.morphotype == morphotype]
+
+            return nodes
+
+        return self.result_nodes_by_taxon.get((lazy_taxon.taxon_latname, lazy_taxon.taxon_author), [])
+
+
+    ###############################################################################################################
+    # ACTIVE TAXA
+    # - AppReleaseBuilder.inactivated_nuids is filled while the nature guides are built, the classification
+    #   is computed again if it has been replaced or has grown
+    ###############################################################################################################
+
+    def classify(self, inactivated_nuids):
+
+        if inactivated_nuids is self.inactivated_nuids and len(inactivated_nuids) == self.inactivated_nuids_count:
+            return
+
+        self.load('nature_guides')
+
+        self.inactivated_nuids = inactivated_nuids
+        self.inactivated_nuids_count = len(inactivated_nuids)
+        self.inactive_branches = InactiveBranches(inactivated_nuids)
+
+        # name_uuids of taxa which occur in at least one active branch of the nature guides of the app
+        self.active_name_uuids = set([])
+
+        for name_uuid, nodes in self.nodes_by_name_uuid.items():
+            for node in nodes:
+                if node.taxon_nuid not in self.inactive_branches:
+                    self.active_name_uuids.add(name_uuid)
+                    break
+
+
+    def is_in_inactive_branch(self, taxon_nuid, inactivated_nuids):
+        self.classify(inactivated_nuids)
+        return taxon_nuid in self.inactive_branches
+
+
+    # the taxon occurs as the taxon of a node in an active branch
+    def has_active_node(self, name_uuid, inactivated_nuids):
+        self.classify(inactivated_nuids)
+        return str(name_uuid) in self.active_name_uuids
+
+
+    ###############################################################################################################
+    # CONTENT IMAGES
+    ###############################################################################################################
+
+    # same as instance.images(), for TaxonProfile and MetaNode instances
+    def get_images(self, instance):
+        self.load('content_images')
+
+        content_type = ContentType.objects.get_for_model(instance)
+        return self.content_images_by_object.get((content_type.id, instance.id), [])
+
+
+    # same as instance.image(), for TaxonProfile and MetaNode instances
+    def get_image(self, instance):
+        images = self.get_images(instance)
+
+        if images:
+            return images[0]
+
+        return None
+
+
+    # same as instance.primary_image(), for TaxonProfile and MetaNode instances
+    def get_primary_image(self, instance):
+        images = self.get_images(instance)
+
+        for content_image in images:
+            if content_image.is_primary == True:
+                return content_image
+
+        return self.get_image(instance)
+
+
+    # ContentImages of all ImageStores with this taxon
+    def get_taxon_images(self, lazy_taxon):
+        self.load('content_images')
+        return self.content_images_by_taxon.get(get_taxon_key(lazy_taxon), [])
+
+
+    def get_image_store(self, image_store_id):
+        self.load('content_images')
+        return self.image_stores.get(image_store_id, None)
+
+
+    ###############################################################################################################
+    # VERNACULAR NAMES
+    ###############################################################################################################
+
+    def get_meta_vernacular_names(self, lazy_taxon):
+        self.load('vernacular_names')
+        return self.meta_vernacular_names.get((lazy_taxon.taxon_source, str(lazy_taxon.name_uuid)), [])
+
+
+    # same order as LazyTaxon.get_preferred_vernacular_name
+    def get_preferred_vernacular_name(self, lazy_taxon, language):
+
+        preferred_vernacular_name = None
+
+        meta_vernacular_names = self.get_meta_vernacular_names(lazy_taxon)
+
+        if meta_vernacular_names:
+
+            for meta_vernacular_name in meta_vernacular_names:
+                if meta_vernacular_name.preferred == True:
+                    preferred_vernacular_name = meta_vernacular_name.name
+                    break
+
+            if not preferred_vernacular_name:
+                preferred_vernacular_name = meta_vernacular_names[0].name
+
+        if not preferred_vernacular_name and lazy_taxon.taxon_source == 'taxonomy.sources.custom':
+            preferred_vernacular_name = lazy_taxon.get_taxon_source_vernacular_name(language)
+
+        if not preferred_vernacular_name and lazy_taxon.taxon_source in self.installed_taxonomic_sources:
+
+            meta_nodes = self.get_meta_nodes(lazy_taxon.name_uuid)
+
+            if meta_nodes:
+                primary_locale_vernacular_name = meta_nodes[0].name
+
+                if language == self.meta_app.primary_language:
+                    preferred_vernacular_name = primary_locale_vernacular_name
+                else:
+                    localizations = self.meta_app.localizations or {}
+                    localization = localizations.get(language, {})
+                    preferred_vernacular_name = localization.get(primary_locale_vernacular_name, None)
+
+        if not preferred_vernacular_name:
+            preferred_vernacular_name = lazy_taxon.get_taxon_source_vernacular_name(language)
+
+        return preferred_vernacular_name
+
+
+    # same as LazyTaxon.vernacular
+    def get_vernacular_name(self, lazy_taxon, language):
+
+        preferred_vernacular_name = self.get_preferred_vernacular_name(lazy_taxon, language)
+
+        if preferred_vernacular_name:
+            return preferred_vernacular_name
+
+        if lazy_taxon.origin == 'MetaNode':
+            return lazy_taxon.instance.name
+
+        return None
@@ -0,0 +1,327 @@
+###################################################################################################################
+#
+# BUILD PROFILER
+# - measures each phase of a release build: wall time, cpu time, sql queries and their duration,
+#   files and bytes written by JSONWriter and ContentImageBuilder, counted where they are written
+# - phases can be nested, the depth is part of each entry
+# - the phases are added to meta_app.last_build_report and appended to build_profile.jsonl in the log folder
+#   of the app version, one line per phase
+# - settings.APP_KIT_BUILD_CPROFILE = True additionally dumps a cProfile of the whole build into the log folder,
+#   e.g. python -m pstats build_12.prof
+# - the RSS of the process at the end of each phase is part of the phase, the build reports the highest RSS
+#   sampled during the build. ru_maxrss is the peak of the whole process lifetime, which includes previous
+#   builds of a long running worker, it is only used if /proc is not available and if it has grown during the build
+# - settings.APP_KIT_BUILD_TRACEMALLOC = True traces the python allocations of the build, each phase reports the
+#   traced bytes and the allocation sites which have grown the most during the phase
+# - settings.APP_KIT_BUILD_MAX_RSS (bytes) logs a warning if the RSS of the build exceeds it and switches the
+#   builders with large outputs to streaming output, see AppReleaseBuilder.streaming_output
+# - queries are counted per database connection, i.e. per thread. Threads started during a phase use
+#   count_queries() to add their queries to the open phases, e.g. the validation threads of ValidationCache
+#
+###################################################################################################################
+from django.conf import settings
+from django.db import connection
+
+from contextlib import contextmanager
+
+import os, sys, json, time, cProfile, resource, threading, tracemalloc
+
+# allocation sites per phase reported by tracemalloc
+TRACEMALLOC_TOP_SITES = 10
+
+
+# current resident set size of this process in bytes, None if /proc is not available
+def get_current_rss():
+
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# peak resident set size of this process in bytes, since the process has been started
+def get_peak_rss():
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return max_rss
+
+    return max_rss * 1024
+
+
+class BuildProfiler:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+
+        self.phases = []
+        self.depth = 0
+
+        # query counters of the open phases, outermost first
+        self.open_queries = []
+        self.queries_lock = threading.Lock()
+
+        self.cprofile_enabled = getattr(settings, 'APP_KIT_BUILD_CPROFILE', False)
+        self.cprofile = None
+
+        self.tracemalloc_enabled = getattr(settings, 'APP_KIT_BUILD_TRACEMALLOC', False)
+        self.tracemalloc_started = False
+
+        # the process peak before this build, see get_rss
+        self.peak_rss_before = get_peak_rss()
+
+        self.memory_report = {
+            'peak_rss' : 0,
+            'max_rss' : getattr(settings, 'APP_KIT_BUILD_MAX_RSS', None),
+            'max_rss_exceeded' : False,
+            'tracemalloc' : self.tracemalloc_enabled,
+        }
+
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/log/build_profile.jsonl
+    @property
+    def profile_filepath(self):
+        return os.path.join(self.app_release_builder._log_path, 'build_profile.jsonl')
+
+    @property
+    def cprofile_filepath(self):
+        filename = 'build_{0}.prof'.format(self.app_release_builder.meta_app.build_number)
+        return os.path.join(self.app_release_builder._log_path, filename)
+
+
+    # files and bytes written so far, overwritten files count again
+    def get_written(self):
+
+        json_writer = self.app_release_builder.json_writer
+        image_report = self.app_release_builder.content_image_builder.image_report
+
+        files = json_writer.files_written + image_report.get('files_written', 0)
+        size = json_writer.bytes_written + image_report.get('bytes_written', 0)
+
+        return files, size
+
+
+    def take_snapshot(self):
+
+        if not tracemalloc.is_tracing():
+            return None
+
+        snapshot = tracemalloc.take_snapshot()
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+
+        return snapshot
+
+
+    # the allocation sites which have grown the most since snapshot_before
+    def get_memory_usage(self, snapshot_before):
+
+        snapshot = self.take_snapshot()
+
+        traced_bytes, traced_peak = tracemalloc.get_traced_memory()
+
+        memory_usage = {
+            'traced_bytes' : traced_bytes,
+            'traced_peak' : traced_peak,
+            'top_allocations' : [],
+        }
+
+        statistics = snapshot.compare_to(snapshot_before, 'lineno')
+
+        for statistic in statistics[:TRACEMALLOC_TOP_SITES]:
+
+            frame = statistic.traceback[0]
+
+            memory_usage['top_allocations'].append({
+                'site' : '{0}:{1}'.format(frame.filename, frame.lineno),
+                'size_diff' : statistic.size_diff,
+                'count_diff' : statistic.count_diff,
+                'size' : statistic.size,
+            })
+
+        return memory_usage
+
+
+    # RSS of this build, without /proc the process peak counts only if it has been reached during this build
+    def get_rss(self):
+
+        rss = get_current_rss()
+
+        if rss is None:
+            peak_rss = get_peak_rss()
+            rss = peak_rss if peak_rss > self.peak_rss_before else 0
+
+        return rss
+
+
+    # returns True if the RSS of this build exceeds settings.APP_KIT_BUILD_MAX_RSS
+    # the warning is logged once, the builders switch to streaming output for the rest of the build
+    def check_memory(self, rss=None):
+
+        if rss is None:
+            rss = self.get_rss()
+
+        self.memory_report['peak_rss'] = max(self.memory_report['peak_rss'], rss)
+
+        max_rss = self.memory_report['max_rss']
+
+        if max_rss and rss > max_rss and self.memory_report['max_rss_exceeded'] == False:
+
+            self.memory_report['max_rss_exceeded'] = True
+            self.app_release_builder.streaming_output = True
+
+            logger = getattr(self.app_release_builder, 'logger', None)
+            if logger:
+                logger.warning('RSS {0} exceeds settings.APP_KIT_BUILD_MAX_RSS {1}, switching to streaming output'.format(
+                    rss, max_rss))
+
+        return self.memory_report['max_rss_exceeded']
+
+
+    @contextmanager
+    def phase(self, name, **info):
+
+        queries = {
+            'count' : 0,
+            'time' : 0,
+        }
+
+        count_query = self.get_query_counter([queries])
+
+        files_before, size_before = self.get_written()
+
+        snapshot_before = self.take_snapshot()
+
+        entry = {
+            'name' : name,
+            'depth' : self.depth,
+        }
+        entry.update(info)
+
+        # parents come before their children
+        self.phases.append(entry)
+
+        progress_callback = getattr(self.app_release_builder, 'progress_callback', None)
+        if self.depth == 0 and progress_callback:
+            progress_callback(name)
+
+        self.depth += 1
+        self.open_queries.append(queries)
+
+        started_at = time.perf_counter()
+        cpu_started_at = time.process_time()
+
+        try:
+            with connection.execute_wrapper(count_query):
+                yield entry
+
+        finally:
+            self.depth -= 1
+            self.open_queries.remove(queries)
+
+            files_after, size_after = self.get_written()
+
+            entry.update({
+                'wall_time' : round(time.perf_counter() - started_at, 3),
+                'cpu_time' : round(time.process_time() - cpu_started_at, 3),
+                'queries' : queries['count'],
+                'query_time' : round(queries['time'], 3),
+                'files_written' : files_after - files_before,
+                'bytes_written' : size_after - size_before,
+            })
+
+            entry['rss'] = self.get_rss()
+            self.check_memory(rss=entry['rss'])
+
+            if snapshot_before is not None and tracemalloc.is_tracing():
+                entry['memory'] = self.get_memory_usage(snapshot_before)
+
+
+    # execute_wrapper adding each query to all counters
+    def get_query_counter(self, counters):
+
+        def count_query(execute, sql, params, many, context):
+            query_started_at = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                query_time = time.perf_counter() - query_started_at
+                with self.queries_lock:
+                    for queries in counters:
+                        queries['count'] += 1
+                        queries['time'] += query_time
+
+        return count_query
+
+
+    # the execute_wrapper of phase() is installed on the connection of the calling thread only,
+    # other threads add their queries to the phases which are open when they start counting
+    @contextmanager
+    def count_queries(self):
+
+        count_query = self.get_query_counter(list(self.open_queries))
+
+        with connection.execute_wrapper(count_query):
+            yield
+
+
+    # phases measured in worker processes
+    def add_phases(self, phases, **info):
+        for phase in phases:
+            entry = phase.copy()
+            entry['depth'] += self.depth
+            entry.update(info)
+            self.phases.append(entry)
+
+
+    def start(self):
+        if self.cprofile_enabled == True:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+        if self.tracemalloc_enabled == True and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracemalloc_started = True
+
+
+    def finish(self):
+
+        if self.cprofile:
+            self.cprofile.disable()
+
+        if self.tracemalloc_started == True:
+            tracemalloc.stop()
+            self.tracemalloc_started = False
+
+        self.check_memory()
+
+        log_path = self.app_release_builder._log_path
+        if not os.path.isdir(log_path):
+            os.makedirs(log_path)
+
+        if self.cprofile:
+            self.cprofile.dump_stats(self.cprofile_filepath)
+            self.cprofile = None
+
+        build_number = self.app_release_builder.meta_app.build_number
+
+        with open(self.profile_filepath, 'a', encoding='utf-8') as profile_file:
+            for phase in self.phases:
+                line = {
+                    'build_number' : build_number,
+                }
+                line.update(phase)
+                profile_file.write('{0}\n'.format(json.dumps(line)))
+
+
+    def get_report(self):
+        return self.phases
+
+    def get_memory_report(self):
+        return self.memory_report
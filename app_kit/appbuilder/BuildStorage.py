@@ -0,0 +1,336 @@
+###################################################################################################################
+#
+# BUILD STORAGE
+# - each app version keeps its own build folders: the www tree, images, the cordova projects and the zipfiles
+#   in {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/
+# - retention: only the settings.APP_KIT_KEEP_VERSIONS latest version folders are kept, the current and the
+#   published version are never removed. None keeps all versions.
+# - deduplication: identical files of different versions are replaced by hardlinks to one file
+#     - files are grouped by size first, only files with the same size are hashed
+#     - the sha256 of each inode is cached in {app}/cache/build_storage_hashes.json, keyed by device and inode,
+#       and reused if size and mtime are unchanged
+#     - only versions which are not built anymore are deduplicated: all versions below the current version, and
+#       the current version if it has been published. Builders write some files in place, which would write
+#       through the hardlinks into older versions.
+#     - the bytes of an inode are reclaimed if all of its links have been replaced
+# - settings.APP_KIT_MAINTAIN_BUILD_STORAGE = True runs retention and deduplication after each successful build,
+#   manage.py build_storage runs them for all apps of an app kit
+#
+###################################################################################################################
+from django.conf import settings
+
+import os, json, hashlib, shutil, stat
+
+# smaller files are not deduplicated
+DEDUPE_MIN_BYTES = 1
+
+
+def hash_file(filepath):
+
+    hasher = hashlib.sha256()
+
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+# bytes freed by deleting folder, data of files with links outside folder is not freed
+def get_reclaimable_bytes(folder):
+
+    inodes = {}
+
+    for root, dirs, filenames in os.walk(folder):
+        for filename in filenames:
+
+            file_stat = os.lstat(os.path.join(root, filename))
+
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+
+            key = (file_stat.st_dev, file_stat.st_ino)
+
+            if key not in inodes:
+                inodes[key] = [file_stat, 0]
+
+            inodes[key][1] += 1
+
+    reclaimable_bytes = sum([file_stat.st_size for file_stat, links in inodes.values()
+                             if links == file_stat.st_nlink])
+
+    return reclaimable_bytes
+
+
+class BuildStorage:
+
+    def __init__(self, app_builder, keep_versions=None):
+        self.app_builder = app_builder
+        self.meta_app = app_builder.meta_app
+
+        if keep_versions is None:
+            keep_versions = getattr(settings, 'APP_KIT_KEEP_VERSIONS', None)
+
+        self.keep_versions = keep_versions
+
+        # 'device:inode' -> [size, mtime_ns, sha256]
+        self.hashes = {}
+
+        self.report = {
+            'kept_versions' : [],
+            'removed_versions' : [],
+            'removed_bytes' : 0,
+            'deduplicated_versions' : [],
+            'files' : 0,
+            'hashed' : 0,
+            'linked' : 0,
+            'reclaimed_bytes' : 0,
+        }
+
+
+    @classmethod
+    def is_enabled(cls):
+        return getattr(settings, 'APP_KIT_MAINTAIN_BUILD_STORAGE', False)
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/
+    @property
+    def versions_path(self):
+        return os.path.join(self.app_builder._app_root_path, 'version')
+
+    @property
+    def hashes_filepath(self):
+        return os.path.join(self.app_builder._app_root_path, 'cache', 'build_storage_hashes.json')
+
+
+    def get_report(self):
+        return self.report
+
+
+    def get_version_path(self, app_version):
+        return os.path.join(self.versions_path, str(app_version))
+
+
+    def get_versions(self):
+
+        versions = []
+
+        if os.path.isdir(self.versions_path):
+            for folder_name in os.listdir(self.versions_path):
+                if folder_name.isdigit() and os.path.isdir(os.path.join(self.versions_path, folder_name)):
+                    versions.append(int(folder_name))
+
+        return sorted(versions)
+
+
+    def get_protected_versions(self):
+        return set([self.meta_app.current_version, self.meta_app.published_version])
+
+
+    # versions which are not built anymore
+    def get_immutable_versions(self):
+
+        immutable_versions = []
+
+        for app_version in self.get_versions():
+
+            if app_version < self.meta_app.current_version:
+                immutable_versions.append(app_version)
+
+            elif app_version == self.meta_app.current_version == self.meta_app.published_version:
+                immutable_versions.append(app_version)
+
+        return immutable_versions
+
+
+    def maintain(self):
+
+        self.apply_retention()
+        self.dedupe()
+
+        return self.report
+
+
+    ###############################################################################################################
+    # RETENTION
+    ###############################################################################################################
+
+    def apply_retention(self):
+
+        versions = self.get_versions()
+
+        if self.keep_versions is None:
+            self.report['kept_versions'] = versions
+            return
+
+        latest_versions = versions[-self.keep_versions:] if self.keep_versions > 0 else []
+        protected_versions = self.get_protected_versions()
+
+        for app_version in versions:
+
+            if app_version in latest_versions or app_version in protected_versions:
+                self.report['kept_versions'].append(app_version)
+                continue
+
+            version_path = self.get_version_path(app_version)
+
+            self.report['removed_bytes'] += get_reclaimable_bytes(version_path)
+            shutil.rmtree(version_path)
+
+            self.report['removed_versions'].append(app_version)
+
+
+    ###############################################################################################################
+    # DEDUPLICATION
+    ###############################################################################################################
+
+    def load_hashes(self):
+
+        self.hashes = {}
+
+        if os.path.isfile(self.hashes_filepath):
+            try:
+                with open(self.hashes_filepath, 'r', encoding='utf-8') as f:
+                    self.hashes = json.load(f)
+            except ValueError:
+                pass
+
+
+    # only the hashes of the inodes seen by the last run are kept
+    def save_hashes(self, inodes):
+
+        hashes = {}
+
+        for key in inodes.keys():
+            hash_key = '{0}:{1}'.format(*key)
+            if hash_key in self.hashes:
+                hashes[hash_key] = self.hashes[hash_key]
+
+        cache_path = os.path.dirname(self.hashes_filepath)
+        if not os.path.isdir(cache_path):
+            os.makedirs(cache_path)
+
+        temp_filepath = '{0}.tmp'.format(self.hashes_filepath)
+
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f)
+
+        os.replace(temp_filepath, self.hashes_filepath)
+
+
+    def get_hash(self, key, inode):
+
+        file_stat = inode['stat']
+        hash_key = '{0}:{1}'.format(*key)
+
+        cached = self.hashes.get(hash_key, None)
+
+        if cached and cached[0] == file_stat.st_size and cached[1] == file_stat.st_mtime_ns:
+            return cached[2]
+
+        sha256 = hash_file(inode['paths'][0])
+        self.hashes[hash_key] = [file_stat.st_size, file_stat.st_mtime_ns, sha256]
+        self.report['hashed'] += 1
+
+        return sha256
+
+
+    # (device, inode) -> {'stat' : stat_result, 'paths' : []} of all regular files of the immutable versions
+    def collect_inodes(self, versions):
+
+        inodes = {}
+
+        for app_version in versions:
+
+            for root, dirs, filenames in os.walk(self.get_version_path(app_version)):
+
+                dirs.sort()
+
+                for filename in sorted(filenames):
+
+                    filepath = os.path.join(root, filename)
+                    file_stat = os.lstat(filepath)
+
+                    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < DEDUPE_MIN_BYTES:
+                        continue
+
+                    key = (file_stat.st_dev, file_stat.st_ino)
+
+                    if key not in inodes:
+                        inodes[key] = {
+                            'stat' : file_stat,
+                            'paths' : [],
+                        }
+
+                    inodes[key]['paths'].append(filepath)
+                    self.report['files'] += 1
+
+        return inodes
+
+
+    # replaces filepath by a hardlink to source_filepath, the file is never missing
+    def link(self, source_filepath, filepath):
+
+        temp_filepath = '{0}.dedupe'.format(filepath)
+
+        try:
+            os.link(source_filepath, temp_filepath)
+        except OSError:
+            # too many links or no hardlink support
+            return False
+
+        os.replace(temp_filepath, filepath)
+
+        return True
+
+
+    def dedupe(self):
+
+        versions = self.get_immutable_versions()
+        self.report['deduplicated_versions'] = versions
+
+        self.load_hashes()
+
+        inodes = self.collect_inodes(versions)
+
+        inodes_by_size = {}
+        for key, inode in inodes.items():
+            inodes_by_size.setdefault(inode['stat'].st_size, []).append(key)
+
+        for size, keys in inodes_by_size.items():
+
+            if len(keys) < 2:
+                continue
+
+            inodes_by_hash = {}
+            for key in keys:
+                inodes_by_hash.setdefault(self.get_hash(key, inodes[key]), []).append(key)
+
+            for sha256, identical_keys in inodes_by_hash.items():
+
+                if len(identical_keys) < 2:
+                    continue
+
+                # the inode with the most links is kept
+                identical_keys.sort(key=lambda key: (-inodes[key]['stat'].st_nlink, inodes[key]['paths'][0]))
+
+                source_key = identical_keys[0]
+                source_filepath = inodes[source_key]['paths'][0]
+
+                for key in identical_keys[1:]:
+
+                    # hardlinks cannot cross devices
+                    if key[0] != source_key[0]:
+                        continue
+
+                    inode = inodes[key]
+                    linked = [filepath for filepath in inode['paths'] if self.link(source_filepath, filepath)]
+
+                    self.report['linked'] += len(linked)
+
+                    if len(linked) == inode['stat'].st_nlink:
+                        self.report['reclaimed_bytes'] += size
+                        self.hashes.pop('{0}:{1}'.format(*key), None)
+
+        self.save_hashes(inodes)
+
+        return self.report
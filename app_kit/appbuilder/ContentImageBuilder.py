@@ -1,20 +1,103 @@
-import os, shutil
+from django.db import connections
+from django.contrib.contenttypes.models import ContentType
+
+import os, shutil, multiprocessing, math, tempfile
 
 from PIL import Image
 
+from concurrent.futures import ProcessPoolExecutor
+
 from localcosmos_server.template_content.api.serializers import ContentLicenceSerializer
 
+from content_licencing.models import ContentLicenceRegistry
+
+from app_kit.appbuilder.ContentImageCache import ContentImageCache
+
 
 # widths of the ouput image
 # the height depends on the crop area set by the user
 from localcosmos_server.models import IMAGE_SIZES
 
+# all processed images are webp
+#allowed_formats = ['png', 'jpg', 'jpeg']
+OUTPUT_FORMAT = 'WEBP'
+ENCODER_PARAMS = {}
+
+
+# runs in a worker process of ContentImageBuilder.process_image_jobs
+def render_image_job(cache_folder, shared_image_cache_path, image_job):
+    content_image, targets = image_job
+    shared_image_cache = ContentImageCache(cache_path=shared_image_cache_path)
+    content_image_builder = ContentImageBuilder(cache_folder, shared_image_cache=shared_image_cache)
+    content_image_builder.render_images(content_image, targets)
+
+    # the statistics and the index changes of the shared cache are saved by the main process
+    return (shared_image_cache.stats, shared_image_cache.get_index_changes(),
+            content_image_builder.image_report)
+
+
+# the size PIL.Image.thumbnail(bounds) would produce for an image of image_size
+def get_thumbnail_size(image_size, bounds):
+
+    width, height = image_size
+    x, y = (math.floor(bounds[0]), math.floor(bounds[1]))
+
+    if x >= width and y >= height:
+        return image_size
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+
+    return (x, y)
+
+
 class ContentImageBuilder:
 
-    def __init__(self, cache_folder):
+    def __init__(self, cache_folder, shared_image_cache=None):
+        # images were cached per app before the shared image cache, see remove_on_disk_cache
         self.cache_folder = cache_folder
         self.image_cache = {}
 
+        # rendered images shared across apps, keyed by source hash, crop parameters, features and size
+        if shared_image_cache is None:
+            shared_image_cache = ContentImageCache()
+
+        self.shared_image_cache = shared_image_cache
+
+        # set() while FeatureBuildCache records a feature, collects all image urls used by the feature
+        self.recorded_image_urls = None
+
+        # list while image processing is deferred, see defer_image_processing
+        self.image_jobs = None
+
+        self.reset_image_report()
+
+        self.reset_licences()
+
+
+    def reset_image_report(self):
+        self.image_report = {
+            'encoded' : 0,
+            'copied_from_cache' : 0,
+            'copied_svg' : 0,
+            'skipped' : 0,
+            # images written into the www folder, read by BuildProfiler
+            'files_written' : 0,
+            'bytes_written' : 0,
+        }
+
+
+    def add_to_image_report(self, image_report):
+        for key, count in image_report.items():
+            self.image_report[key] = self.image_report.get(key, 0) + count
+
 
     def get_file_extension(self, filepath):
 
@@ -45,59 +128,73 @@ class ContentImageBuilder:
         return output_filename
 
 
-    def get_on_disk_cached_image_filepath(self, content_image, size):
-        output_filename = self.get_output_filename(content_image, size)
-        image_filepath = os.path.join(self.cache_folder, output_filename)
-
-        return image_filepath
-
-
+    # renders the images into the shared image cache, e.g. after an upload
     def build_cached_images(self, content_image, image_sizes=['regular', 'large'], force_build=False):
 
-        if not os.path.isdir(self.cache_folder):
-            os.makedirs(self.cache_folder)
-        
         source_image_path = content_image.image_store.source_image.path
 
         ext = self.get_file_extension(source_image_path)
 
-        if ext != '.svg':
+        # no image processing for svgs
+        if ext == '.svg':
+            return
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+
+            targets = []
 
             for image_sizes_key in image_sizes:
                 for size_name, size in IMAGE_SIZES[image_sizes_key].items():
 
-                    # cached image filepath
-                    absolute_image_filepath = self.get_on_disk_cached_image_filepath(content_image, size)
-                    if not os.path.isfile(absolute_image_filepath) or force_build == True:
+                    cached_image = self.shared_image_cache.get(content_image, size, OUTPUT_FORMAT, ENCODER_PARAMS,
+                                                               count=False)
 
-                        original_image = Image.open(source_image_path)
-                        processed_image = content_image.get_in_memory_processed_image(original_image, size)
+                    if not cached_image or force_build == True:
+                        output_filename = self.get_output_filename(content_image, size)
+                        targets.append((size, os.path.join(temporary_folder, output_filename)))
 
-                        output_format = 'WEBP'
-                        processed_image.save(absolute_image_filepath, output_format, quality=70)
+            if targets:
+                with self.shared_image_cache.lock(content_image):
+                    self.render_processed_images(content_image, targets)
 
+                # the web server does not evict
+                self.shared_image_cache.save_index()
 
-    def get_on_disk_cached_image(self, content_image, size):
-        image_filepath = self.get_on_disk_cached_image_filepath(content_image, size)
 
-        if os.path.isfile(image_filepath):
-            return image_filepath
+    # images are written to a temporary file first and then moved into place
+    # other build processes might read the same file at the same time
+    def get_temporary_filepath(self, filepath):
+        return '{0}.{1}.tmp'.format(filepath, os.getpid())
 
-        return None
 
-    # absolute_image_filepath has to be a built content image
-    def save_to_on_disk_cache(self, content_image, size, absolute_image_filepath):
+    def save_image(self, image, filepath, output_format, **params):
+        temporary_filepath = self.get_temporary_filepath(filepath)
+        image.save(temporary_filepath, output_format, **params)
+        os.replace(temporary_filepath, filepath)
 
-        if not os.path.isdir(self.cache_folder):
-            os.makedirs(self.cache_folder)
 
-        on_disk_cached_image_filepath = self.get_on_disk_cached_image_filepath(content_image, size)
-        shutil.copyfile(absolute_image_filepath, on_disk_cached_image_filepath)
-        
+    def copyfile(self, source_filepath, destination_filepath):
+        temporary_filepath = self.get_temporary_filepath(destination_filepath)
+        shutil.copyfile(source_filepath, temporary_filepath)
+        os.replace(temporary_filepath, destination_filepath)
+
+
+    def count_written_image(self, filepath):
+        self.image_report['files_written'] += 1
+        self.image_report['bytes_written'] += os.path.getsize(filepath)
+
+
+    # cached images are read from the content addressed shared cache
+    def get_on_disk_cached_image(self, content_image, size):
+        return self.shared_image_cache.get(content_image, size, OUTPUT_FORMAT, ENCODER_PARAMS)
+
 
     def build_content_image(self, content_image, absolute_path, relative_path, image_sizes=['regular', 'large']):
 
         image_urls = {}
+
+        # (size, absolute_image_filepath) of all images which have to be rendered
+        targets = []
         
         for image_sizes_key in image_sizes:
             for size_name, size in IMAGE_SIZES[image_sizes_key].items():
@@ -118,6 +215,7 @@ class ContentImageBuilder:
 
                 if cache_key in self.image_cache:
                     image_urls[size_name] = self.image_cache[cache_key]
+                    self.image_report['skipped'] += 1
 
                 else:
                     # create the on disk imagefile for the app
@@ -129,7 +227,9 @@ class ContentImageBuilder:
                     cached_image = self.get_on_disk_cached_image(content_image, size)
                     if cached_image:
                         # simply copy the file
-                        shutil.copyfile(cached_image, absolute_image_filepath)
+                        self.copyfile(cached_image, absolute_image_filepath)
+                        self.count_written_image(absolute_image_filepath)
+                        self.image_report['copied_from_cache'] += 1
 
                     else:
                         # create a new file
@@ -139,68 +239,209 @@ class ContentImageBuilder:
 
                         # no image processing for svgs
                         if ext == '.svg':
-                            shutil.copyfile(source_image_path, absolute_image_filepath)
+                            self.copyfile(source_image_path, absolute_image_filepath)
+                            self.count_written_image(absolute_image_filepath)
+                            self.image_report['copied_svg'] += 1
 
-                        else:
+                        elif os.path.isfile(absolute_image_filepath):
+                            self.image_report['skipped'] += 1
 
-                            if not os.path.isfile(absolute_image_filepath):
-                        
-                                original_image = Image.open(source_image_path)
-                                processed_image = content_image.get_in_memory_processed_image(original_image, size)
-
-                                # all processed images are webp
-                                #original_format = original_image.format
-                                #output_format = original_format
-                                #allowed_formats = ['png', 'jpg', 'jpeg']
-                                
-                                output_format = 'WEBP'
-                                processed_image.save(absolute_image_filepath, output_format)
-
-                            self.save_to_on_disk_cache(content_image, size, absolute_image_filepath)
+                        else:
+                            targets.append((size, absolute_image_filepath))
                         
                         
                     image_urls[size_name] = image_url
 
                     self.image_cache[cache_key] = image_url
+
+        if targets:
+
+            # the urls are known before the images exist, the images are rendered by process_image_jobs
+            if self.image_jobs is not None:
+                self.image_jobs.append((content_image, targets))
+
+            else:
+                self.render_images(content_image, targets)
+
+        if self.recorded_image_urls is not None:
+            self.recorded_image_urls.update(image_urls.values())
         
         return image_urls
 
 
-    def build_licence(self, content_image):
+    ###############################################################################################################
+    # RENDERING
+    # - the source image is decoded, cropped and plotted only once
+    # - all sizes are derived from the next larger size, starting with the full resolution
+    # - the dimensions of each size are the same as get_in_memory_processed_image(original_image, size) returns
+    ###############################################################################################################
+
+    # targets: list of (size, absolute_image_filepath)
+    def render_images(self, content_image, targets):
+
+        shared_image_cache = self.shared_image_cache
+
+        # another build might render the same source at the same time
+        with shared_image_cache.lock(content_image):
+
+            render_targets = []
+
+            for size, absolute_image_filepath in targets:
+
+                cached_image = shared_image_cache.get(content_image, size, OUTPUT_FORMAT, ENCODER_PARAMS,
+                                                      count=False)
+
+                if cached_image:
+                    self.copyfile(cached_image, absolute_image_filepath)
+                    self.count_written_image(absolute_image_filepath)
+                    self.image_report['copied_from_cache'] += 1
+                else:
+                    render_targets.append((size, absolute_image_filepath))
+
+            if render_targets:
+                self.render_processed_images(content_image, render_targets)
+                self.image_report['encoded'] += len(render_targets)
+
+
+    def render_processed_images(self, content_image, targets):
+
+        source_image_path = content_image.image_store.source_image.path
+
+        original_image = Image.open(source_image_path)
+        original_width, original_height = original_image.size
+        larger_original_side = max(original_width, original_height)
+
+        # full resolution, cropped and with features
+        processed_image = content_image.get_in_memory_processed_image(original_image, larger_original_side)
+        original_image.close()
+
+        intermediate_image = processed_image
+
+        for size, absolute_image_filepath in sorted(targets, key=lambda target: target[0], reverse=True):
+
+            # the bounds get_in_memory_processed_image uses for thumbnailing
+            clamped_size = min(size, larger_original_side)
+
+            if content_image.crop_parameters:
+                bounds = (clamped_size, clamped_size)
+            else:
+                bounds = (clamped_size, original_height * original_width / clamped_size)
+
+            output_size = get_thumbnail_size(processed_image.size, bounds)
+
+            if intermediate_image.size != output_size:
+                intermediate_image = intermediate_image.resize(output_size, Image.LANCZOS, reducing_gap=2.0)
+
+            self.save_image(intermediate_image, absolute_image_filepath, OUTPUT_FORMAT, **ENCODER_PARAMS)
+            self.count_written_image(absolute_image_filepath)
+
+            self.shared_image_cache.put(content_image, size, OUTPUT_FORMAT, ENCODER_PARAMS,
+                                        absolute_image_filepath)
+
 
-        licence_json = {}
-        licence = content_image.image_store.licences.first()
+    ###############################################################################################################
+    # DEFERRED IMAGE PROCESSING
+    # - build_content_image only queues the images, the urls are returned immediately
+    # - process_image_jobs renders all queued images, has to be called before the www folder is used
+    ###############################################################################################################
 
-        if licence:
-            licence_serializer = ContentLicenceSerializer(licence)
-            licence_json = licence_serializer.data
+    def defer_image_processing(self):
+        if self.image_jobs is None:
+            self.image_jobs = []
 
-        return licence_json
 
-    
-    def clean_on_disk_cache(self):
+    def process_image_jobs(self, processes=1):
 
-         if self.image_cache:
+        if not self.image_jobs:
+            return
+
+        image_jobs = self.image_jobs
+        self.image_jobs = []
+
+        if processes > 1 and len(image_jobs) > 1:
+
+            # forked workers must not inherit open database connections
+            connections.close_all()
+
+            context = multiprocessing.get_context('fork')
+            max_workers = min(processes, len(image_jobs))
+            chunksize = max(1, int(len(image_jobs) / (max_workers * 4)))
+
+            cache_folders = [self.cache_folder] * len(image_jobs)
+            shared_image_cache_paths = [self.shared_image_cache.cache_path] * len(image_jobs)
+
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                # consume the results, raises exceptions of the workers
+                for shared_image_cache_stats, index_changes, image_report in executor.map(render_image_job,
+                        cache_folders, shared_image_cache_paths, image_jobs, chunksize=chunksize):
+
+                    for key, count in shared_image_cache_stats.items():
+                        self.shared_image_cache.stats[key] += count
+
+                    self.shared_image_cache.add_index_changes(index_changes)
+                    self.add_to_image_report(image_report)
+
+        else:
+            for content_image, targets in image_jobs:
+                self.render_images(content_image, targets)
+
+
+    ###############################################################################################################
+    # LICENCES
+    # - the licences of all image stores of a model (ImageStore, ServerImageStore) are loaded with one query
+    # - each licence is serialized once, build_licence returns the same dictionary for all images of an image store
+    ###############################################################################################################
+
+    def reset_licences(self):
+        # content_type_id : {image_store_id : ContentLicenceRegistry}
+        self.licences = {}
+        # (content_type_id, image_store_id) : serialized licence
+        self.serialized_licences = {}
+
+
+    # same as image_store.licences.first() for each image store of image_store_model
+    def load_licences(self, image_store_model):
+
+        content_type = ContentType.objects.get_for_model(image_store_model)
+
+        if content_type.id not in self.licences:
+
+            licences = {}
+
+            registry_entries = ContentLicenceRegistry.objects.filter(content_type=content_type).order_by('pk')
+
+            for registry_entry in registry_entries:
+                if registry_entry.object_id not in licences:
+                    licences[registry_entry.object_id] = registry_entry
+
+            self.licences[content_type.id] = licences
+
+        return content_type.id
+
+
+    def build_licence(self, content_image):
 
-            cached_image_filenames = []
+        # content_image.image_store would query the image store
+        image_store_model = content_image._meta.get_field('image_store').related_model
+        content_type_id = self.load_licences(image_store_model)
 
-            for size_name, image_url in self.image_cache.items():
+        licence_key = (content_type_id, content_image.image_store_id)
 
-                image_filename = os.path.basename(image_url)
-                cached_image_filenames.append(image_filename)
+        if licence_key not in self.serialized_licences:
 
-            
-            for filename in os.listdir(self.cache_folder):
-                if filename not in cached_image_filenames:
+            licence_json = {}
+            licence = self.licences[content_type_id].get(content_image.image_store_id, None)
 
-                    filepath = os.path.join(self.cache_folder, filename)
+            if licence:
+                licence_serializer = ContentLicenceSerializer(licence)
+                licence_json = licence_serializer.data
 
-                    if os.path.isfile(filepath):
-                        os.remove(filepath)
+            self.serialized_licences[licence_key] = licence_json
 
+        return self.serialized_licences[licence_key]
 
-    def empty_on_disk_cache(self):
-        for filename in os.listdir(self.cache_folder):
 
-            filepath = os.path.join(self.cache_folder, filename)
-            os.remove(filepath)
\ No newline at end of file
+    # the per app image cache of earlier versions, all images are read from the shared image cache
+    def remove_on_disk_cache(self):
+        if os.path.isdir(self.cache_folder):
+            shutil.rmtree(self.cache_folder)
@@ -0,0 +1,476 @@
+###################################################################################################################
+#
+# SHARED CONTENT IMAGE CACHE
+# - rendered content images are shared across content images, apps and tenants
+# - the key of a rendered image is the hash of everything the output depends on: the bytes of the source image,
+#   the crop parameters, the features, the size and the encoder settings
+# - changing the crop parameters or the features of a content image results in a new key, stale entries are
+#   never read
+# - concurrent builds render each image only once: rendering happens while holding an exclusive lock
+#   for the source key, the cache is checked again after acquiring the lock
+# - entries are written to a temporary file first and moved into place, readers never see partial files
+# - the cache is bounded by settings.APP_KIT_IMAGE_CACHE_MAX_BYTES, the least recently used entries are evicted
+#   first
+# - the access index index.json stores the last access and the size of each entry. Each instance collects its
+#   hits and writes in memory and merges them into the index when evicting, the images folder is only scanned
+#   if the index is missing. Hits also update the mtime of the entry, which is the last access of a scan
+#   (atime is unreliable on filesystems mounted with noatime)
+# - worker processes return their index changes to the main process (get_index_changes, add_index_changes),
+#   processes which do not evict, e.g. the web server, write them with save_index
+# - hits, misses, writes and evictions are accumulated in stats.json
+#
+###################################################################################################################
+from django.conf import settings
+
+from contextlib import contextmanager
+
+import os, json, hashlib, shutil, fcntl, time
+
+# increase if the rendering changes, invalidates all entries
+RENDER_VERSION = 1
+
+# 10 GB
+DEFAULT_IMAGE_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+
+def get_shared_image_cache_path():
+    default_path = os.path.join(settings.APP_KIT_ROOT, 'image_cache')
+    return getattr(settings, 'APP_KIT_IMAGE_CACHE_ROOT', default_path)
+
+
+def get_image_cache_max_bytes():
+    return getattr(settings, 'APP_KIT_IMAGE_CACHE_MAX_BYTES', DEFAULT_IMAGE_CACHE_MAX_BYTES)
+
+
+class ContentImageCache:
+
+    def __init__(self, cache_path=None):
+
+        if cache_path is None:
+            cache_path = get_shared_image_cache_path()
+
+        self.cache_path = cache_path
+
+        # image_store.pk -> hash of the source bytes
+        self.source_hashes = {}
+
+        self.reset_index_changes()
+        self.reset_stats()
+
+
+    # counts of this instance, added to stats.json by save_stats
+    def reset_stats(self):
+        self.stats = {
+            'hits' : 0,
+            'misses' : 0,
+            'writes' : 0,
+            'evicted' : 0,
+            'evicted_bytes' : 0,
+        }
+
+
+    # hits and writes of this instance, not yet merged into index.json
+    # relative filepath -> last access, relative filepath -> [last access, size]
+    def reset_index_changes(self):
+        self.accessed = {}
+        self.written = {}
+
+
+    def get_index_changes(self):
+        return {
+            'accessed' : self.accessed,
+            'written' : self.written,
+        }
+
+
+    # index changes of another instance, e.g. of a worker process
+    def add_index_changes(self, index_changes):
+
+        self.written.update(index_changes['written'])
+
+        for relative_filepath, last_access in index_changes['accessed'].items():
+            self.accessed[relative_filepath] = max(self.accessed.get(relative_filepath, 0), last_access)
+
+
+    @property
+    def images_path(self):
+        return os.path.join(self.cache_path, 'images')
+
+    @property
+    def locks_path(self):
+        return os.path.join(self.cache_path, 'locks')
+
+    @property
+    def stats_filepath(self):
+        return os.path.join(self.cache_path, 'stats.json')
+
+    @property
+    def index_filepath(self):
+        return os.path.join(self.cache_path, 'index.json')
+
+
+    def get_source_hash(self, image_store):
+
+        if image_store.pk in self.source_hashes:
+            return self.source_hashes[image_store.pk]
+
+        source_hash = image_store.md5
+
+        if not source_hash:
+            hasher = hashlib.md5()
+            with open(image_store.source_image.path, 'rb') as source_file:
+                for chunk in iter(lambda: source_file.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            source_hash = hasher.hexdigest()
+
+        self.source_hashes[image_store.pk] = source_hash
+
+        return source_hash
+
+
+    def get_crop_parameters(self, content_image):
+
+        crop_parameters = content_image.crop_parameters
+
+        if crop_parameters:
+            try:
+                crop_parameters = json.loads(crop_parameters)
+            except ValueError:
+                pass
+
+        return crop_parameters
+
+
+    # everything the processed image at full resolution depends on
+    def get_source_key(self, content_image):
+
+        source = {
+            'render_version' : RENDER_VERSION,
+            'source' : self.get_source_hash(content_image.image_store),
+            'crop_parameters' : self.get_crop_parameters(content_image),
+            'features' : content_image.features,
+        }
+
+        source_json = json.dumps(source, sort_keys=True, default=str)
+        return hashlib.sha256(source_json.encode('utf-8')).hexdigest()
+
+
+    def get_key(self, content_image, size, output_format, encoder_params):
+
+        image = {
+            'source_key' : self.get_source_key(content_image),
+            'size' : size,
+            'output_format' : output_format,
+            'encoder_params' : encoder_params,
+        }
+
+        image_json = json.dumps(image, sort_keys=True)
+        return hashlib.sha256(image_json.encode('utf-8')).hexdigest()
+
+
+    def get_relative_filepath(self, key, output_format):
+        filename = '{0}.{1}'.format(key, output_format.lower())
+        return os.path.join(key[:2], filename)
+
+
+    def get_filepath(self, key, output_format):
+        return os.path.join(self.images_path, self.get_relative_filepath(key, output_format))
+
+
+    # count=False for lookups which repeat a lookup already counted, e.g. after acquiring the lock
+    def get(self, content_image, size, output_format, encoder_params, count=True):
+
+        key = self.get_key(content_image, size, output_format, encoder_params)
+        filepath = self.get_filepath(key, output_format)
+
+        try:
+            # mark as recently used
+            os.utime(filepath)
+        except FileNotFoundError:
+            if count == True:
+                self.stats['misses'] += 1
+            return None
+
+        if count == True:
+            self.stats['hits'] += 1
+
+        self.accessed[self.get_relative_filepath(key, output_format)] = time.time()
+
+        return filepath
+
+
+    def put(self, content_image, size, output_format, encoder_params, image_filepath):
+
+        key = self.get_key(content_image, size, output_format, encoder_params)
+        filepath = self.get_filepath(key, output_format)
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        temporary_filepath = '{0}.{1}.tmp'.format(filepath, os.getpid())
+        shutil.copyfile(image_filepath, temporary_filepath)
+        os.replace(temporary_filepath, filepath)
+
+        self.stats['writes'] += 1
+
+        self.written[self.get_relative_filepath(key, output_format)] = [time.time(), os.path.getsize(filepath)]
+
+        return filepath
+
+
+    # exclusive lock across processes for rendering all sizes of one source
+    def lock(self, content_image):
+        source_key = self.get_source_key(content_image)
+        return self.lock_file('{0}.lock'.format(source_key))
+
+
+    @contextmanager
+    def lock_file(self, lock_filename):
+
+        os.makedirs(self.locks_path, exist_ok=True)
+
+        lock_filepath = os.path.join(self.locks_path, lock_filename)
+
+        with open(lock_filepath, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+    ###############################################################################################################
+    # EVICTION AND STATISTICS
+    ###############################################################################################################
+
+    # relative filepath -> [last_access, size] of all files in the images folder
+    def scan_index(self):
+
+        index = {}
+
+        if not os.path.isdir(self.images_path):
+            return index
+
+        for folder in os.scandir(self.images_path):
+
+            if not folder.is_dir():
+                continue
+
+            for entry in os.scandir(folder.path):
+
+                if not entry.is_file() or entry.name.endswith('.tmp'):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another process
+                    continue
+
+                index[os.path.join(folder.name, entry.name)] = [stat.st_mtime, stat.st_size]
+
+        return index
+
+
+    # None if the index has not been written yet
+    def read_index(self):
+
+        if not os.path.isfile(self.index_filepath):
+            return None
+
+        try:
+            with open(self.index_filepath, 'r') as index_file:
+                return json.loads(index_file.read())
+        except ValueError:
+            return None
+
+
+    def write_index(self, index):
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        temporary_filepath = '{0}.{1}.tmp'.format(self.index_filepath, os.getpid())
+        with open(temporary_filepath, 'w') as index_file:
+            index_file.write(json.dumps(index))
+
+        os.replace(temporary_filepath, self.index_filepath)
+
+
+    # merge the hits and writes of this instance into the index, requires the index lock
+    def update_index(self):
+
+        index = self.read_index()
+
+        if index is None:
+            index = self.scan_index()
+
+        for relative_filepath, entry in self.written.items():
+            index[relative_filepath] = entry
+
+        for relative_filepath, last_access in self.accessed.items():
+            if relative_filepath in index:
+                index[relative_filepath][0] = max(index[relative_filepath][0], last_access)
+
+        self.reset_index_changes()
+
+        return index
+
+
+    def lock_index(self):
+        return self.lock_file('index.lock')
+
+
+    # write the index changes of this instance without evicting
+    def save_index(self):
+
+        if not self.written and not self.accessed:
+            return
+
+        with self.lock_index():
+            index = self.update_index()
+            self.write_index(index)
+
+
+    # access time index, list of (last_access, size, filepath), least recently used first
+    def get_entries(self):
+
+        with self.lock_index():
+            index = self.update_index()
+            self.write_index(index)
+
+        entries = [(last_access, size, os.path.join(self.images_path, relative_filepath))
+                   for relative_filepath, (last_access, size) in index.items()]
+
+        entries.sort()
+
+        return entries
+
+
+    def get_size(self):
+        return sum([size for last_access, size, filepath in self.get_entries()])
+
+
+    # remove the least recently used entries until the cache fits into max_bytes
+    def evict(self, max_bytes=None):
+
+        if max_bytes is None:
+            max_bytes = get_image_cache_max_bytes()
+
+        report = {
+            'evicted' : 0,
+            'evicted_bytes' : 0,
+        }
+
+        with self.lock_index():
+
+            index = self.update_index()
+            cache_size = sum([size for last_access, size in index.values()])
+
+            if cache_size > max_bytes:
+
+                least_recently_used = sorted(index.items(), key=lambda item: item[1])
+
+                for relative_filepath, (last_access, size) in least_recently_used:
+
+                    if cache_size <= max_bytes:
+                        break
+
+                    try:
+                        os.remove(os.path.join(self.images_path, relative_filepath))
+                    except FileNotFoundError:
+                        pass
+
+                    del index[relative_filepath]
+
+                    cache_size -= size
+                    report['evicted'] += 1
+                    report['evicted_bytes'] += size
+
+            self.write_index(index)
+
+        self.stats['evicted'] += report['evicted']
+        self.stats['evicted_bytes'] += report['evicted_bytes']
+
+        report['size'] = cache_size
+
+        return report
+
+
+    def read_stats(self):
+
+        stats = {}
+
+        if os.path.isfile(self.stats_filepath):
+            with open(self.stats_filepath, 'r') as stats_file:
+                stats = json.loads(stats_file.read())
+
+        return stats
+
+
+    # add the counts of this instance to stats.json
+    def save_stats(self):
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+        with self.lock_file('stats.lock'):
+
+            stats = self.read_stats()
+
+            for key, count in self.stats.items():
+                stats[key] = stats.get(key, 0) + count
+
+            stats['updated_at'] = time.time()
+
+            temporary_filepath = '{0}.{1}.tmp'.format(self.stats_filepath, os.getpid())
+            with open(temporary_filepath, 'w') as stats_file:
+                stats_file.write(json.dumps(stats, indent=4))
+
+            os.replace(temporary_filepath, self.stats_filepath)
+
+        self.reset_stats()
+
+
+    # run after each build
+    def maintain(self):
+
+        eviction_report = self.evict()
+        build_stats = self.stats.copy()
+        self.save_stats()
+
+        report = {
+            'hits' : build_stats['hits'],
+            'misses' : build_stats['misses'],
+            'writes' : build_stats['writes'],
+            'evicted' : eviction_report['evicted'],
+            'evicted_bytes' : eviction_report['evicted_bytes'],
+            'size' : eviction_report['size'],
+        }
+
+        return report
+
+
+    def get_report(self):
+
+        stats = self.read_stats()
+        entries = self.get_entries()
+
+        hits = stats.get('hits', 0)
+        misses = stats.get('misses', 0)
+
+        hit_ratio = None
+        if hits + misses > 0:
+            hit_ratio = hits / (hits + misses)
+
+        report = {
+            'cache_path' : self.cache_path,
+            'entries' : len(entries),
+            'size' : sum([size for last_access, size, filepath in entries]),
+            'max_bytes' : get_image_cache_max_bytes(),
+            'hits' : hits,
+            'misses' : misses,
+            'hit_ratio' : hit_ratio,
+            'writes' : stats.get('writes', 0),
+            'evicted' : stats.get('evicted', 0),
+            'evicted_bytes' : stats.get('evicted_bytes', 0),
+        }
+
+        return report
@@ -0,0 +1,192 @@
+###################################################################################################################
+#
+# CONTENT MANIFEST
+# - maps each file of the built browser app to its content hash and size:
+#   {
+#       "version" : 3,
+#       "files" : {
+#           "localcosmos/features.json" : {"sha256" : "...", "size" : 1234, "integrity" : "sha256-..."}
+#       }
+#   }
+# - "integrity" is the subresource integrity value of the file
+# - settings.APP_KIT_CONTENT_MANIFEST = True writes the manifest to www/content-manifest.json, the service worker
+#   or a CDN can compare it with the manifest of the installed version and fetch only the changed files
+# - the manifest is also computed if delta packages are enabled, see DeltaPackage
+# - json files written by JSONWriter are hashed while they are written, their hashes are reused if the file
+#   has not been modified since, all other files are hashed in one pass after the browser app has been built
+# - settings.APP_KIT_HASHED_FILENAMES = True adds a hardlink {name}.{hash}{ext} next to each file, listed as
+#   "hashedPath" in the manifest. Hashed paths never change their content and can be served with far-future
+#   caching headers.
+#
+###################################################################################################################
+from django.conf import settings
+
+import os, json, hashlib, base64, shutil
+
+MANIFEST_FILENAME = 'content-manifest.json'
+
+# length of the hash in hashed filenames
+HASHED_FILENAME_LENGTH = 12
+
+
+def get_manifest_entry(digest, size):
+
+    entry = {
+        'sha256' : digest.hex(),
+        'size' : size,
+        'integrity' : 'sha256-{0}'.format(base64.b64encode(digest).decode()),
+    }
+
+    return entry
+
+
+def get_hashed_path(relative_path, sha256):
+    basename, ext = os.path.splitext(relative_path)
+    return '{0}.{1}{2}'.format(basename, sha256[:HASHED_FILENAME_LENGTH], ext)
+
+
+class ContentManifest:
+
+    # source_folders: folders which contain files of www_folder at the same relative paths, e.g. the www folder
+    # of the build sources, or a symlink to www_folder
+    def __init__(self, www_folder, app_version, json_writer=None, source_folders=[]):
+        self.www_folder = www_folder
+        self.app_version = app_version
+        self.json_writer = json_writer
+        self.source_folders = source_folders
+
+        self.files = {}
+
+        self.report = {
+            'written' : self.is_enabled(),
+            'hashed_filenames' : self.hashed_filenames_enabled(),
+            'files' : 0,
+            'bytes' : 0,
+            'hashed' : 0,
+            'reused' : 0,
+        }
+
+
+    @classmethod
+    def is_enabled(cls):
+        return getattr(settings, 'APP_KIT_CONTENT_MANIFEST', False)
+
+    @classmethod
+    def hashed_filenames_enabled(cls):
+        return cls.is_enabled() and getattr(settings, 'APP_KIT_HASHED_FILENAMES', False)
+
+    @property
+    def manifest_filepath(self):
+        return os.path.join(self.www_folder, MANIFEST_FILENAME)
+
+
+    def get_report(self):
+        return self.report
+
+
+    # the hash recorded by JSONWriter, if the file has not been changed after it has been written
+    def get_written_entry(self, relative_path, size):
+
+        if self.json_writer is None or not self.json_writer.written_files:
+            return None
+
+        for folder in [self.www_folder] + self.source_folders:
+
+            filepath = os.path.normpath(os.path.join(folder, relative_path))
+            written_file = self.json_writer.written_files.get(filepath, None)
+
+            if written_file:
+                digest, written_size, mtime_ns = written_file
+
+                if written_size == size and os.stat(filepath).st_mtime_ns == mtime_ns:
+                    return get_manifest_entry(digest, size)
+
+        return None
+
+
+    def hash_file(self, filepath, size):
+
+        hasher = hashlib.sha256()
+
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+
+        return get_manifest_entry(hasher.digest(), size)
+
+
+    def build(self):
+
+        self.files = {}
+
+        for root, dirs, filenames in os.walk(self.www_folder, followlinks=True):
+
+            dirs.sort()
+
+            for filename in sorted(filenames):
+
+                filepath = os.path.join(root, filename)
+                relative_path = os.path.relpath(filepath, self.www_folder).replace(os.sep, '/')
+
+                if relative_path == MANIFEST_FILENAME:
+                    continue
+
+                size = os.path.getsize(filepath)
+
+                entry = self.get_written_entry(relative_path, size)
+
+                if entry is None:
+                    entry = self.hash_file(filepath, size)
+                    self.report['hashed'] += 1
+                else:
+                    self.report['reused'] += 1
+
+                self.files[relative_path] = entry
+
+                self.report['files'] += 1
+                self.report['bytes'] += size
+
+        return self.files
+
+
+    def add_hashed_filenames(self):
+
+        for relative_path, entry in self.files.items():
+
+            hashed_path = get_hashed_path(relative_path, entry['sha256'])
+            hashed_filepath = os.path.join(self.www_folder, hashed_path)
+
+            if not os.path.exists(hashed_filepath):
+
+                filepath = os.path.join(self.www_folder, relative_path)
+
+                try:
+                    os.link(filepath, hashed_filepath)
+                except OSError:
+                    shutil.copy2(filepath, hashed_filepath)
+
+            entry['hashedPath'] = hashed_path
+
+
+    def write(self):
+
+        manifest = {
+            'version' : self.app_version,
+            'files' : self.files,
+        }
+
+        with open(self.manifest_filepath, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, separators=(',', ':'))
+
+
+    def create(self):
+
+        self.build()
+
+        if self.hashed_filenames_enabled():
+            self.add_hashed_filenames()
+
+        if self.is_enabled():
+            self.write()
+
+        return self.report
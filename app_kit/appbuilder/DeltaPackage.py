@@ -0,0 +1,224 @@
+###################################################################################################################
+#
+# DELTA PACKAGES
+# - optional, enabled by settings.APP_KIT_DELTA_PACKAGES = True
+# - after the browser app has been built, the release builder writes a manifest of the www folder:
+#   {
+#       "version" : 3,
+#       "files" : {"relative/path.json" : {"sha256" : "...", "size" : 1234}}
+#   }
+# - the manifest is compared with the manifest of the published version, which results in the delta:
+#   {
+#       "fromVersion" : 2,
+#       "toVersion" : 3,
+#       "added" : {"relative/path.json" : {"sha256" : "...", "size" : 1234}},
+#       "changed" : {...},
+#       "removed" : ["relative/path.json"]
+#   }
+# - the delta package is a zipfile with delta.json and the added and changed files below www/
+# - the files of the manifest are those of the ContentManifest of the build if it has been computed
+# - if the published version has no manifest, the content-manifest.json of its served www folder is used, or the
+#   manifest is computed from the files of that folder
+# - manifest, delta json and delta package are written to {release}/packages/delta/
+#
+###################################################################################################################
+from django.conf import settings
+
+from app_kit.appbuilder.ZipArchiver import ZipArchiver
+from app_kit.appbuilder.ContentManifest import MANIFEST_FILENAME
+
+import os, json, hashlib, time
+
+
+def hash_file(filepath):
+
+    hasher = hashlib.sha256()
+
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+# {relative_path : {'sha256' : hexdigest, 'size' : bytes}} of all files of folder
+def get_tree_manifest(folder):
+
+    files = {}
+
+    for root, dirs, filenames in os.walk(folder, followlinks=True):
+        for filename in filenames:
+            filepath = os.path.join(root, filename)
+            relative_path = os.path.relpath(filepath, folder).replace(os.sep, '/')
+
+            files[relative_path] = {
+                'sha256' : hash_file(filepath),
+                'size' : os.path.getsize(filepath),
+            }
+
+    return files
+
+
+def compare_manifests(previous_files, files):
+
+    delta = {
+        'added' : {},
+        'changed' : {},
+        'removed' : [],
+    }
+
+    for relative_path, entry in files.items():
+
+        previous_entry = previous_files.get(relative_path, None)
+
+        if previous_entry is None:
+            delta['added'][relative_path] = entry
+        elif previous_entry['sha256'] != entry['sha256']:
+            delta['changed'][relative_path] = entry
+
+    delta['removed'] = sorted([relative_path for relative_path in previous_files if relative_path not in files])
+
+    return delta
+
+
+class DeltaPackageBuilder:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+        self.meta_app = app_release_builder.meta_app
+
+        self.report = {
+            'version' : self.meta_app.current_version,
+            'previous_version' : self.meta_app.published_version,
+            'files' : 0,
+            'bytes' : 0,
+            'added' : 0,
+            'changed' : 0,
+            'removed' : 0,
+            'delta_bytes' : 0,
+            'package_bytes' : 0,
+            'build_time' : 0,
+        }
+
+
+    @classmethod
+    def is_enabled(cls):
+        return getattr(settings, 'APP_KIT_DELTA_PACKAGES', False)
+
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/release/packages/delta/
+    def get_delta_path(self, app_version=None):
+
+        if app_version is None:
+            return os.path.join(self.app_release_builder._build_packages_path, 'delta')
+
+        return os.path.join(self.app_release_builder._app_root_path, 'version', str(app_version),
+            self.app_release_builder._builder_identifier, 'packages', 'delta')
+
+    def get_manifest_filepath(self, app_version=None):
+        return os.path.join(self.get_delta_path(app_version), 'manifest.json')
+
+    @property
+    def delta_name(self):
+        return '{0}-{1}-{2}'.format(self.meta_app.app.uid, self.meta_app.published_version,
+            self.meta_app.current_version)
+
+    @property
+    def delta_json_filepath(self):
+        return os.path.join(self.get_delta_path(), '{0}.json'.format(self.delta_name))
+
+    @property
+    def delta_package_filepath(self):
+        return os.path.join(self.get_delta_path(), '{0}.zip'.format(self.delta_name))
+
+
+    def get_report(self):
+        return self.report
+
+
+    def write_json(self, filepath, data):
+        with open(filepath, 'w', encoding='utf-8') as json_file:
+            json.dump(data, json_file)
+
+
+    # the files of the published version, None if no version has been published
+    def get_previous_files(self):
+
+        previous_version = self.meta_app.published_version
+
+        if not previous_version:
+            return None
+
+        manifest_filepath = self.get_manifest_filepath(previous_version)
+
+        if os.path.isfile(manifest_filepath):
+            with open(manifest_filepath, 'r', encoding='utf-8') as manifest_file:
+                return json.load(manifest_file)['files']
+
+        published_www_path = self.app_release_builder._published_browser_served_www_path
+
+        if os.path.isdir(published_www_path):
+
+            published_manifest_filepath = os.path.join(published_www_path, MANIFEST_FILENAME)
+
+            if os.path.isfile(published_manifest_filepath):
+                with open(published_manifest_filepath, 'r', encoding='utf-8') as manifest_file:
+                    return json.load(manifest_file)['files']
+
+            return get_tree_manifest(os.path.realpath(published_www_path))
+
+        return None
+
+
+    # www_folder: the built browser app
+    # files: the files of the ContentManifest of www_folder, computed if not given
+    def create(self, www_folder, files=None):
+
+        started_at = time.time()
+
+        self.app_release_builder.deletecreate_folder(self.get_delta_path())
+
+        if files is None:
+            files = get_tree_manifest(www_folder)
+
+        manifest = {
+            'version' : self.meta_app.current_version,
+            'files' : files,
+        }
+
+        self.write_json(self.get_manifest_filepath(), manifest)
+
+        self.report['files'] = len(files)
+        self.report['bytes'] = sum([entry['size'] for entry in files.values()])
+
+        previous_files = self.get_previous_files()
+
+        if previous_files is not None:
+
+            delta = {
+                'fromVersion' : self.meta_app.published_version,
+                'toVersion' : self.meta_app.current_version,
+            }
+
+            delta.update(compare_manifests(previous_files, files))
+
+            self.write_json(self.delta_json_filepath, delta)
+
+            updated_paths = sorted(list(delta['added'].keys()) + list(delta['changed'].keys()))
+
+            entries = [(self.delta_json_filepath, 'delta.json')]
+            for relative_path in updated_paths:
+                entries.append((os.path.join(www_folder, relative_path), 'www/{0}'.format(relative_path)))
+
+            zip_archiver = ZipArchiver(self.delta_package_filepath)
+            zip_archiver.create_from_entries(entries)
+
+            self.report['added'] = len(delta['added'])
+            self.report['changed'] = len(delta['changed'])
+            self.report['removed'] = len(delta['removed'])
+            self.report['delta_bytes'] = sum([files[relative_path]['size'] for relative_path in updated_paths])
+            self.report['package_bytes'] = os.path.getsize(self.delta_package_filepath)
+
+        self.report['build_time'] = round(time.time() - started_at, 3)
+
+        return self.report
@@ -0,0 +1,336 @@
+###################################################################################################################
+#
+# PARALLEL FEATURE BUILDING
+# - independent features are built in worker processes, settings.APP_KIT_BUILD_PROCESSES
+# - each worker writes into its own www folder, the recorded changes of the builder accumulators are
+#   returned to the main process (see BuildCache.FeatureBuildCache.record)
+# - images queued by a worker are rendered by that worker
+# - the main process merges the results in the order of the sequential build, which makes the output
+#   independent of the order the workers finish in
+# - the build order follows the dependencies declared in BuildCache, see get_schedule:
+#     1. features built before all other features: the Glossary and the BackboneTaxonomy, which assigns the
+#        slugs of all taxa of the app
+#     2. independent features, in parallel
+#     3. features which depend on all other features and are not built first
+#   the sequential build uses the same order
+# - taxon slugs are assigned first come. A worker which assigned a slug that an earlier feature of the
+#   sequential order assigned to another taxon, e.g. of a homonym, is not merged, the feature is built again
+#   in the main process
+# - features which read the state of other features of the same type (default GenericForm) are built
+#   in the main process
+#
+###################################################################################################################
+from django.conf import settings
+from django.db import connection, connections
+
+from app_kit.models import MetaAppGenericContent
+from app_kit.appbuilder.BuildCache import FeatureBuildCache, READ_BY_ALL_FEATURES, DEPENDS_ON_ALL_FEATURES
+from app_kit.appbuilder.BuildProfiler import BuildProfiler
+
+from concurrent.futures import ProcessPoolExecutor
+
+import os, shutil, multiprocessing
+
+# features which only depend on the locales, the taxon slugs and the database
+PARALLEL_FEATURES = ['NatureGuide', 'Map']
+
+
+# [path, name_uuid] of each taxon slug set by the taxon_slugs delta of a record,
+# path is ['taxon_latname', slug] or ['vernacular', language_code, slug]
+def get_taxon_slug_assignments(delta):
+
+    assignments = []
+
+    def add_assignments(path, value):
+
+        depth = 3 if path[:1] == ['vernacular'] else 2
+
+        if path and len(path) == depth:
+            assignments.append([path, value])
+
+        elif isinstance(value, dict):
+            for key, child_value in value.items():
+                add_assignments(path + [key], child_value)
+
+    for path, operation, value in delta:
+        # slugs are only added
+        if operation == 'set':
+            add_assignments(path, value)
+
+    return assignments
+
+
+# set in each worker process by init_worker, the builder is inherited from the main process by fork
+worker_app_release_builder = None
+
+
+def init_worker(app_release_builder, tenant):
+
+    global worker_app_release_builder
+    worker_app_release_builder = app_release_builder
+
+    # the connection of the main process must not be shared
+    connections.close_all()
+    connection.set_tenant(tenant)
+
+
+def build_feature_in_worker(app_generic_content_id, worker_www_path):
+
+    builder = worker_app_release_builder
+
+    app_generic_content = MetaAppGenericContent.objects.get(pk=app_generic_content_id)
+    generic_content = app_generic_content.generic_content
+
+    builder.logger.info('[worker {0}] Building {1} {2}'.format(os.getpid(), generic_content.__class__.__name__,
+                                                               generic_content.uuid))
+
+    main_locales_path = builder._app_locales_path
+
+    builder.worker_www_path = worker_www_path
+
+    # the locales are read by some builders, e.g. glossarizing
+    if os.path.isdir(main_locales_path):
+        shutil.copytree(main_locales_path, builder._app_locales_path)
+
+    build_method = getattr(builder, '_build_{0}'.format(generic_content.__class__.__name__))
+
+    # queued images of the main process are rendered by the main process
+    content_image_builder = builder.content_image_builder
+    content_image_builder.reset_image_report()
+    if content_image_builder.image_jobs is not None:
+        content_image_builder.image_jobs = []
+
+    # the counts and index changes inherited from the main process are saved by the main process
+    content_image_builder.shared_image_cache.reset_stats()
+    content_image_builder.shared_image_cache.reset_index_changes()
+
+    # the phases of the worker are added to the profile of the main process
+    builder.build_profiler = BuildProfiler(builder)
+
+    with builder.build_profiler.phase(generic_content.__class__.__name__, uuid=str(generic_content.uuid)):
+
+        feature_build_cache = builder.feature_build_cache
+        record = feature_build_cache.record(app_generic_content, build_method)
+
+        # this worker already is one of several processes
+        content_image_builder.process_image_jobs(processes=1)
+
+    content_image_builder.shared_image_cache.save_stats()
+
+    # the main process evicts, see ContentImageCache.maintain
+    index_changes = content_image_builder.shared_image_cache.get_index_changes()
+
+    return record, content_image_builder.image_report, index_changes, builder.build_profiler.get_report()
+
+
+
+class FeatureBuildScheduler:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+
+        self.processes = getattr(settings, 'APP_KIT_BUILD_PROCESSES', 1)
+
+        self.report = {
+            'processes' : self.processes,
+            'workers' : [],
+            'main_process' : [],
+        }
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/release/workers/
+    @property
+    def workers_path(self):
+        return os.path.join(self.app_release_builder._app_builder_path, 'workers')
+
+    def get_worker_www_path(self, app_generic_content):
+        return os.path.join(self.workers_path, str(app_generic_content.pk), 'www')
+
+
+    def get_report(self):
+        return self.report
+
+
+    # feature_links in the build order, a list of three stages
+    # - features read by all other features are built first, e.g. the backbone taxonomy
+    # - other features which depend on all other features are built last
+    def get_schedule(self, feature_links):
+
+        first_links = []
+        independent_links = []
+        last_links = []
+
+        for feature_link in feature_links:
+
+            generic_content_type = feature_link[0].generic_content.__class__.__name__
+
+            if generic_content_type in READ_BY_ALL_FEATURES:
+                first_links.append(feature_link)
+
+            elif generic_content_type in DEPENDS_ON_ALL_FEATURES:
+                last_links.append(feature_link)
+
+            else:
+                independent_links.append(feature_link)
+
+        return [first_links, independent_links, last_links]
+
+
+    def run_in_worker(self, app_generic_content, feature_build_cache):
+
+        generic_content_type = app_generic_content.generic_content.__class__.__name__
+
+        if generic_content_type not in PARALLEL_FEATURES:
+            return False
+
+        if feature_build_cache.enabled:
+            record_key = str(app_generic_content.generic_content.uuid)
+            previous_record = feature_build_cache.previous_records.get(record_key, None)
+
+            # will most likely be restored from the previous build
+            if previous_record and previous_record['fingerprint'] == feature_build_cache.get_fingerprint(
+                app_generic_content):
+                return False
+
+        return True
+
+
+    # feature_links: list of (app_generic_content, build_method)
+    def build(self, feature_links):
+
+        builder = self.app_release_builder
+
+        if not builder.feature_build_cache:
+            builder.feature_build_cache = FeatureBuildCache(builder)
+
+        first_links, independent_links, last_links = self.get_schedule(feature_links)
+
+        for link, build_method in first_links:
+            self.build_in_main_process(link, build_method)
+
+        # the workers are forked after the first stage and inherit its state
+        self.build_parallel(independent_links)
+
+        for link, build_method in last_links:
+            self.build_in_main_process(link, build_method)
+
+
+    def build_in_main_process(self, app_generic_content, build_method):
+        feature_build_cache = self.app_release_builder.feature_build_cache
+        self.report['main_process'].append(feature_build_cache.get_report_entry(app_generic_content))
+        self.app_release_builder._build_feature(app_generic_content, build_method)
+
+
+    def build_parallel(self, feature_links):
+
+        builder = self.app_release_builder
+        feature_build_cache = builder.feature_build_cache
+
+        worker_links = []
+        if self.processes > 1:
+            worker_links = [link for link, build_method in feature_links
+                            if self.run_in_worker(link, feature_build_cache)]
+
+        if len(worker_links) < 2:
+            for link, build_method in feature_links:
+                self.build_in_main_process(link, build_method)
+            return
+
+        futures = {}
+
+        # forked workers must not inherit open database connections
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        max_workers = min(self.processes, len(worker_links))
+
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=init_worker,
+                                 initargs=(builder, connection.tenant)) as executor:
+
+            for link in worker_links:
+                futures[link.pk] = executor.submit(build_feature_in_worker, link.pk,
+                                                   self.get_worker_www_path(link))
+
+            for link, build_method in feature_links:
+
+                if link.pk in futures:
+                    self.add_worker_result(link, build_method, futures[link.pk].result())
+
+                else:
+                    self.build_in_main_process(link, build_method)
+
+        if os.path.isdir(self.workers_path):
+            shutil.rmtree(self.workers_path)
+
+
+    # result: the return value of build_feature_in_worker
+    def add_worker_result(self, app_generic_content, build_method, result):
+
+        builder = self.app_release_builder
+        feature_build_cache = builder.feature_build_cache
+
+        record, image_report, index_changes, phases = result
+
+        builder.build_profiler.add_phases(phases, process='worker')
+
+        # the rendered images are in the shared image cache in any case
+        builder.content_image_builder.shared_image_cache.add_index_changes(index_changes)
+
+        if self.merge(app_generic_content, record):
+            builder.content_image_builder.add_to_image_report(image_report)
+            feature_build_cache.add_record(app_generic_content, record)
+            self.report['workers'].append(feature_build_cache.get_report_entry(app_generic_content))
+
+        else:
+            builder.logger.info('Taxon slugs of {0} conflict with the slugs of the features built before, '
+                                'building it again'.format(app_generic_content.generic_content.uuid))
+            self.build_in_main_process(app_generic_content, build_method)
+
+
+    # slugs the worker assigned which differ from the slugs assigned by the features merged before
+    def get_taxon_slug_conflicts(self, record):
+
+        conflicts = []
+
+        delta = record['deltas'].get('taxon_slugs', [])
+
+        for path, name_uuid in get_taxon_slug_assignments(delta):
+
+            assigned = self.app_release_builder.taxon_slugs
+            for key in path:
+                assigned = assigned.get(key, None) if isinstance(assigned, dict) else None
+
+            if assigned is not None and assigned != name_uuid:
+                conflicts.append(path)
+
+        return conflicts
+
+
+    # move the files of a worker into the www folder and apply the recorded changes
+    # returns False if the taxon slugs of the worker conflict, nothing is merged then
+    def merge(self, app_generic_content, record):
+
+        if self.get_taxon_slug_conflicts(record):
+            return False
+
+        builder = self.app_release_builder
+        worker_www_path = self.get_worker_www_path(app_generic_content)
+
+        for relative_path in record['files']:
+
+            source_filepath = os.path.join(worker_www_path, relative_path)
+
+            # images already present in the main process have not been written by the worker
+            if not os.path.isfile(source_filepath):
+                continue
+
+            destination_filepath = os.path.join(builder._app_www_path, relative_path)
+
+            destination_folder = os.path.dirname(destination_filepath)
+            if not os.path.isdir(destination_folder):
+                os.makedirs(destination_folder)
+
+            os.replace(source_filepath, destination_filepath)
+
+        builder.feature_build_cache.replay(record)
+
+        return True
@@ -0,0 +1,151 @@
+###################################################################################################################
+#
+# FRONTEND STAGING
+# - stages the www folder of the frontend into the www folder of the app build
+# - settings.APP_KIT_FRONTEND_STAGING:
+#   'copy' (default): every file is copied
+#   'hardlink': unchanged frontend files are hardlinked into the build
+#   'reflink': unchanged frontend files are cloned (copy on write), e.g. on btrfs or xfs
+# - files which the builder rewrites (settings.json, locales) are always copied, see MATERIALIZED_PATHS
+# - links which are not possible, e.g. across filesystems, fall back to copying the file
+# - builders writing to a staged file have to call break_link(filepath) first, writing into a hardlinked
+#   file would change the frontend itself. JSONWriter and LocaleStore do this.
+#
+###################################################################################################################
+from django.conf import settings
+
+import os, shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+STAGING_MODES = ['copy', 'hardlink', 'reflink']
+
+# relative to the www folder, files and folders
+MATERIALIZED_PATHS = ['settings.json', 'locales']
+
+# linux/fs.h
+FICLONE = 0x40049409
+
+
+def break_link(filepath):
+    # writing into a file which shares its inode with the frontend would alter the frontend
+    if os.path.isfile(filepath) and os.stat(filepath).st_nlink > 1:
+        os.remove(filepath)
+
+
+def reflink(source_filepath, target_filepath):
+
+    if fcntl is None:
+        raise OSError('reflinks are not supported on this platform')
+
+    with open(source_filepath, 'rb') as source_file, open(target_filepath, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            target_file.close()
+            os.remove(target_filepath)
+            raise
+
+    shutil.copystat(source_filepath, target_filepath)
+
+
+class FrontendStaging:
+
+    def __init__(self, source_folder, target_folder, mode=None):
+        self.source_folder = source_folder
+        self.target_folder = target_folder
+
+        if mode is None:
+            mode = getattr(settings, 'APP_KIT_FRONTEND_STAGING', 'copy')
+
+        if mode not in STAGING_MODES:
+            raise ValueError('Invalid frontend staging mode: {0}. Valid modes are {1}'.format(mode,
+                ', '.join(STAGING_MODES)))
+
+        self.mode = mode
+
+        # the first failed link switches to copying, e.g. if the build is on another filesystem
+        self.link_supported = True
+
+        self.report = {
+            'mode' : self.mode,
+            'files' : 0,
+            'linked' : 0,
+            'copied' : 0,
+            'materialized' : 0,
+        }
+
+
+    def get_report(self):
+        return self.report
+
+
+    def is_materialized(self, relative_path):
+
+        for materialized_path in MATERIALIZED_PATHS:
+            if relative_path == materialized_path or relative_path.startswith(materialized_path + os.sep):
+                return True
+
+        return False
+
+
+    def link(self, source_filepath, target_filepath):
+
+        if self.mode == 'hardlink':
+            os.link(source_filepath, target_filepath)
+        else:
+            reflink(source_filepath, target_filepath)
+
+
+    def copy(self, source_filepath, target_filepath):
+        shutil.copy2(source_filepath, target_filepath)
+
+
+    def stage_file(self, source_filepath, target_filepath, relative_path):
+
+        # never write through an existing target, it might be linked to a frontend file
+        if os.path.lexists(target_filepath):
+            os.remove(target_filepath)
+
+        self.report['files'] += 1
+
+        if self.is_materialized(relative_path):
+            self.copy(source_filepath, target_filepath)
+            self.report['materialized'] += 1
+            return
+
+        if self.mode != 'copy' and self.link_supported == True:
+            try:
+                self.link(source_filepath, target_filepath)
+                self.report['linked'] += 1
+                return
+            except OSError:
+                self.link_supported = False
+
+        self.copy(source_filepath, target_filepath)
+        self.report['copied'] += 1
+
+
+    # same result as shutil.copytree(source_folder, target_folder, dirs_exist_ok=True)
+    def stage(self):
+
+        for root, dirs, filenames in os.walk(self.source_folder, followlinks=True):
+
+            relative_root = os.path.relpath(root, self.source_folder)
+            if relative_root == '.':
+                relative_root = ''
+
+            target_root = os.path.join(self.target_folder, relative_root)
+
+            if not os.path.isdir(target_root):
+                os.makedirs(target_root)
+
+            for filename in filenames:
+                relative_path = os.path.join(relative_root, filename)
+                self.stage_file(os.path.join(root, filename), os.path.join(target_root, filename),
+                    relative_path)
+
+        return self.report
@@ -28,24 +28,25 @@ class BackboneTaxonomyJSONBuilder(JSONBuilder):
         
         search_index = {}
         
-        higher_taxa = self.meta_app.higher_taxa(include_draft_contents=False)
-        
-        for start_letter, taxon_json in self._work_taxon_latname_search_querysets(higher_taxa.querysets):
+        for start_letter, taxon_json in self.iter_taxon_latname_search_index():
             if start_letter not in search_index:
                 search_index[start_letter] = []
                 
             search_index[start_letter].append(taxon_json)
                 
+        return search_index
+
+
+    # yields (start_letter, search taxon) in the order of the search index, used directly by streaming output
+    def iter_taxon_latname_search_index(self):
+
+        higher_taxa = self.meta_app.higher_taxa(include_draft_contents=False)
+
+        yield from self._work_taxon_latname_search_querysets(higher_taxa.querysets)
+
         taxa = self.meta_app.taxa(include_draft_contents=False)
 
-        for start_letter, taxon_json in self._work_taxon_latname_search_querysets(taxa.querysets):
-            if start_letter not in search_index:
-                search_index[start_letter] = []
-                
-            search_index[start_letter].append(taxon_json)
-       
-                
-        return search_index
+        yield from self._work_taxon_latname_search_querysets(taxa.querysets)
     
     
     def _work_taxon_latname_search_querysets(self, querysets):
@@ -100,6 +101,20 @@ class BackboneTaxonomyJSONBuilder(JSONBuilder):
         
         vernacular_index = {}
         vernacular_lookup = {}
+
+        for start_letter, search_taxon in self.iter_vernacular_search_index(language_code, vernacular_lookup):
+
+            if start_letter not in vernacular_index:
+                vernacular_index[start_letter] = []
+
+            vernacular_index[start_letter].append(search_taxon)
+
+        return vernacular_index, vernacular_lookup
+
+
+    # yields (start_letter, search taxon) in the order of the search index and fills vernacular_lookup,
+    # used directly by streaming output
+    def iter_vernacular_search_index(self, language_code, vernacular_lookup):
         
         taxa = self.meta_app.taxa(include_draft_contents=False)
         
@@ -117,7 +132,7 @@ class BackboneTaxonomyJSONBuilder(JSONBuilder):
             lazy_taxon = LazyTaxon(instance=taxon_instance)
             
             vernacular_lookup[lazy_taxon.name_uuid] = {
-                'primary': lazy_taxon.vernacular(language=language_code, meta_app=self.meta_app),
+                'primary': self.app_release_builder.build_context.get_vernacular_name(lazy_taxon, language_code),
                 'secondary': []
             }
         
@@ -136,16 +151,11 @@ class BackboneTaxonomyJSONBuilder(JSONBuilder):
                     vernacular_lookup[lazy_taxon.name_uuid]['secondary'].append(name)
                 
                 start_letter = name[0].upper()
-                
-                if start_letter not in vernacular_index:
-                    vernacular_index[start_letter] = []
                     
                 search_taxon = self.app_release_builder.taxa_builder.serialize_as_search_taxon(
                     lazy_taxon, 'vernacular', name, name_reference['is_preferred_name'])
                 
-                vernacular_index[start_letter].append(search_taxon)
-        
-        return vernacular_index, vernacular_lookup
+                yield start_letter, search_taxon
     
     # only fills app_release_builder.taxon_slugs
     def build_slugs(self, languages=[]):
@@ -142,14 +142,7 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
         #self.app_release_builder.logger.info('building profile for {0}'.format(profile_taxon.taxon_latname))
 
         # get the profile
-        db_profile_qry = TaxonProfile.objects.filter(taxon_profiles=self.generic_content,
-            taxon_source=profile_taxon.taxon_source, taxon_latname=profile_taxon.taxon_latname,
-            taxon_author=profile_taxon.taxon_author)
-        
-        if morphotype:
-            db_profile_qry = db_profile_qry.filter(morphotype=morphotype)
-        
-        db_profile = db_profile_qry.first()
+        db_profile = self.app_release_builder.build_context.get_taxon_profile(profile_taxon, morphotype=morphotype)
         
         taxon_profile_json = self.app_release_builder.taxa_builder.serialize_taxon_extended(lazy_taxon)
         
@@ -213,8 +206,8 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
 
         for language_code in languages:
 
-            preferred_vernacular_name = lazy_taxon.get_preferred_vernacular_name(language_code,
-                                                                                    self.meta_app)
+            preferred_vernacular_name = self.app_release_builder.build_context.get_preferred_vernacular_name(
+                lazy_taxon, language_code)
 
             taxon_profile_json['vernacular'][language_code] = preferred_vernacular_name
 
@@ -234,8 +227,8 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
             additional_languages = [lang.strip() for lang in include_vernacular_names_languages_option.split(',') if lang.strip()]
             for language_code in additional_languages:
                 if language_code not in languages:
-                    preferred_vernacular_name = lazy_taxon.get_preferred_vernacular_name(language_code,
-                                                                                        self.meta_app)
+                    preferred_vernacular_name = self.app_release_builder.build_context.get_preferred_vernacular_name(
+                        lazy_taxon, language_code)
 
                     taxon_profile_json['vernacular'][language_code] = preferred_vernacular_name
 
@@ -274,12 +267,8 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
         
         for node in node_occurrences:
 
-            is_in_inactive_branch = False
-
-            for inactivated_nuid in self.app_release_builder.inactivated_nuids:
-                if node.taxon_nuid.startswith(inactivated_nuid):
-                    is_in_inactive_branch = True
-                    break
+            is_in_inactive_branch = self.app_release_builder.build_context.is_in_inactive_branch(
+                node.taxon_nuid, self.app_release_builder.inactivated_nuids)
 
             if is_in_inactive_branch == True:
                 continue
@@ -470,8 +459,8 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
                 if language_code not in start_letters['vernacular']:
                     start_letters['vernacular'][language_code] = []
 
-                preferred_vernacular_name = lazy_taxon.get_preferred_vernacular_name(language_code,
-                                                                                     self.meta_app)
+                preferred_vernacular_name = self.app_release_builder.build_context.get_preferred_vernacular_name(
+                    lazy_taxon, language_code)
 
                 if preferred_vernacular_name:
                     
@@ -510,13 +499,11 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
 
         morphotype_profiles = []
         
-        morphotype_profiles_db = TaxonProfile.objects.filter(taxon_profiles=self.generic_content,
-                                            taxon_source=taxon_profile.taxon_source,
-                                            name_uuid=taxon_profile.name_uuid).exclude(morphotype__isnull=True)
+        morphotype_profiles_db = self.app_release_builder.build_context.get_morphotype_profiles(taxon_profile)
 
         for morphotype in morphotype_profiles_db:
             
-            primary_image = morphotype.primary_image()
+            primary_image = self.app_release_builder.build_context.get_primary_image(morphotype)
             if primary_image:
                 image_entry = self.get_image_json(primary_image)
             else:
@@ -535,8 +522,8 @@ class TaxonProfilesJSONBuilder(JSONBuilder):
             
             for language_code in languages:
 
-                preferred_vernacular_name = lazy_taxon.get_preferred_vernacular_name(language_code,
-                                                                                        self.meta_app)
+                preferred_vernacular_name = self.app_release_builder.build_context.get_preferred_vernacular_name(
+                    lazy_taxon, language_code)
 
                 morphotype_json['vernacular'][language_code] = preferred_vernacular_name
             
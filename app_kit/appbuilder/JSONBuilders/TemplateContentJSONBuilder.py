@@ -1,7 +1,7 @@
 from app_kit.appbuilder.JSONBuilders.JSONBuilder import JSONBuilder
 
 from localcosmos_server.template_content.utils import get_published_image_type, get_component_image_type
-from localcosmos_server.template_content.api.serializers import LocalizedTemplateContentSerializer, ContentLicenceSerializer
+from localcosmos_server.template_content.api.serializers import LocalizedTemplateContentSerializer
 from localcosmos_server.template_content.Templates import Template
 
 from taxonomy.lazy import LazyTaxon
@@ -52,12 +52,11 @@ class TemplateContentJSONBuilder(JSONBuilder):
             content_images = localized_template_content.images(image_type=image_type)
             for content_image in content_images:
                 image_urls = self.app_release_builder.build_content_image(content_image)
-                licence = content_image.image_store.licences.first()
-                licence_serializer = ContentLicenceSerializer(licence)
+                licence = self.app_release_builder.content_image_builder.build_licence(content_image)
 
                 image_json = {
                     'imageUrl' : image_urls,
-                    'licence' : licence_serializer.data,
+                    'licence' : licence,
                 }
 
                 images.append(image_json)
@@ -72,9 +71,7 @@ class TemplateContentJSONBuilder(JSONBuilder):
 
             if image_urls:
                 content_image = localized_template_content.image(image_type=image_type)
-                licence = content_image.image_store.licences.first()
-                licence_serializer = ContentLicenceSerializer(licence)
-                licence = licence_serializer.data
+                licence = self.app_release_builder.content_image_builder.build_licence(content_image)
 
             image = {
                 'imageUrl' : image_urls,
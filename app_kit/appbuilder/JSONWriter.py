@@ -0,0 +1,192 @@
+###################################################################################################################
+#
+# JSON OUTPUT OF BUILT APPS
+# - all json files of the www folder are written by JSONWriter.write
+# - settings.APP_KIT_MINIFY_JSON = True writes json without indentation and whitespace
+# - settings.APP_KIT_PRECOMPRESS_JSON = True adds .gz and .br siblings to each json file of the served
+#   browser app, nginx serves them with gzip_static / brotli_static
+#   .br files are only written if the optional brotli package is installed
+# - while recording, the sha256 of each written file is kept for the content manifest
+# - the number of written files and bytes is counted for BuildProfiler
+# - open_array writes a json array item by item, the file is identical to write(filepath, items). Used by builders
+#   with large outputs if the build exceeds settings.APP_KIT_BUILD_MAX_RSS, see BuildProfiler
+#
+###################################################################################################################
+from django.conf import settings
+
+from app_kit.appbuilder.FrontendStaging import break_link
+
+import os, json, gzip, hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class JSONWriter:
+
+    def __init__(self):
+        self.minify = getattr(settings, 'APP_KIT_MINIFY_JSON', False)
+        self.precompress = getattr(settings, 'APP_KIT_PRECOMPRESS_JSON', False)
+
+        # filepath : (sha256 digest, size, mtime_ns) of each written file while recording, see ContentManifest
+        self.written_files = None
+
+        # read by BuildProfiler
+        self.files_written = 0
+        self.bytes_written = 0
+
+
+    def record_written_files(self):
+        self.written_files = {}
+
+
+    def write_content(self, filepath, content):
+
+        break_link(filepath)
+
+        with open(filepath, 'wb') as f:
+            f.write(content)
+
+        self.files_written += 1
+        self.bytes_written += len(content)
+
+        if self.written_files is not None:
+            self.record_written_file(filepath, hashlib.sha256(content).digest(), len(content))
+
+
+    def record_written_file(self, filepath, digest, size):
+        self.written_files[os.path.normpath(filepath)] = (digest, size, os.stat(filepath).st_mtime_ns)
+
+
+    def dumps(self, data, ensure_ascii=False):
+
+        if self.minify == True:
+            return json.dumps(data, ensure_ascii=ensure_ascii, separators=(',', ':'))
+
+        return json.dumps(data, indent=4, ensure_ascii=ensure_ascii)
+
+
+    def write(self, filepath, data, ensure_ascii=False):
+        self.write_content(filepath, self.dumps(data, ensure_ascii=ensure_ascii).encode('utf-8'))
+
+
+    def open_array(self, filepath):
+        return JSONArrayStream(self, filepath)
+
+
+    # returns the sizes of the json files of folder, writes the compressed siblings if enabled
+    # folder is not read if neither minification nor precompression is enabled
+    def compress_folder(self, folder):
+
+        report = {
+            'minified' : self.minify,
+            'precompressed' : self.precompress,
+            'files' : 0,
+            'bytes' : 0,
+            'gzip_bytes' : 0,
+            'brotli_bytes' : 0,
+        }
+
+        if self.minify == False and self.precompress == False:
+            return report
+
+        if self.minify == True:
+            report['indented_bytes'] = 0
+
+        for root, dirs, filenames in os.walk(folder):
+            for filename in filenames:
+
+                if not filename.endswith('.json'):
+                    continue
+
+                filepath = os.path.join(root, filename)
+
+                with open(filepath, 'rb') as json_file:
+                    content = json_file.read()
+
+                report['files'] += 1
+                report['bytes'] += len(content)
+
+                if self.minify == True:
+                    # the size the file would have without APP_KIT_MINIFY_JSON
+                    try:
+                        data = json.loads(content)
+                        indented = json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+                        report['indented_bytes'] += len(indented)
+                    except ValueError:
+                        report['indented_bytes'] += len(content)
+
+                if self.precompress == True:
+
+                    # mtime=0 keeps the output identical across builds
+                    gzip_content = gzip.compress(content, compresslevel=9, mtime=0)
+                    self.write_sibling('{0}.gz'.format(filepath), gzip_content)
+                    report['gzip_bytes'] += len(gzip_content)
+
+                    if brotli is not None:
+                        brotli_content = brotli.compress(content, mode=brotli.MODE_TEXT)
+                        self.write_sibling('{0}.br'.format(filepath), brotli_content)
+                        report['brotli_bytes'] += len(brotli_content)
+
+        return report
+
+
+    def write_sibling(self, filepath, content):
+        self.write_content(filepath, content)
+
+
+
+class JSONArrayStream:
+
+    def __init__(self, json_writer, filepath):
+        self.json_writer = json_writer
+        self.filepath = filepath
+
+        self.count = 0
+        self.size = 0
+        self.hasher = hashlib.sha256()
+
+        break_link(filepath)
+        self.file = open(filepath, 'wb')
+
+
+    def write_content(self, content):
+        self.file.write(content)
+        self.hasher.update(content)
+        self.size += len(content)
+
+
+    def append(self, data):
+
+        item = self.json_writer.dumps(data)
+
+        if self.json_writer.minify == True:
+            separator = '[' if self.count == 0 else ','
+
+        else:
+            # the item is nested one level deeper, json strings never contain raw line breaks
+            item = item.replace('\n', '\n    ')
+            separator = '[\n    ' if self.count == 0 else ',\n    '
+
+        self.write_content('{0}{1}'.format(separator, item).encode('utf-8'))
+        self.count += 1
+
+
+    def close(self):
+
+        if self.count == 0:
+            self.write_content(b'[]')
+        elif self.json_writer.minify == True:
+            self.write_content(b']')
+        else:
+            self.write_content(b'\n]')
+
+        self.file.close()
+
+        self.json_writer.files_written += 1
+        self.json_writer.bytes_written += self.size
+
+        if self.json_writer.written_files is not None:
+            self.json_writer.record_written_file(self.filepath, self.hasher.digest(), self.size)
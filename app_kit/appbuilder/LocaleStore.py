@@ -0,0 +1,68 @@
+###################################################################################################################
+#
+# LOCALE STORE
+# - the locale files of the built app (plain.json, glossarized.json) are read by many build steps, e.g. once
+#   per taxon profile and language
+# - LocaleStore parses each file once and keeps the parsed dictionary
+# - a cached dictionary is only reused while size and mtime of the file are unchanged, files written by
+#   other build steps or by worker processes are parsed again
+# - returned dictionaries are shared, callers which modify them have to write them back with write()
+#
+###################################################################################################################
+from app_kit.appbuilder.FrontendStaging import break_link
+
+import os, json
+
+
+class LocaleStore:
+
+    def __init__(self):
+        # filepath : (size, mtime_ns, locale)
+        self.locales = {}
+
+
+    def get_file_signature(self, filepath):
+        stat = os.stat(filepath)
+        return (stat.st_size, stat.st_mtime_ns)
+
+
+    # returns {} if the file does not exist
+    def load(self, filepath):
+
+        if not os.path.isfile(filepath):
+            self.locales.pop(filepath, None)
+            return {}
+
+        signature = self.get_file_signature(filepath)
+
+        if filepath in self.locales:
+            size, mtime_ns, locale = self.locales[filepath]
+
+            if (size, mtime_ns) == signature:
+                return locale
+
+        with open(filepath, 'r') as locale_file:
+            locale = json.load(locale_file)
+
+        self.locales[filepath] = signature + (locale,)
+
+        return locale
+
+
+    # call after locale has been written to filepath by another writer
+    def remember(self, filepath, locale):
+        self.locales[filepath] = self.get_file_signature(filepath) + (locale,)
+
+
+    def write(self, filepath, locale):
+
+        break_link(filepath)
+
+        with open(filepath, 'w') as locale_file:
+            locale_file.write(json.dumps(locale))
+
+        self.remember(filepath, locale)
+
+
+    def clear(self):
+        self.locales = {}
@@ -1,8 +1,6 @@
 from django.conf import settings
 from app_kit.appbuilder.GBIFlib import GBIFlib
-from app_kit.features.nature_guides.models import MetaNode, NatureGuidesTaxonTree, NatureGuide
-from app_kit.features.taxon_profiles.models import TaxonProfile, TaxonProfiles
-from app_kit.models import ContentImage
+from app_kit.features.taxon_profiles.models import TaxonProfiles
 
 from app_kit.appbuilder.JSONBuilders.ContentImagesJSONBuilder import ContentImagesJSONBuilder
 
@@ -22,7 +20,8 @@ class TaxaBuilder(ContentImagesJSONBuilder):
         
         self.gbiflib = GBIFlib()
         
-        self.nature_guide_ids = []
+        # taxon profiles, nature guide nodes, images and vernacular names of the app
+        self.build_context = app_release_builder.build_context
         
         self.cache = {
             'simple': {},
@@ -70,40 +69,9 @@ class TaxaBuilder(ContentImagesJSONBuilder):
         return taxon_serializer.serialize_images(morphotype=morphotype)
     
     
-    def get_nature_guide_ids(self):
-
-        if not self.nature_guide_ids:
-            nature_guide_links = self.meta_app.get_generic_content_links(NatureGuide)                                         
-            self.nature_guide_ids = nature_guide_links.values_list('object_id', flat=True)
-
-        return self.nature_guide_ids
-    
-    
+    # result nodes of the nature guides of the app
     def get_nature_guide_occurrences(self, lazy_taxon, morphotype=None):
-        nature_guide_ids = self.get_nature_guide_ids()
-        
-        if lazy_taxon.taxon_source in self.installed_taxonomic_sources:
-
-            meta_nodes_qry = MetaNode.objects.filter(
-                nature_guide_id__in=nature_guide_ids,
-                node_type='result',
-                name_uuid = lazy_taxon.name_uuid)
-            
-            if morphotype:
-                meta_nodes_qry = meta_nodes_qry.filter(morphotype=morphotype)
-            
-            meta_nodes = meta_nodes_qry.values_list('pk', flat=True)
-
-            node_occurrences = NatureGuidesTaxonTree.objects.filter(nature_guide_id__in=nature_guide_ids,
-                       meta_node_id__in=meta_nodes).order_by('pk').distinct('pk')
-
-        else:
-            node_occurrences = NatureGuidesTaxonTree.objects.filter(nature_guide_id__in=nature_guide_ids,
-                        meta_node__node_type='result',
-                        taxon_latname=lazy_taxon.taxon_latname,
-                        taxon_author=lazy_taxon.taxon_author).order_by('pk').distinct('pk')
-            
-        return node_occurrences
+        return self.build_context.get_nature_guide_occurrences(lazy_taxon, morphotype=morphotype)
 
 
 class TaxonSerializer:
@@ -218,18 +186,11 @@ class TaxonSerializer:
     def get_taxon_profile(self, morphotype=None):
         taxon_profile = None
         
-        taxon_profile_qry = TaxonProfile.objects.filter(
-            taxon_profiles=self.taxa_builder.taxon_profiles,
-            name_uuid=self.lazy_taxon.name_uuid)
-        
-        if morphotype:
-            taxon_profile_qry = taxon_profile_qry.filter(
-            morphotype=morphotype)
-            
-        taxon_profile_qry = taxon_profile_qry.first()
+        db_taxon_profile = self.taxa_builder.build_context.get_taxon_profile_by_name_uuid(
+            self.lazy_taxon.name_uuid, morphotype=morphotype)
         
-        if taxon_profile_qry and taxon_profile_qry.publication_status != 'draft':
-            taxon_profile = taxon_profile_qry
+        if db_taxon_profile and db_taxon_profile.publication_status != 'draft':
+            taxon_profile = db_taxon_profile
             
         return taxon_profile
         
@@ -262,7 +223,7 @@ class TaxonSerializer:
             taxon_profile_images = []
             
             if taxon_profile:
-                taxon_profile_images = taxon_profile.images().order_by('position')
+                taxon_profile_images = self.taxa_builder.build_context.get_images(taxon_profile)
 
             for content_image in taxon_profile_images:
                 
@@ -299,7 +260,7 @@ class TaxonSerializer:
 
                 if is_active == True:
                     
-                    node_image = node.meta_node.image()
+                    node_image = self.taxa_builder.build_context.get_image(node.meta_node)
 
                     if node_image is not None and node_image.id not in collected_content_image_ids and node_image.image_store.id not in collected_image_store_ids:
                         collected_content_image_ids.add(node_image.id)
@@ -316,10 +277,7 @@ class TaxonSerializer:
                     
             # get taxonomic images
             if not morphotype:
-                content_images_taxon = ContentImage.objects.filter(image_store__taxon_source=self.lazy_taxon.taxon_source,
-                                            image_store__taxon_latname=self.lazy_taxon.taxon_latname,
-                                            image_store__taxon_author=self.lazy_taxon.taxon_author).exclude(
-                                            pk__in=list(collected_content_image_ids))
+                content_images_taxon = self.taxa_builder.build_context.get_taxon_images(self.lazy_taxon)
 
                 #self.app_release_builder.logger.info('Found {0} images for {1}'.format(taxon_images.count(), profile_taxon.taxon_latname))
 
@@ -405,8 +363,8 @@ class TaxonSerializer:
             })
             
             for language_code in languages:
-                preferred_vernacular_name = self.lazy_taxon.get_preferred_vernacular_name(language_code,
-                                                                            self.taxa_builder.meta_app)
+                preferred_vernacular_name = self.taxa_builder.build_context.get_preferred_vernacular_name(
+                    self.lazy_taxon, language_code)
                 
                 if preferred_vernacular_name:
                     registry_taxon_json['vernacularNames'][language_code] = preferred_vernacular_name
@@ -0,0 +1,101 @@
+###################################################################################################################
+#
+# TAXON PROFILE PACKS
+# - optional output format of taxon profiles, enabled by settings.APP_KIT_TAXON_PROFILE_PACKS = True
+# - instead of one json file per taxon (and language, and morphotype), the profiles are appended to a few
+#   pack files, one per first letter of the taxon latname
+# - each pack file is a sequence of json documents, one per line (ndjson)
+# - index.json maps each profile to its pack and its byte range:
+#   {
+#       "packs" : {"L" : "/relative/path/L.ndjson"},
+#       "profiles" : {taxon_source : {name_uuid : ["L", offset, length]}}
+#   }
+# - the frontend range-reads a single profile or loads the pack of a letter
+#
+###################################################################################################################
+from django.conf import settings
+
+import os, json
+
+
+def get_pack_name(taxon_latname):
+
+    if taxon_latname:
+        letter = taxon_latname[0].upper()
+        if letter.isalpha():
+            return letter
+
+    return '_'
+
+
+class TaxonProfilePackWriter:
+
+    def __init__(self, absolute_folder, relative_folder, json_writer):
+        self.absolute_folder = absolute_folder
+        self.relative_folder = relative_folder
+        self.json_writer = json_writer
+
+        self.pack_files = {}
+        self.index = {
+            'packs' : {},
+            'profiles' : {},
+        }
+
+
+    @classmethod
+    def is_enabled(cls):
+        return getattr(settings, 'APP_KIT_TAXON_PROFILE_PACKS', False)
+
+
+    @property
+    def relative_index_path(self):
+        return '/{0}'.format(os.path.join(self.relative_folder, 'index.json'))
+
+
+    def get_pack_file(self, pack_name):
+
+        if pack_name not in self.pack_files:
+
+            if not os.path.isdir(self.absolute_folder):
+                os.makedirs(self.absolute_folder)
+
+            filename = '{0}.ndjson'.format(pack_name)
+            self.pack_files[pack_name] = open(os.path.join(self.absolute_folder, filename), 'wb')
+            self.index['packs'][pack_name] = '/{0}'.format(os.path.join(self.relative_folder, filename))
+
+        return self.pack_files[pack_name]
+
+
+    def add(self, profile_taxon, key, data):
+
+        pack_name = get_pack_name(profile_taxon.taxon_latname)
+        pack_file = self.get_pack_file(pack_name)
+
+        # one line per profile, regardless of settings.APP_KIT_MINIFY_JSON
+        content = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        offset = pack_file.tell()
+        pack_file.write(content)
+        pack_file.write(b'\n')
+
+        if profile_taxon.taxon_source not in self.index['profiles']:
+            self.index['profiles'][profile_taxon.taxon_source] = {}
+
+        self.index['profiles'][profile_taxon.taxon_source][key] = [pack_name, offset, len(content)]
+
+
+    # closes the packs and writes index.json, returns the app relative path of index.json
+    def close(self):
+
+        for pack_file in self.pack_files.values():
+            pack_file.close()
+
+        self.pack_files = {}
+
+        if not os.path.isdir(self.absolute_folder):
+            os.makedirs(self.absolute_folder)
+
+        index_filepath = os.path.join(self.absolute_folder, 'index.json')
+        self.json_writer.write(index_filepath, self.index)
+
+        return self.relative_index_path
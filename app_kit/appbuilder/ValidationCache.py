@@ -0,0 +1,260 @@
+###################################################################################################################
+#
+# FEATURE VALIDATION CACHE
+# - the validation result of each published feature is stored with a fingerprint, see
+#   BuildCache.FeatureBuildCache.get_fingerprint, and the publication status of all features of the app
+# - if settings.APP_KIT_VALIDATION_CACHE is True, features with an unchanged fingerprint are not validated again,
+#   their stored errors and warnings are used instead
+# - features are validated by settings.APP_KIT_VALIDATION_THREADS threads, each thread uses its own
+#   database connection; the results are merged in the order of the feature links, their queries are
+#   counted by the validate phase of the BuildProfiler
+# - the Frontend reads the settings of the frontend files and is validated every time
+#
+###################################################################################################################
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import translation
+
+from app_kit.models import MetaAppGenericContent
+from app_kit.appbuilder.BuildCache import FeatureBuildCache
+from app_kit.generic_content_validation import ValidationError, ValidationWarning
+
+from concurrent.futures import ThreadPoolExecutor
+
+import os, json, hashlib
+
+# bump this if the output of any validate_* method changes, this invalidates all stored results
+VALIDATION_CACHE_VERSION = 1
+
+UNCACHED_FEATURES = ['Frontend']
+
+
+# errors and warnings of a stored validation result, dump() returns the stored entry
+class CachedValidationMessage:
+
+    def __init__(self, entry):
+        self.generic_content = None
+        self.instance = None
+        self.messages = entry['messages']
+        self.entry = entry
+
+    def dump(self):
+        entry = dict(self.entry)
+        entry['cached'] = True
+        return entry
+
+
+class CachedValidationError(CachedValidationMessage, ValidationError):
+    pass
+
+
+class CachedValidationWarning(CachedValidationMessage, ValidationWarning):
+    pass
+
+
+def validate_feature_in_thread(app_release_builder, generic_content, tenant, language):
+
+    # django connections and the active language are per thread
+    connection.set_tenant(tenant)
+    translation.activate(language)
+
+    try:
+        with app_release_builder.build_profiler.count_queries():
+            return app_release_builder._validate_feature(generic_content)
+    finally:
+        connections.close_all()
+
+
+class FeatureValidationCache:
+
+    def __init__(self, app_release_builder):
+        self.app_release_builder = app_release_builder
+        self.meta_app = app_release_builder.meta_app
+
+        self.enabled = getattr(settings, 'APP_KIT_VALIDATION_CACHE', False)
+        self.threads = getattr(settings, 'APP_KIT_VALIDATION_THREADS', 1)
+
+        # provides the fingerprints of the features
+        self.feature_build_cache = FeatureBuildCache(app_release_builder)
+
+        self.previous_records = {}
+        self.records = {}
+
+        self.report = {
+            'enabled' : self.enabled,
+            'threads' : self.threads,
+            'validated' : [],
+            'cached' : [],
+        }
+
+    # {settings.APP_KIT_ROOT}/{meta_app.uuid}/version/{app.version}/validation_cache/release/
+    @property
+    def cache_path(self):
+        return os.path.join(self.app_release_builder._app_version_root_path, 'validation_cache',
+            self.app_release_builder._builder_identifier)
+
+    @property
+    def records_filepath(self):
+        return os.path.join(self.cache_path, 'features.json')
+
+
+    def get_report(self):
+        return self.report
+
+
+    def load(self):
+
+        self.previous_records = {}
+
+        if not self.enabled:
+            if os.path.isfile(self.records_filepath):
+                os.remove(self.records_filepath)
+            return
+
+        if os.path.isfile(self.records_filepath):
+
+            with open(self.records_filepath, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+
+            if stored.get('version') == VALIDATION_CACHE_VERSION:
+                self.previous_records = stored['features']
+
+
+    def save(self):
+
+        if not self.enabled:
+            return
+
+        if not os.path.isdir(self.cache_path):
+            os.makedirs(self.cache_path)
+
+        stored = {
+            'version' : VALIDATION_CACHE_VERSION,
+            'features' : self.records,
+        }
+
+        tmp_filepath = '{0}.tmp'.format(self.records_filepath)
+
+        with open(tmp_filepath, 'w', encoding='utf-8') as f:
+            json.dump(stored, f)
+
+        os.replace(tmp_filepath, self.records_filepath)
+
+
+    ###############################################################################################################
+    # FINGERPRINTS
+    # - validation also depends on the publication status of other features, e.g. the result action of a
+    #   nature guide, and on the language of the messages
+    ###############################################################################################################
+
+    def get_fingerprint(self, app_generic_content, publication_statuses):
+
+        hasher = hashlib.sha256()
+
+        data = [VALIDATION_CACHE_VERSION, translation.get_language(), publication_statuses,
+                self.feature_build_cache.get_fingerprint(app_generic_content)]
+
+        hasher.update(json.dumps(data).encode())
+
+        return hasher.hexdigest()
+
+
+    def get_publication_statuses(self):
+
+        links = MetaAppGenericContent.objects.filter(meta_app=self.meta_app).order_by('pk')
+        return [[link.pk, link.publication_status] for link in links]
+
+
+    def get_report_entry(self, app_generic_content):
+        return self.feature_build_cache.get_report_entry(app_generic_content)
+
+
+    def get_cached_result(self, record):
+
+        result = {
+            'errors' : [CachedValidationError(entry) for entry in record['errors']],
+            'warnings' : [CachedValidationWarning(entry) for entry in record['warnings']],
+        }
+
+        return result
+
+
+    ###############################################################################################################
+    # VALIDATING FEATURES
+    # - feature_links: published MetaAppGenericContent instances
+    # - returns one result per link, in the order of feature_links
+    ###############################################################################################################
+
+    def validate(self, feature_links):
+
+        self.load()
+
+        builder = self.app_release_builder
+
+        results = {}
+        fingerprints = {}
+
+        publication_statuses = self.get_publication_statuses()
+
+        uncached_links = []
+
+        for link in feature_links:
+
+            generic_content = link.generic_content
+            generic_content_type = generic_content.__class__.__name__
+
+            if self.enabled and generic_content_type not in UNCACHED_FEATURES:
+
+                record_key = str(generic_content.uuid)
+                fingerprint = self.get_fingerprint(link, publication_statuses)
+                fingerprints[link.pk] = fingerprint
+
+                previous_record = self.previous_records.get(record_key, None)
+
+                if previous_record and previous_record['fingerprint'] == fingerprint:
+                    results[link.pk] = self.get_cached_result(previous_record)
+                    self.records[record_key] = previous_record
+                    self.report['cached'].append(self.get_report_entry(link))
+                    continue
+
+            uncached_links.append(link)
+
+        if self.threads > 1 and len(uncached_links) > 1:
+
+            futures = {}
+            max_workers = min(self.threads, len(uncached_links))
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+                for link in uncached_links:
+                    futures[link.pk] = executor.submit(validate_feature_in_thread, builder, link.generic_content,
+                        connection.tenant, translation.get_language())
+
+                for link in uncached_links:
+                    results[link.pk] = futures[link.pk].result()
+
+        else:
+            for link in uncached_links:
+                results[link.pk] = builder._validate_feature(link.generic_content)
+
+        for link in uncached_links:
+
+            self.report['validated'].append(self.get_report_entry(link))
+
+            if link.pk in fingerprints:
+                self.add_record(link, fingerprints[link.pk], results[link.pk])
+
+        self.save()
+
+        return [results[link.pk] for link in feature_links]
+
+
+    def add_record(self, app_generic_content, fingerprint, result):
+
+        record = {
+            'fingerprint' : fingerprint,
+            'errors' : [error.dump() for error in result['errors']],
+            'warnings' : [warning.dump() for warning in result['warnings']],
+        }
+
+        self.records[str(app_generic_content.generic_content.uuid)] = record
@@ -0,0 +1,247 @@
+###################################################################################################################
+#
+# ZIP ARCHIVES OF BUILT APPS
+# - used for the build jobs zipfile and the browser zipfile
+# - media which is already compressed (images, fonts, video, audio, archives) is stored without compression
+# - all other files are deflated by a pool of threads, chunk by chunk, zlib releases the GIL while compressing
+# - entries whose content did not change since the previous archive are copied from it without compressing
+#   them again. The previous archive defaults to the archive at the same path, builders which delete their
+#   folders keep it at previous_zip_filepath
+# - entries are sorted and have fixed timestamps and permissions, identical inputs produce byte-identical
+#   archives
+# - settings.APP_KIT_ZIP_THREADS sets the number of compressing threads, defaults to the number of cpus
+#
+###################################################################################################################
+from django.conf import settings
+
+from concurrent.futures import ThreadPoolExecutor
+
+import os, zipfile, zlib, struct, shutil
+
+
+STORED_EXTENSIONS = set(['.webp', '.jpg', '.jpeg', '.png', '.gif', '.ico', '.woff', '.woff2', '.mp3', '.mp4',
+                         '.ogg', '.webm', '.zip', '.gz', '.br', '.pdf'])
+
+# all entries have this timestamp, the timestamps of the files would make each archive unique
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# number of files which are deflated in parallel before they are written
+CHUNK_SIZE = 256
+
+
+def is_compressed_media(filepath):
+    extension = os.path.splitext(filepath)[1].lower()
+    return extension in STORED_EXTENSIONS
+
+
+def get_zip_info(arcname, compress_type):
+    zip_info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+    zip_info.compress_type = compress_type
+    zip_info.external_attr = 0o644 << 16
+    return zip_info
+
+
+# ZipFile which can write entries that already have been deflated
+class RawZipFile(zipfile.ZipFile):
+
+    def write_raw(self, zip_info, raw_data):
+
+        zip_info.compress_size = len(raw_data)
+        zip_info.flag_bits = 0x00
+
+        zip64 = zip_info.file_size > zipfile.ZIP64_LIMIT or zip_info.compress_size > zipfile.ZIP64_LIMIT
+
+        self.fp.seek(self.start_dir)
+        zip_info.header_offset = self.fp.tell()
+
+        self._writecheck(zip_info)
+        self._didModify = True
+
+        self.fp.write(zip_info.FileHeader(zip64))
+        self.fp.write(raw_data)
+
+        self.start_dir = self.fp.tell()
+
+        self.filelist.append(zip_info)
+        self.NameToInfo[zip_info.filename] = zip_info
+
+
+    # the deflated data of an entry of an archive opened for reading
+    def read_raw(self, zip_info):
+
+        self.fp.seek(zip_info.header_offset)
+        header = self.fp.read(zipfile.sizeFileHeader)
+
+        filename_length, extra_length = struct.unpack('<HH', header[26:30])
+        self.fp.seek(zip_info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length)
+
+        return self.fp.read(zip_info.compress_size)
+
+
+class ZipArchiver:
+
+    def __init__(self, zip_filepath, threads=None, previous_zip_filepath=None):
+
+        self.zip_filepath = zip_filepath
+
+        if previous_zip_filepath is None:
+            previous_zip_filepath = zip_filepath
+
+        self.previous_zip_filepath = previous_zip_filepath
+
+        if threads is None:
+            threads = getattr(settings, 'APP_KIT_ZIP_THREADS', os.cpu_count() or 1)
+
+        self.threads = max(threads, 1)
+
+        self.previous_archive = None
+        self.previous_entries = {}
+
+        self.report = {
+            'files' : 0,
+            'stored' : 0,
+            'deflated' : 0,
+            'reused' : 0,
+            'bytes' : 0,
+            'compressed_bytes' : 0,
+        }
+
+
+    # [(filepath, arcname)], sorted by arcname
+    def get_entries(self, folder, prefix=''):
+
+        entries = []
+
+        for root, dirs, filenames in os.walk(folder, followlinks=True):
+
+            dirs.sort()
+
+            for filename in sorted(filenames):
+                filepath = os.path.join(root, filename)
+                arcname = os.path.relpath(filepath, folder).replace(os.sep, '/')
+
+                if prefix:
+                    arcname = '{0}/{1}'.format(prefix, arcname)
+
+                entries.append((filepath, arcname))
+
+        return entries
+
+
+    def open_previous_archive(self):
+
+        self.previous_entries = {}
+
+        if os.path.isfile(self.previous_zip_filepath):
+            try:
+                self.previous_archive = RawZipFile(self.previous_zip_filepath, 'r')
+            except zipfile.BadZipFile:
+                self.previous_archive = None
+                return
+
+            for zip_info in self.previous_archive.infolist():
+                if zip_info.compress_type == zipfile.ZIP_DEFLATED:
+                    self.previous_entries[zip_info.filename] = zip_info
+
+
+    def close_previous_archive(self):
+        if self.previous_archive:
+            self.previous_archive.close()
+            self.previous_archive = None
+
+
+    # runs in a thread, returns (file_size, crc, raw_data), raw_data is None if the previous entry can be reused
+    def deflate(self, entry):
+
+        filepath, arcname = entry
+
+        with open(filepath, 'rb') as source_file:
+            content = source_file.read()
+
+        crc = zlib.crc32(content)
+
+        previous_entry = self.previous_entries.get(arcname, None)
+
+        if previous_entry and previous_entry.CRC == crc and previous_entry.file_size == len(content):
+            return len(content), crc, None
+
+        # same raw deflate stream as zipfile.ZIP_DEFLATED
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        raw_data = compressor.compress(content) + compressor.flush()
+
+        return len(content), crc, raw_data
+
+
+    def write_stored(self, zip_file, filepath, arcname):
+
+        zip_info = get_zip_info(arcname, zipfile.ZIP_STORED)
+        zip_info.file_size = os.path.getsize(filepath)
+
+        with open(filepath, 'rb') as source_file, zip_file.open(zip_info, 'w') as zip_entry:
+            shutil.copyfileobj(source_file, zip_entry, 1024 * 1024)
+
+        self.report['stored'] += 1
+        self.report['bytes'] += zip_info.file_size
+        self.report['compressed_bytes'] += zip_info.compress_size
+
+
+    def write_deflated(self, zip_file, arcname, file_size, crc, raw_data):
+
+        if raw_data is None:
+            raw_data = self.previous_archive.read_raw(self.previous_entries[arcname])
+            self.report['reused'] += 1
+
+        zip_info = get_zip_info(arcname, zipfile.ZIP_DEFLATED)
+        zip_info.file_size = file_size
+        zip_info.CRC = crc
+
+        zip_file.write_raw(zip_info, raw_data)
+
+        self.report['deflated'] += 1
+        self.report['bytes'] += file_size
+        self.report['compressed_bytes'] += zip_info.compress_size
+
+
+    # writes all files of folder to the archive, arcnames are relative to folder and prefixed with prefix
+    def create(self, folder, prefix=''):
+
+        entries = self.get_entries(folder, prefix=prefix)
+
+        return self.create_from_entries(entries)
+
+
+    # entries: [(filepath, arcname)], sorted by arcname
+    def create_from_entries(self, entries):
+
+        tmp_filepath = '{0}.tmp'.format(self.zip_filepath)
+
+        self.open_previous_archive()
+
+        try:
+            with RawZipFile(tmp_filepath, 'w') as zip_file, ThreadPoolExecutor(self.threads) as executor:
+
+                for start in range(0, len(entries), CHUNK_SIZE):
+
+                    chunk = entries[start:start+CHUNK_SIZE]
+
+                    deflate_entries = [entry for entry in chunk if not is_compressed_media(entry[0])]
+                    deflated = dict(zip([entry[1] for entry in deflate_entries],
+                                        executor.map(self.deflate, deflate_entries)))
+
+                    # written in order, the archive does not depend on the order the threads finish
+                    for filepath, arcname in chunk:
+
+                        if arcname in deflated:
+                            file_size, crc, raw_data = deflated[arcname]
+                            self.write_deflated(zip_file, arcname, file_size, crc, raw_data)
+                        else:
+                            self.write_stored(zip_file, filepath, arcname)
+
+                        self.report['files'] += 1
+
+        finally:
+            self.close_previous_archive()
+
+        os.replace(tmp_filepath, self.zip_filepath)
+
+        return self.report
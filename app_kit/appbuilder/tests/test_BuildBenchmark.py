@@ -0,0 +1,102 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder.BuildBenchmark import (SyntheticAppGenerator, BuildBenchmark, aggregate_phases,
+    compare_results)
+
+import os
+
+
+class TestCompareResults(TestCase):
+
+    def get_result(self, wall_times, queries):
+
+        result = {
+            'phases' : [
+                {'name' : 'validate', 'depth' : 0, 'wall_time' : wall_times[0], 'queries' : queries[0]},
+                {'name' : 'common_www', 'depth' : 0, 'wall_time' : wall_times[1], 'queries' : queries[1]},
+                {'name' : 'NatureGuide', 'depth' : 1, 'wall_time' : wall_times[2], 'queries' : queries[2]},
+                {'name' : 'NatureGuide', 'depth' : 1, 'wall_time' : wall_times[3], 'queries' : queries[3]},
+            ],
+        }
+
+        return result
+
+
+    def test_aggregate_phases(self):
+
+        aggregated = aggregate_phases(self.get_result([1, 4, 1, 2], [10, 40, 10, 20])['phases'])
+
+        self.assertEqual(aggregated[(1, 'NatureGuide')]['wall_time'], 3)
+        self.assertEqual(aggregated[(1, 'NatureGuide')]['queries'], 30)
+        self.assertEqual(aggregated[(0, 'validate')]['queries'], 10)
+
+
+    def test_compare_results(self):
+
+        previous_result = self.get_result([1, 4, 1, 2], [10, 40, 10, 20])
+        result = self.get_result([0.5, 4, 1, 2], [5, 40, 10, 20])
+
+        rows = compare_results(previous_result, result)
+
+        self.assertEqual([row['name'] for row in rows], ['validate', 'common_www', 'NatureGuide'])
+        self.assertEqual(rows[0]['wall_time_change'], -0.5)
+        self.assertEqual(rows[0]['previous_queries'], 10)
+        self.assertEqual(rows[0]['queries'], 5)
+        self.assertEqual(rows[1]['wall_time_change'], 0)
+
+        # phases which did not exist before
+        result['phases'].append({'name' : 'Glossary', 'depth' : 1, 'wall_time' : 1, 'queries' : 3})
+        rows = compare_results(previous_result, result)
+        self.assertIsNone(rows[-1]['previous_wall_time'])
+        self.assertIsNone(rows[-1]['wall_time_change'])
+
+
+class TestSyntheticAppGenerator(WithMetaApp, WithUser, WithMedia, TenantTestCase):
+
+    sizes = {
+        'taxa' : 12,
+        'nature_guide_nodes' : 25,
+        'matrix_filters' : 1,
+        'taxon_profiles' : 5,
+        'glossary_terms' : 3,
+        'languages' : 2,
+        'images' : 4,
+    }
+
+    @test_settings
+    def test_generate(self):
+
+        user = self.create_user()
+
+        generator = SyntheticAppGenerator(self.tenant, user, 'benchmarkapp', sizes=self.sizes)
+        meta_app = generator.generate()
+
+        self.assertEqual(meta_app.languages(), ['en', 'de'])
+        self.assertIn('de', meta_app.localizations)
+
+        benchmark = BuildBenchmark(meta_app, label='test')
+        sizes = benchmark.get_app_sizes()
+
+        self.assertEqual(sizes['taxa'], 12)
+        self.assertEqual(sizes['languages'], 2)
+        # the start node is part of the nature guide
+        self.assertEqual(sizes['nature_guide_nodes'], 26)
+        self.assertEqual(sizes['taxon_profiles'], 5)
+        self.assertEqual(sizes['glossary_terms'], 3)
+        # one filter per group and for the start node
+        self.assertEqual(sizes['matrix_filters'], 3)
+
+        result = benchmark.run()
+
+        top_level_phases = [phase['name'] for phase in result['phases'] if phase['depth'] == 0]
+        self.assertEqual(top_level_phases, ['validate', 'common_www', 'app_assets', 'images'])
+        self.assertEqual(result['app']['sizes'], sizes)
+
+        filepath = benchmark.save(result)
+        self.assertTrue(filepath.startswith(TESTS_ROOT))
+        self.assertTrue(os.path.isfile(filepath))
+        self.assertEqual(BuildBenchmark.load(filepath)['label'], 'test')
@@ -0,0 +1,292 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildCache import FeatureBuildCache, get_delta, apply_delta
+
+from app_kit.features.glossary.models import Glossary, GlossaryEntry
+from app_kit.features.backbonetaxonomy.models import BackboneTaxonomy
+
+from taxonomy.models import TaxonomyModelRouter
+
+import os, json, copy
+
+
+class TestAccumulatorDeltas(TestCase):
+
+    def replay(self, before, after):
+        delta = get_delta(before, after)
+        # deltas are stored as json
+        delta = json.loads(json.dumps(delta))
+        return apply_delta(copy.deepcopy(before), delta)
+
+
+    def test_dict_delta(self):
+
+        before = {
+            'licences' : {
+                '/a.webp' : {'creator' : 'A'},
+            },
+        }
+
+        after = {
+            'licences' : {
+                '/a.webp' : {'creator' : 'A'},
+                '/b.webp' : {'creator' : 'B'},
+            },
+            'slugs' : {
+                'slug-1' : 'uuid-1',
+            },
+        }
+
+        self.assertEqual(self.replay(before, after), after)
+
+        # replaying a delta on a different state keeps the state
+        other = {
+            'licences' : {
+                '/c.webp' : {'creator' : 'C'},
+            },
+        }
+
+        delta = get_delta(before, after)
+        replayed = apply_delta(other, delta)
+        self.assertIn('/b.webp', replayed['licences'])
+        self.assertIn('/c.webp', replayed['licences'])
+        self.assertNotIn('/a.webp', replayed['licences'])
+
+        # a dict added by the delta and by another feature since keeps the entries of both
+        other = {
+            'licences' : {},
+            'slugs' : {
+                'slug-2' : 'uuid-2',
+            },
+        }
+
+        replayed = apply_delta(other, get_delta(before, after))
+        self.assertEqual(replayed['slugs'], {'slug-1' : 'uuid-1', 'slug-2' : 'uuid-2'})
+
+
+    def test_list_delta(self):
+
+        before = {
+            'GenericForm' : {
+                'list' : [{'uuid' : '1', 'isDefault' : True}],
+                'lookup' : {'1' : '/1.json'},
+            },
+        }
+
+        after = {
+            'GenericForm' : {
+                'list' : [{'uuid' : '1', 'isDefault' : True}, {'uuid' : '2', 'isDefault' : False}],
+                'lookup' : {'1' : '/1.json', '2' : '/2.json'},
+            },
+        }
+
+        delta = get_delta(before, after)
+        self.assertEqual(delta[0], [['GenericForm', 'list'], 'extend', [{'uuid' : '2', 'isDefault' : False}]])
+        self.assertEqual(self.replay(before, after), after)
+
+        # a new default entry changes existing entries
+        after_default = copy.deepcopy(after)
+        after_default['GenericForm']['list'][0]['isDefault'] = False
+        after_default['GenericForm']['list'][1]['isDefault'] = True
+
+        self.assertEqual(self.replay(before, after_default), after_default)
+
+
+    def test_set_delta(self):
+
+        before = set(['001', '002'])
+        after = set(['001', '002', '003'])
+
+        delta = get_delta(before, after)
+        self.assertEqual(delta, [[[], 'update', ['003']]])
+        self.assertEqual(self.replay(before, after), after)
+
+        self.assertEqual(self.replay(set([]), set(['004'])), set(['004']))
+
+
+
+class TestFeatureBuildCache(WithMetaApp, WithUser, WithMedia, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_all_generic_contents(self.meta_app)
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+
+        self.release_builder.build_features = {}
+        self.release_builder.licence_registry = {'licences' : {}}
+        self.release_builder.taxon_slugs = {'taxon_latname' : {}, 'vernacular' : {}}
+        self.release_builder.app_settings = {}
+        self.release_builder.aggregated_node_filter_space_cache = {}
+        self.release_builder.inactivated_nuids = set([])
+
+
+    def get_cache(self):
+        cache = FeatureBuildCache(self.release_builder)
+        self.release_builder.feature_build_cache = cache
+        return cache
+
+
+    @test_settings
+    def test_disabled(self):
+
+        cache = self.get_cache()
+        self.assertFalse(cache.enabled)
+        self.assertTrue(cache.cache_path.startswith(TESTS_ROOT))
+
+        glossary_link = self.get_generic_content_link(Glossary)
+
+        built = []
+        def build_method(app_generic_content):
+            built.append(app_generic_content)
+
+        cache.prepare()
+        cache.build_feature(glossary_link, build_method)
+        cache.finish()
+
+        self.assertEqual(built, [glossary_link])
+        self.assertFalse(os.path.isfile(cache.records_filepath))
+
+
+    @test_settings
+    @override_settings(APP_KIT_INCREMENTAL_BUILDS=True)
+    def test_get_fingerprint(self):
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        glossary = glossary_link.generic_content
+
+        cache = self.get_cache()
+        fingerprint = cache.get_fingerprint(glossary_link)
+        self.assertEqual(fingerprint, self.get_cache().get_fingerprint(glossary_link))
+
+        # lock the content, fingerprint stays the same
+        glossary.is_locked = True
+        glossary.save(increment_version=False)
+        self.assertEqual(fingerprint, self.get_cache().get_fingerprint(glossary_link))
+
+        # add a glossary entry without bumping the version
+        entry = GlossaryEntry(
+            glossary=glossary,
+            term='Test term',
+            definition='Test definition',
+        )
+        entry.save()
+
+        changed_fingerprint = self.get_cache().get_fingerprint(glossary_link)
+        self.assertNotEqual(fingerprint, changed_fingerprint)
+
+        # the backbone taxonomy depends on all features
+        backbone_link = self.get_generic_content_link(BackboneTaxonomy)
+        backbone_fingerprint = self.get_cache().get_fingerprint(backbone_link)
+        entry.definition = 'Changed definition'
+        entry.save()
+        self.assertNotEqual(backbone_fingerprint, self.get_cache().get_fingerprint(backbone_link))
+
+
+    @test_settings
+    @override_settings(APP_KIT_INCREMENTAL_BUILDS=True)
+    def test_get_taxonomy_fingerprint(self):
+
+        taxonomy_fingerprint = self.get_cache().get_taxonomy_fingerprint()
+        self.assertEqual(taxonomy_fingerprint, self.get_cache().get_taxonomy_fingerprint())
+
+        # a vernacular name added to a taxonomic source
+        models = TaxonomyModelRouter('taxonomy.sources.col')
+        lacerta_agilis = models.TaxonTreeModel.objects.get(taxon_latname='Lacerta agilis')
+        models.TaxonLocaleModel.objects.create(lacerta_agilis, 'Test name', 'en', preferred=False)
+
+        self.assertNotEqual(taxonomy_fingerprint, self.get_cache().get_taxonomy_fingerprint())
+
+
+    @test_settings
+    def test_get_output_paths(self):
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        glossary = glossary_link.generic_content
+
+        cache = self.get_cache()
+        output_paths = cache.get_output_paths(glossary_link)
+
+        self.assertEqual(output_paths[0], self.release_builder._app_absolute_generic_content_path(glossary))
+        self.assertIn(self.release_builder._app_glossarized_locale_filepath(self.meta_app.primary_language),
+                      output_paths)
+
+        # files outside the output paths are not part of the snapshot
+        www_path = self.release_builder._app_www_path
+        for filepath in [os.path.join(output_paths[0], 'glossary.json'), os.path.join(www_path, 'other.json')]:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, 'w') as f:
+                f.write('{}')
+
+        snapshot = cache.get_www_snapshot(output_paths)
+        self.assertEqual(list(snapshot.keys()), [os.path.relpath(os.path.join(output_paths[0], 'glossary.json'),
+                                                                 www_path)])
+
+
+    @test_settings
+    @override_settings(APP_KIT_INCREMENTAL_BUILDS=True)
+    def test_build_feature_and_restore(self):
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        glossary = glossary_link.generic_content
+
+        www_path = self.release_builder._app_www_path
+        relative_filepath = os.path.join('localcosmos', 'features', 'Glossary', str(glossary.uuid),
+            'glossary.json')
+
+        built = []
+        def build_method(app_generic_content):
+            built.append(app_generic_content)
+            absolute_filepath = os.path.join(www_path, relative_filepath)
+            os.makedirs(os.path.dirname(absolute_filepath), exist_ok=True)
+            with open(absolute_filepath, 'w') as f:
+                f.write('{}')
+            self.release_builder.build_features['Glossary'] = {'uuid' : str(glossary.uuid)}
+
+        # first build
+        cache = self.get_cache()
+        cache.prepare()
+        self.release_builder.deletecreate_folder(self.release_builder._app_builder_path)
+        cache.build_feature(glossary_link, build_method)
+        cache.finish()
+
+        self.assertEqual(len(built), 1)
+        self.assertEqual(len(cache.get_report()['built']), 1)
+        self.assertTrue(os.path.isfile(cache.records_filepath))
+
+        # second build, nothing changed
+        self.release_builder.build_features = {}
+        cache = self.get_cache()
+        cache.prepare()
+        self.assertTrue(os.path.isdir(cache.previous_www_path))
+        self.release_builder.deletecreate_folder(self.release_builder._app_builder_path)
+        cache.build_feature(glossary_link, build_method)
+
+        self.assertEqual(len(built), 1)
+        self.assertEqual(len(cache.get_report()['reused']), 1)
+        self.assertTrue(os.path.isfile(os.path.join(www_path, relative_filepath)))
+        self.assertEqual(self.release_builder.build_features['Glossary'], {'uuid' : str(glossary.uuid)})
+        cache.finish()
+        self.assertFalse(os.path.isdir(cache.previous_www_path))
+
+        # third build, the glossary changed
+        entry = GlossaryEntry(
+            glossary=glossary,
+            term='Test term',
+            definition='Test definition',
+        )
+        entry.save()
+
+        cache = self.get_cache()
+        cache.prepare()
+        self.release_builder.deletecreate_folder(self.release_builder._app_builder_path)
+        cache.build_feature(glossary_link, build_method)
+        cache.finish()
+
+        self.assertEqual(len(built), 2)
@@ -0,0 +1,204 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp
+
+from app_kit.app_kit_api.models import AppKitTasks
+from app_kit.app_kit_api.task_queue import enqueue_task
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildCheckpoints import BuildCheckpoints, BuildCancelled, get_outputs_digest
+
+import os, shutil
+
+
+class TestOutputsDigest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'checkpoint_outputs')
+        os.makedirs(self.folder)
+
+        self.filepath = os.path.join(self.folder, 'features.json')
+        with open(self.filepath, 'w') as f:
+            f.write('{}')
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def test_get_outputs_digest(self):
+
+        digest = get_outputs_digest([self.folder])
+        self.assertEqual(digest, get_outputs_digest([self.folder]))
+
+        with open(self.filepath, 'w') as f:
+            f.write('{"changed": true}')
+
+        self.assertNotEqual(digest, get_outputs_digest([self.folder]))
+
+        missing_path = os.path.join(self.folder, 'missing')
+        self.assertNotEqual(get_outputs_digest([self.folder]), get_outputs_digest([self.folder, missing_path]))
+
+
+class TestBuildCheckpoints(WithMetaApp, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.meta_app.build_number = 3
+        self.meta_app.save()
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+        self.outputs_folder = os.path.join(TESTS_ROOT, 'checkpoint_www')
+        self.browser_folder = os.path.join(TESTS_ROOT, 'checkpoint_browser')
+        os.makedirs(self.outputs_folder)
+
+        self.output_filepath = os.path.join(self.outputs_folder, 'settings.json')
+        with open(self.output_filepath, 'w') as f:
+            f.write('{}')
+
+
+    def tearDown(self):
+        for folder in [self.outputs_folder, self.browser_folder]:
+            if os.path.isdir(folder):
+                shutil.rmtree(folder)
+        super().tearDown()
+
+
+    def complete_www(self):
+        checkpoints = BuildCheckpoints(self.release_builder)
+        checkpoints.start()
+        checkpoints.complete('www', [self.outputs_folder], report={'images' : {'processed' : 2}})
+        return checkpoints
+
+
+    @test_settings
+    def test_cancel(self):
+
+        checkpoints = BuildCheckpoints(self.release_builder)
+        self.assertFalse(checkpoints.is_cancel_requested())
+        checkpoints.check_cancelled(force=True)
+
+        checkpoints.request_cancel()
+        self.assertTrue(checkpoints.is_cancel_requested())
+
+        with self.assertRaises(BuildCancelled):
+            checkpoints.check_cancelled(force=True)
+
+        checkpoints.clear_cancel()
+        self.assertFalse(checkpoints.is_cancel_requested())
+
+
+    @test_settings
+    def test_check_cancelled_interval(self):
+
+        checkpoints = BuildCheckpoints(self.release_builder)
+        checkpoints.check_cancelled()
+
+        # the flag is not read again within CANCEL_CHECK_INTERVAL
+        checkpoints.request_cancel()
+        checkpoints.check_cancelled()
+
+        with self.assertRaises(BuildCancelled):
+            checkpoints.check_cancelled(force=True)
+
+        checkpoints.clear_cancel()
+
+
+    @test_settings
+    def test_cancel_build(self):
+
+        self.assertIsNone(self.release_builder.cancel_build())
+        self.assertFalse(BuildCheckpoints(self.release_builder).is_cancel_requested())
+
+        self.meta_app.build_status = 'in_progress'
+        self.meta_app.save()
+
+        self.assertEqual(self.release_builder.cancel_build(), 'requested')
+
+        checkpoints = BuildCheckpoints(self.release_builder)
+        self.assertTrue(checkpoints.is_cancel_requested())
+        checkpoints.clear_cancel()
+
+
+    @test_settings
+    def test_cancel_queued_build(self):
+
+        task = enqueue_task(self.tenant, 'build', meta_app=self.meta_app)
+
+        self.assertEqual(self.release_builder.cancel_build(), 'dequeued')
+        self.assertFalse(AppKitTasks.objects.filter(pk=task.pk).exists())
+        self.assertFalse(BuildCheckpoints(self.release_builder).is_cancel_requested())
+
+
+    @test_settings
+    def test_disabled(self):
+
+        checkpoints = self.complete_www()
+        self.assertFalse(os.path.isfile(checkpoints.checkpoints_filepath))
+        self.assertFalse(BuildCheckpoints(self.release_builder).load())
+
+
+    @test_settings
+    @override_settings(APP_KIT_RESUMABLE_BUILDS=True)
+    def test_load(self):
+
+        checkpoints = self.complete_www()
+        self.assertTrue(os.path.isfile(checkpoints.checkpoints_filepath))
+
+        resumed_checkpoints = BuildCheckpoints(self.release_builder)
+        self.assertTrue(resumed_checkpoints.load())
+        self.assertTrue(resumed_checkpoints.is_completed('www'))
+        self.assertFalse(resumed_checkpoints.is_completed('browser'))
+        self.assertEqual(resumed_checkpoints.get_phase_report('www'), {'images' : {'processed' : 2}})
+        self.assertEqual(resumed_checkpoints.get_report()['skipped'], ['www'])
+
+        # a successful build removes the checkpoints
+        resumed_checkpoints.clear()
+        self.assertFalse(BuildCheckpoints(self.release_builder).load())
+
+
+    @test_settings
+    @override_settings(APP_KIT_RESUMABLE_BUILDS=True)
+    def test_load_modified_outputs(self):
+
+        checkpoints = self.complete_www()
+
+        browser_folder = self.browser_folder
+        os.makedirs(browser_folder)
+        checkpoints.complete('browser', [browser_folder])
+
+        # the browser phase died while rewriting its outputs
+        with open(os.path.join(browser_folder, 'index.html'), 'w') as f:
+            f.write('<html>')
+
+        resumed_checkpoints = BuildCheckpoints(self.release_builder)
+        self.assertTrue(resumed_checkpoints.load())
+        self.assertTrue(resumed_checkpoints.is_completed('www'))
+        self.assertFalse(resumed_checkpoints.is_completed('browser'))
+
+        # modified outputs of the first phase invalidate all checkpoints
+        with open(self.output_filepath, 'w') as f:
+            f.write('{"changed": true}')
+
+        self.assertFalse(BuildCheckpoints(self.release_builder).load())
+
+
+    @test_settings
+    @override_settings(APP_KIT_RESUMABLE_BUILDS=True)
+    def test_load_other_build(self):
+
+        self.complete_www()
+
+        # another build has been started since
+        self.meta_app.build_number = 4
+        self.meta_app.save()
+
+        checkpoints = BuildCheckpoints(self.release_builder)
+        self.assertFalse(checkpoints.load())
+        self.assertFalse(os.path.isfile(checkpoints.checkpoints_filepath))
@@ -0,0 +1,212 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+from django.contrib.contenttypes.models import ContentType
+
+from app_kit.tests.common import test_settings
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder.BuildContext import BuildContext, InactiveBranches
+
+from app_kit.features.nature_guides.models import NatureGuide
+from app_kit.features.nature_guides.tests.common import WithNatureGuide
+from app_kit.features.taxon_profiles.models import TaxonProfiles, TaxonProfile
+from app_kit.models import MetaAppGenericContent
+
+from taxonomy.models import TaxonomyModelRouter, MetaVernacularNames
+from taxonomy.lazy import LazyTaxon
+
+
+class TestInactiveBranches(TestCase):
+
+    def test_contains(self):
+
+        inactive_branches = InactiveBranches(set(['001002', '001', '003004', '00300']))
+
+        # nested prefixes are dropped
+        self.assertEqual(inactive_branches.prefixes, ['001', '00300'])
+
+        self.assertIn('001', inactive_branches)
+        self.assertIn('001002005', inactive_branches)
+        self.assertIn('003004', inactive_branches)
+        self.assertNotIn('002001', inactive_branches)
+        self.assertNotIn('003', inactive_branches)
+        self.assertNotIn('0030', inactive_branches)
+        self.assertNotIn('00', inactive_branches)
+
+        self.assertNotIn('001', InactiveBranches([]))
+
+
+class TestBuildContext(WithMetaApp, WithUser, WithMedia, WithNatureGuide, TenantTestCase):
+
+    @test_settings
+    def setUp(self):
+        super().setUp()
+
+        self.create_all_generic_contents(self.meta_app)
+
+        self.taxon_profiles = self.get_generic_content_link(TaxonProfiles).generic_content
+        self.nature_guide = self.get_generic_content_link(NatureGuide).generic_content
+
+        models = TaxonomyModelRouter('taxonomy.sources.col')
+        self.lacerta_agilis = LazyTaxon(instance=models.TaxonTreeModel.objects.get(
+            taxon_latname='Lacerta agilis'))
+
+        self.build_context = BuildContext(self.meta_app)
+
+
+    def create_taxon_profile(self, morphotype=None):
+
+        taxon_profile = TaxonProfile(
+            taxon_profiles=self.taxon_profiles,
+            taxon=self.lacerta_agilis,
+            morphotype=morphotype,
+        )
+
+        taxon_profile.save()
+
+        return taxon_profile
+
+
+    def create_result_node(self):
+
+        node = self.create_node(self.nature_guide.root_node, 'Lacerta agilis', **{'node_type':'result'})
+        node.meta_node.taxon = self.lacerta_agilis
+        node.meta_node.save()
+
+        return node
+
+
+    @test_settings
+    def test_get_taxon_profile(self):
+
+        self.assertIsNone(self.build_context.get_taxon_profile(self.lacerta_agilis))
+
+        taxon_profile = self.create_taxon_profile()
+        morphotype_profile = self.create_taxon_profile(morphotype='juvenile')
+
+        build_context = BuildContext(self.meta_app)
+
+        self.assertEqual(build_context.get_taxon_profile(self.lacerta_agilis), taxon_profile)
+        self.assertEqual(build_context.get_taxon_profile(self.lacerta_agilis, morphotype='juvenile'),
+                         morphotype_profile)
+        self.assertIsNone(build_context.get_taxon_profile(self.lacerta_agilis, morphotype='adult'))
+
+        self.assertEqual(build_context.get_taxon_profile_by_name_uuid(self.lacerta_agilis.name_uuid),
+                         taxon_profile)
+        self.assertEqual(build_context.get_taxon_profile_by_name_uuid(str(self.lacerta_agilis.name_uuid),
+                         morphotype='juvenile'), morphotype_profile)
+
+        self.assertEqual(build_context.get_morphotype_profiles(taxon_profile), [morphotype_profile])
+        self.assertEqual(build_context.get_morphotype_profiles(morphotype_profile), [])
+
+        # the table is queried only once
+        with self.assertNumQueries(0):
+            build_context.get_taxon_profile(self.lacerta_agilis)
+            build_context.get_morphotype_profiles(taxon_profile)
+
+
+    @test_settings
+    def test_get_nature_guide_occurrences(self):
+
+        self.assertEqual(self.build_context.get_nature_guide_occurrences(self.lacerta_agilis), [])
+
+        node = self.create_result_node()
+
+        build_context = BuildContext(self.meta_app)
+
+        self.assertEqual(build_context.get_nature_guide_occurrences(self.lacerta_agilis), [node])
+        self.assertEqual(build_context.get_nature_guide_occurrences(self.lacerta_agilis, morphotype='juvenile'),
+                         [])
+
+        self.assertEqual(build_context.get_nature_guide_nodes(self.lacerta_agilis.name_uuid), [node])
+        self.assertEqual(build_context.get_meta_nodes(self.lacerta_agilis.name_uuid), [node.meta_node])
+
+        self.assertTrue(build_context.exists_in_nature_guides(node.name_uuid))
+
+        # nature guides which are not part of the app are ignored
+        content_type = ContentType.objects.get_for_model(NatureGuide)
+        MetaAppGenericContent.objects.filter(meta_app=self.meta_app, content_type=content_type).delete()
+
+        build_context = BuildContext(self.meta_app)
+        self.assertEqual(build_context.get_nature_guide_occurrences(self.lacerta_agilis), [])
+
+
+    @test_settings
+    def test_get_images(self):
+
+        user = self.create_user()
+        taxon_profile = self.create_taxon_profile()
+
+        self.assertEqual(self.build_context.get_images(taxon_profile), [])
+
+        content_image = self.create_content_image(taxon_profile, user, taxon=self.lacerta_agilis)
+
+        build_context = BuildContext(self.meta_app)
+
+        self.assertEqual(build_context.get_images(taxon_profile), list(taxon_profile.images()))
+        self.assertEqual(build_context.get_image(taxon_profile), content_image)
+        self.assertEqual(build_context.get_primary_image(taxon_profile), content_image)
+        self.assertEqual(build_context.get_taxon_images(self.lacerta_agilis), [content_image])
+        self.assertEqual(build_context.get_image_store(content_image.image_store_id), content_image.image_store)
+
+        with self.assertNumQueries(0):
+            build_context.get_image(taxon_profile)
+            build_context.get_taxon_images(self.lacerta_agilis)
+
+
+    @test_settings
+    def test_get_preferred_vernacular_name(self):
+
+        language = self.meta_app.primary_language
+
+        self.assertEqual(self.build_context.get_preferred_vernacular_name(self.lacerta_agilis, language),
+                         self.lacerta_agilis.get_preferred_vernacular_name(language, self.meta_app))
+
+        # names from nature guides
+        self.create_result_node()
+
+        build_context = BuildContext(self.meta_app)
+        self.assertEqual(build_context.get_preferred_vernacular_name(self.lacerta_agilis, language),
+                         self.lacerta_agilis.get_preferred_vernacular_name(language, self.meta_app))
+
+        # manually added names come first
+        meta_vernacular_name = MetaVernacularNames(
+            taxon_source=self.lacerta_agilis.taxon_source,
+            taxon_latname=self.lacerta_agilis.taxon_latname,
+            taxon_author=self.lacerta_agilis.taxon_author,
+            taxon_nuid=self.lacerta_agilis.taxon_nuid,
+            name_uuid=self.lacerta_agilis.name_uuid,
+            language=language,
+            name='Sand lizard',
+        )
+        meta_vernacular_name.save()
+
+        build_context = BuildContext(self.meta_app)
+        self.assertEqual(build_context.get_preferred_vernacular_name(self.lacerta_agilis, language), 'Sand lizard')
+        self.assertEqual(build_context.get_vernacular_name(self.lacerta_agilis, language),
+                         self.lacerta_agilis.vernacular(language=language, meta_app=self.meta_app))
+
+
+    @test_settings
+    def test_has_active_node(self):
+
+        node = self.create_result_node()
+
+        inactivated_nuids = set([])
+
+        self.assertTrue(self.build_context.has_active_node(self.lacerta_agilis.name_uuid, inactivated_nuids))
+        self.assertFalse(self.build_context.is_in_inactive_branch(node.taxon_nuid, inactivated_nuids))
+
+        # the classification is computed again if the inactivated nuids change
+        inactivated_nuids.add(node.taxon_nuid)
+
+        self.assertFalse(self.build_context.has_active_node(self.lacerta_agilis.name_uuid, inactivated_nuids))
+        self.assertTrue(self.build_context.is_in_inactive_branch(node.taxon_nuid, inactivated_nuids))
+
+        # an occurrence in an active branch makes the taxon active
+        second_node = self.create_node(self.nature_guide.root_node, 'Lacerta agilis 2', **{'node_type':'result'})
+        second_node.meta_node.taxon = self.lacerta_agilis
+        second_node.meta_node.save()
+
+        build_context = BuildContext(self.meta_app)
+        self.assertTrue(build_context.has_active_node(self.lacerta_agilis.name_uuid, inactivated_nuids))
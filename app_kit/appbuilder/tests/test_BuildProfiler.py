@@ -0,0 +1,167 @@
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+from django.db import connection, connections
+
+from app_kit.tests.common import test_settings
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildProfiler import BuildProfiler, get_peak_rss
+
+from app_kit.models import MetaAppGenericContent
+
+import os, json, threading
+
+
+class TestBuildProfiler(WithMetaApp, WithUser, WithMedia, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+
+
+    @test_settings
+    def test_phase(self):
+
+        profiler = BuildProfiler(self.release_builder)
+
+        www_path = self.release_builder._app_www_path
+        os.makedirs(www_path, exist_ok=True)
+
+        json_filepath = os.path.join(www_path, 'test.json')
+
+        with profiler.phase('outer'):
+
+            with profiler.phase('inner', uuid='test'):
+                list(MetaAppGenericContent.objects.filter(meta_app=self.meta_app))
+                self.release_builder.json_writer.write(json_filepath, {})
+
+            # overwritten files are written again
+            self.release_builder.json_writer.write(json_filepath, {})
+
+        phases = profiler.get_report()
+        self.assertEqual([phase['name'] for phase in phases], ['outer', 'inner'])
+
+        outer, inner = phases
+        self.assertEqual(outer['depth'], 0)
+        self.assertEqual(inner['depth'], 1)
+        self.assertEqual(inner['uuid'], 'test')
+
+        self.assertEqual(inner['queries'], 1)
+        self.assertEqual(outer['queries'], 1)
+        self.assertEqual(inner['files_written'], 1)
+        self.assertEqual(inner['bytes_written'], 2)
+        self.assertEqual(outer['files_written'], 2)
+        self.assertEqual(outer['bytes_written'], 4)
+
+        for key in ['wall_time', 'cpu_time', 'query_time']:
+            self.assertIn(key, inner)
+
+
+    @test_settings
+    def test_count_queries(self):
+
+        profiler = BuildProfiler(self.release_builder)
+
+        def run_query():
+            try:
+                with profiler.count_queries():
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+            finally:
+                connections.close_all()
+
+        with profiler.phase('outer'):
+
+            with profiler.phase('inner'):
+
+                # the connection of the thread is not wrapped by phase()
+                thread = threading.Thread(target=run_query)
+                thread.start()
+                thread.join()
+
+        outer, inner = profiler.get_report()
+        self.assertEqual(inner['queries'], 1)
+        self.assertEqual(outer['queries'], 1)
+        self.assertEqual(profiler.open_queries, [])
+
+        # no open phase
+        thread = threading.Thread(target=run_query)
+        thread.start()
+        thread.join()
+        self.assertEqual(inner['queries'], 1)
+
+
+    @test_settings
+    @override_settings(APP_KIT_BUILD_CPROFILE=True)
+    def test_finish(self):
+
+        profiler = BuildProfiler(self.release_builder)
+        profiler.start()
+
+        with profiler.phase('test'):
+            pass
+
+        profiler.add_phases([{'name' : 'worker', 'depth' : 0}], process='worker')
+
+        profiler.finish()
+
+        self.assertTrue(os.path.isfile(profiler.cprofile_filepath))
+
+        with open(profiler.profile_filepath, 'r') as f:
+            lines = [json.loads(line) for line in f.readlines()]
+
+        self.assertEqual([line['name'] for line in lines], ['test', 'worker'])
+        self.assertEqual(lines[1]['process'], 'worker')
+        self.assertEqual(lines[0]['build_number'], self.meta_app.build_number)
+
+
+    @test_settings
+    @override_settings(APP_KIT_BUILD_MAX_RSS=1)
+    def test_check_memory(self):
+
+        profiler = BuildProfiler(self.release_builder)
+        self.assertFalse(self.release_builder.streaming_output)
+
+        with profiler.phase('test'):
+            pass
+
+        phase = profiler.get_report()[0]
+        self.assertTrue(phase['rss'] > 0)
+        self.assertNotIn('memory', phase)
+
+        memory_report = profiler.get_memory_report()
+        self.assertEqual(memory_report['peak_rss'], phase['rss'])
+        self.assertTrue(memory_report['max_rss_exceeded'])
+        self.assertTrue(self.release_builder.streaming_output)
+
+
+    @test_settings
+    def test_get_rss(self):
+
+        profiler = BuildProfiler(self.release_builder)
+
+        # the current RSS, the process peak includes previous builds of the same worker
+        rss = profiler.get_rss()
+        self.assertTrue(rss > 0)
+        self.assertTrue(rss <= get_peak_rss())
+
+
+    @test_settings
+    @override_settings(APP_KIT_BUILD_TRACEMALLOC=True)
+    def test_tracemalloc(self):
+
+        profiler = BuildProfiler(self.release_builder)
+        profiler.start()
+
+        with profiler.phase('test'):
+            allocated = [str(index) * 10 for index in range(10000)]
+
+        profiler.finish()
+
+        memory = profiler.get_report()[0]['memory']
+        self.assertTrue(memory['traced_bytes'] > 0)
+        self.assertTrue(len(memory['top_allocations']) > 0)
+        self.assertIn('test_BuildProfiler.py', memory['top_allocations'][0]['site'])
+        self.assertFalse(profiler.memory_report['max_rss_exceeded'])
+        self.assertFalse(self.release_builder.streaming_output)
@@ -0,0 +1,166 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildStorage import BuildStorage, get_reclaimable_bytes
+
+import os, shutil
+
+
+class TestReclaimableBytes(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'build_storage')
+        os.makedirs(os.path.join(self.folder, 'version'))
+
+        self.filepath = os.path.join(self.folder, 'version', 'a.json')
+        with open(self.filepath, 'w') as f:
+            f.write('{"a": 1}')
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def test_get_reclaimable_bytes(self):
+
+        version_folder = os.path.join(self.folder, 'version')
+        self.assertEqual(get_reclaimable_bytes(version_folder), 8)
+
+        # the data is still used by the link outside the folder
+        os.link(self.filepath, os.path.join(self.folder, 'a.json'))
+        self.assertEqual(get_reclaimable_bytes(version_folder), 0)
+
+
+class TestBuildStorage(WithMetaApp, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.meta_app.published_version = 2
+        self.meta_app.current_version = 3
+        self.meta_app.save()
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+
+        self.image_content = b'webp' * 256
+
+
+    def tearDown(self):
+        with test_settings:
+            app_root_path = self.release_builder._app_root_path
+            if os.path.isdir(app_root_path):
+                shutil.rmtree(app_root_path)
+        super().tearDown()
+
+
+    def create_versions(self):
+        for app_version in [1, 2, 3]:
+            self.write_file(app_version, 'images/image.webp', self.image_content)
+            self.write_file(app_version, 'settings.json', '{{"version": {0}}}'.format(app_version).encode())
+
+
+    def get_filepath(self, app_version, relative_path):
+        build_storage = BuildStorage(self.release_builder)
+        return os.path.join(build_storage.get_version_path(app_version), 'release', 'sources', 'www',
+                            relative_path)
+
+
+    def write_file(self, app_version, relative_path, content):
+
+        filepath = self.get_filepath(app_version, relative_path)
+
+        if not os.path.isdir(os.path.dirname(filepath)):
+            os.makedirs(os.path.dirname(filepath))
+
+        with open(filepath, 'wb') as f:
+            f.write(content)
+
+
+    def get_inode(self, app_version, relative_path):
+        return os.stat(self.get_filepath(app_version, relative_path)).st_ino
+
+
+    @test_settings
+    def test_get_immutable_versions(self):
+
+        self.create_versions()
+
+        build_storage = BuildStorage(self.release_builder)
+        self.assertEqual(build_storage.get_versions(), [1, 2, 3])
+        self.assertEqual(build_storage.get_immutable_versions(), [1, 2])
+
+        self.meta_app.published_version = 3
+        self.meta_app.save()
+        self.assertEqual(build_storage.get_immutable_versions(), [1, 2, 3])
+
+
+    @test_settings
+    def test_dedupe(self):
+
+        self.create_versions()
+
+        build_storage = BuildStorage(self.release_builder)
+        report = build_storage.dedupe()
+
+        self.assertEqual(report['deduplicated_versions'], [1, 2])
+        # the settings files of both versions have the same size
+        self.assertEqual(report['files'], 4)
+        self.assertEqual(report['hashed'], 4)
+        self.assertEqual(report['linked'], 1)
+        self.assertEqual(report['reclaimed_bytes'], len(self.image_content))
+
+        self.assertEqual(self.get_inode(1, 'images/image.webp'), self.get_inode(2, 'images/image.webp'))
+        self.assertNotEqual(self.get_inode(1, 'settings.json'), self.get_inode(2, 'settings.json'))
+
+        # the current version is still built
+        self.assertNotEqual(self.get_inode(2, 'images/image.webp'), self.get_inode(3, 'images/image.webp'))
+
+        with open(self.get_filepath(1, 'images/image.webp'), 'rb') as f:
+            self.assertEqual(f.read(), self.image_content)
+
+        # linked files are skipped, hashes are reused
+        report = BuildStorage(self.release_builder).dedupe()
+        self.assertEqual(report['linked'], 0)
+        self.assertEqual(report['hashed'], 0)
+        self.assertEqual(report['reclaimed_bytes'], 0)
+
+
+    @test_settings
+    def test_apply_retention(self):
+
+        self.create_versions()
+
+        self.write_file(4, 'settings.json', b'{}')
+
+        self.meta_app.current_version = 4
+        self.meta_app.save()
+
+        build_storage = BuildStorage(self.release_builder, keep_versions=1)
+        build_storage.apply_retention()
+
+        report = build_storage.get_report()
+
+        # the published version is kept
+        self.assertEqual(report['kept_versions'], [2, 4])
+        self.assertEqual(report['removed_versions'], [1, 3])
+        self.assertEqual(report['removed_bytes'], 2 * len(self.image_content) + len(b'{"version": 1}') * 2)
+        self.assertEqual(build_storage.get_versions(), [2, 4])
+
+
+    @test_settings
+    def test_maintain_without_retention(self):
+
+        self.create_versions()
+
+        build_storage = BuildStorage(self.release_builder)
+        report = build_storage.maintain()
+
+        self.assertEqual(report['kept_versions'], [1, 2, 3])
+        self.assertEqual(report['removed_versions'], [])
+        self.assertEqual(report['linked'], 1)
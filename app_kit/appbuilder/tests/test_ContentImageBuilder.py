@@ -1,15 +1,20 @@
 from django.conf import settings
 from django_tenants.test.cases import TenantTestCase
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from app_kit.appbuilder import AppReleaseBuilder
-from app_kit.appbuilder.ContentImageBuilder import ContentImageBuilder, IMAGE_SIZES
+from app_kit.appbuilder.ContentImageBuilder import ContentImageBuilder, IMAGE_SIZES, get_thumbnail_size
 
 from app_kit.tests.common import (test_settings, TESTS_ROOT, LARGE_SQUARE_TEST_IMAGE_PATH, TEST_SVG_IMAGE_PATH,
                                     TEST_IMAGE_PATH)
 from app_kit.models import ContentImage
 from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser, WithImageStore
 
+from content_licencing.models import ContentLicenceRegistry
+from localcosmos_server.template_content.api.serializers import ContentLicenceSerializer
+
 from PIL import Image
 
 import os, hashlib
@@ -87,20 +92,6 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
         self.assertEqual(filename, 'image-{0}-500.webp'.format(content_image.id))
 
 
-    @test_settings
-    def test_get_on_disk_cached_image_filepath(self):
-        
-        content_image_builder = self.get_content_image_builder()
-        content_image = self.create_content_image()
-
-        image_size = 500
-        filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, image_size)
-
-        self.assertTrue(filepath.startswith(content_image_builder.cache_folder))
-        self.assertTrue(filepath.startswith(TESTS_ROOT))
-        self.assertTrue(filepath.startswith(settings.APP_KIT_ROOT))
-
-    
     @test_settings
     def test_build_cached_images(self):
 
@@ -111,7 +102,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
 
         for size_name, size in IMAGE_SIZES['regular'].items():
 
-            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
 
             self.assertTrue(os.path.isfile(absolute_cached_image_filepath))
 
@@ -122,6 +113,9 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
             self.assertEqual(width, size)
             self.assertEqual(height, size)
 
+        # images are only cached in the shared image cache
+        self.assertFalse(os.path.isdir(content_image_builder.cache_folder))
+
 
     @test_settings
     def test_build_cached_images_force_build(self):
@@ -135,7 +129,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
 
         for size_name, size in IMAGE_SIZES['regular'].items():
 
-            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
 
             self.assertTrue(os.path.isfile(absolute_cached_image_filepath))
 
@@ -160,7 +154,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
 
         for size_name, size in IMAGE_SIZES['regular'].items():
 
-            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+            absolute_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
 
             self.assertTrue(os.path.isfile(absolute_cached_image_filepath))
 
@@ -192,39 +186,6 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
             self.assertTrue(os.path.isfile(image_filepath))
 
  
-    @test_settings
-    def test_save_to_on_disk_cache(self):
-        
-        content_image_builder = self.get_content_image_builder()
-        content_image = self.create_content_image()
-
-        size = 500
-
-        source_image_path = content_image.image_store.source_image.path
-
-        absolute_path = self.release_builder._app_absolute_content_images_path
-        os.makedirs(absolute_path)
-        output_filename = content_image_builder.get_output_filename(content_image, size)
-
-        absolute_image_filepath = os.path.join(absolute_path, output_filename)
-
-        original_image = Image.open(source_image_path)
-        processed_image = content_image.get_in_memory_processed_image(original_image, size)
-           
-        output_format = 'WEBP'
-        processed_image.save(absolute_image_filepath, output_format)
-
-        on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
-
-        self.assertTrue(os.path.isfile(absolute_image_filepath))
-        self.assertFalse(os.path.isfile(on_disk_cached_image_filepath))
-
-        content_image_builder.save_to_on_disk_cache(content_image, size, absolute_image_filepath)
-
-        self.assertTrue(os.path.isfile(absolute_image_filepath))
-        self.assertTrue(os.path.isfile(on_disk_cached_image_filepath))
-
-
     @test_settings
     def test_build_content_image(self):
         
@@ -236,8 +197,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
         relative_path = self.release_builder._app_relative_content_images_path
 
         for size_name, size in IMAGE_SIZES['regular'].items():
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
-            self.assertFalse(os.path.isfile(on_disk_cached_image_filepath))
+            self.assertIsNone(content_image_builder.get_on_disk_cached_image(content_image, size))
 
         image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
 
@@ -252,7 +212,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
             self.assertTrue(image_url.startswith('/'))
             self.assertTrue(os.path.isfile(absolute_image_filepath))
 
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
             self.assertTrue(os.path.isfile(on_disk_cached_image_filepath))
 
         image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
@@ -268,8 +228,7 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
         relative_path = self.release_builder._app_relative_content_images_path
 
         for size_name, size in IMAGE_SIZES['regular'].items():
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
-            self.assertFalse(os.path.isfile(on_disk_cached_image_filepath))
+            self.assertIsNone(content_image_builder.get_on_disk_cached_image(content_image, size))
 
         image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
 
@@ -285,82 +244,174 @@ class TestContentImageBuilder(WithMetaApp, WithUser, WithMedia, WithImageStore,
             self.assertTrue(image_url.endswith('.svg'))
             self.assertTrue(os.path.isfile(absolute_image_filepath))
 
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
-            
             # svgs are not cached
-            self.assertFalse(os.path.isfile(on_disk_cached_image_filepath))
+            self.assertIsNone(content_image_builder.get_on_disk_cached_image(content_image, size))
 
         image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
 
 
     @test_settings
-    def test_clean_on_disk_cache(self):
+    def test_build_content_image_deferred(self):
+
         content_image_builder = self.get_content_image_builder()
+        content_image_builder.defer_image_processing()
 
         content_image = self.create_content_image()
-        content_image_2 = self.create_content_image(test_image_path=TEST_IMAGE_PATH)
 
         absolute_path = self.release_builder._app_content_images_path
         relative_path = self.release_builder._app_relative_content_images_path
 
         image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
-        image_2_urls = content_image_builder.build_content_image(content_image_2, absolute_path, relative_path)
 
-        self.assertEqual(len(content_image_builder.image_cache), 6)
+        sizes = list(IMAGE_SIZES['regular'].values()) + list(IMAGE_SIZES['large'].values())
 
-        for size_name, size in IMAGE_SIZES['regular'].items():
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+        # one job per content image, containing all sizes
+        self.assertEqual(len(content_image_builder.image_jobs), 1)
+        self.assertEqual(len(content_image_builder.image_jobs[0][1]), len(sizes))
+
+        for size in sizes:
+            output_filename = content_image_builder.get_output_filename(content_image, size)
+            absolute_image_filepath = os.path.join(absolute_path, output_filename)
+            self.assertFalse(os.path.isfile(absolute_image_filepath))
+
+        # the urls are final before the images are rendered
+        expected_image_urls = image_urls.copy()
+
+        content_image_builder.process_image_jobs()
+
+        self.assertEqual(content_image_builder.image_jobs, [])
+        self.assertEqual(content_image_builder.image_report['encoded'], len(sizes))
+        self.assertEqual(content_image_builder.image_report['files_written'], len(sizes))
+        self.assertTrue(content_image_builder.image_report['bytes_written'] > 0)
+
+        for size_name, image_url in expected_image_urls.items():
+            absolute_image_filepath = os.path.join(absolute_path, os.path.basename(image_url))
+            self.assertTrue(os.path.isfile(absolute_image_filepath))
+
+        for size in sizes:
+            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
             self.assertTrue(os.path.isfile(on_disk_cached_image_filepath))
 
-            on_disk_cached_image_2_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image_2, size)
-            self.assertTrue(os.path.isfile(on_disk_cached_image_2_filepath))
+        # images of the shared cache are copied, not encoded
+        for size in sizes:
+            output_filename = content_image_builder.get_output_filename(content_image, size)
+            os.remove(os.path.join(absolute_path, output_filename))
 
+        content_image_builder.image_jobs.append((content_image, [
+            (size, os.path.join(absolute_path, content_image_builder.get_output_filename(content_image, size)))
+            for size in sizes]))
+        content_image_builder.process_image_jobs()
 
-        for size_name, size in IMAGE_SIZES['regular'].items():
+        self.assertEqual(content_image_builder.image_report['encoded'], len(sizes))
+        self.assertEqual(content_image_builder.image_report['copied_from_cache'], len(sizes))
 
-            cache_key = '{0}-{1}'.format(content_image_2.id, size)
-            del content_image_builder.image_cache[cache_key]
+        # second build uses the in-memory cache
+        image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
+        self.assertEqual(image_urls, expected_image_urls)
+        self.assertEqual(content_image_builder.image_jobs, [])
+        self.assertEqual(content_image_builder.image_report['skipped'], len(sizes))
 
-        
-        self.assertEqual(len(content_image_builder.image_cache), 3)
-        content_image_builder.clean_on_disk_cache()
 
+    def test_get_thumbnail_size(self):
 
-        for size_name, size in IMAGE_SIZES['regular'].items():
-            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image, size)
+        sizes = [
+            ((2000, 1000), (500, 500)),
+            ((1000, 2000), (500, 500)),
+            ((1234, 567), (250, 250)),
+            ((333, 999), (1000, 1000)),
+            ((640, 480), (250, 187.5)),
+        ]
+
+        for image_size, bounds in sizes:
+            image = Image.new('RGB', image_size)
+            image.thumbnail(bounds)
+            self.assertEqual(get_thumbnail_size(image_size, bounds), image.size)
+
+
+    @test_settings
+    def test_render_images(self):
+
+        content_image_builder = self.get_content_image_builder()
+        content_image = self.create_content_image()
+
+        absolute_path = self.release_builder._app_content_images_path
+        if not os.path.isdir(absolute_path):
+            os.makedirs(absolute_path)
+
+        sizes = [250, 1000, 500, 2000]
+        targets = []
+        for size in sizes:
+            output_filename = content_image_builder.get_output_filename(content_image, size)
+            targets.append((size, os.path.join(absolute_path, output_filename)))
+
+        content_image_builder.render_images(content_image, targets)
+
+        original_image = Image.open(content_image.image_store.source_image.path)
+
+        for size, absolute_image_filepath in targets:
+
+            self.assertTrue(os.path.isfile(absolute_image_filepath))
+
+            # same dimensions as resizing each size from the source image
+            processed_image = content_image.get_in_memory_processed_image(original_image, size)
+            image = Image.open(absolute_image_filepath)
+            self.assertEqual(image.size, processed_image.size)
+
+            on_disk_cached_image_filepath = content_image_builder.get_on_disk_cached_image(content_image, size)
             self.assertTrue(os.path.isfile(on_disk_cached_image_filepath))
 
-            on_disk_cached_image_2_filepath = content_image_builder.get_on_disk_cached_image_filepath(content_image_2, size)
-            self.assertFalse(os.path.isfile(on_disk_cached_image_2_filepath))
+        self.assertFalse(os.path.isdir(content_image_builder.cache_folder))
+
+
+    @test_settings
+    def test_remove_on_disk_cache(self):
+
+        content_image_builder = self.get_content_image_builder()
+
+        # the per app cache of earlier versions
+        os.makedirs(content_image_builder.cache_folder)
+        with open(os.path.join(content_image_builder.cache_folder, 'image-1-250.webp'), 'wb') as f:
+            f.write(b'webp')
+
+        content_image_builder.remove_on_disk_cache()
+        self.assertFalse(os.path.isdir(content_image_builder.cache_folder))
+
+        # nothing to remove
+        content_image_builder.remove_on_disk_cache()
 
 
     @test_settings
-    def test_empty_on_disk_cache(self):
+    def test_build_licence(self):
 
         content_image_builder = self.get_content_image_builder()
 
         content_image = self.create_content_image()
         content_image_2 = self.create_content_image(test_image_path=TEST_IMAGE_PATH)
 
-        absolute_path = self.release_builder._app_content_images_path
-        relative_path = self.release_builder._app_relative_content_images_path
+        user = self.create_user()
+        ContentLicenceRegistry.objects.register(content_image.image_store, 'source_image', user, 'CC0', '1.0',
+            creator_name='Test Creator')
 
-        image_urls = content_image_builder.build_content_image(content_image, absolute_path, relative_path)
-        image_2_urls = content_image_builder.build_content_image(content_image_2, absolute_path, relative_path)
+        # content types are cached by django
+        ContentType.objects.get_for_model(content_image.image_store)
 
-        self.assertEqual(len(content_image_builder.image_cache), 6)
-        
-        filecount = 0
+        with CaptureQueriesContext(connection) as queries:
+            licence = content_image_builder.build_licence(content_image)
+
+        self.assertEqual(len(queries), 1)
 
-        for filename in os.listdir(content_image_builder.cache_folder):
-            filecount += 1
+        expected_licence = ContentLicenceSerializer(content_image.image_store.licences.first()).data
+        self.assertEqual(licence, expected_licence)
+        self.assertEqual(licence['creatorName'], 'Test Creator')
 
-        self.assertEqual(filecount, 6)
+        # all licences of the image stores have been loaded
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(content_image_builder.build_licence(content_image_2), {})
+            self.assertEqual(content_image_builder.build_licence(content_image), expected_licence)
 
-        empty_filecount = 0
-        content_image_builder.empty_on_disk_cache()
+        self.assertEqual(len(queries), 0)
 
-        for filename in os.listdir(content_image_builder.cache_folder):
-            empty_filecount += 1
+        content_image_builder.reset_licences()
+        self.assertEqual(content_image_builder.licences, {})
+        self.assertEqual(content_image_builder.serialized_licences, {})
 
-        self.assertEqual(empty_filecount, 0)
@@ -0,0 +1,192 @@
+from django_tenants.test.cases import TenantTestCase
+from django.contrib.contenttypes.models import ContentType
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.ContentImageBuilder import ContentImageBuilder, OUTPUT_FORMAT, ENCODER_PARAMS
+from app_kit.appbuilder.ContentImageCache import ContentImageCache
+
+from app_kit.tests.common import test_settings, TESTS_ROOT, LARGE_SQUARE_TEST_IMAGE_PATH
+from app_kit.models import ContentImage
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser, WithImageStore
+
+import os, json, shutil
+
+
+class TestContentImageCache(WithMetaApp, WithUser, WithMedia, WithImageStore, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.image_store = self.create_image_store(test_image_path=LARGE_SQUARE_TEST_IMAGE_PATH)
+        self.content_type = ContentType.objects.get_for_model(self.meta_app)
+
+
+    def create_content_image(self, crop_parameters=None):
+
+        content_image = ContentImage(
+            image_store = self.image_store,
+            content_type = self.content_type,
+            object_id = self.meta_app.id,
+            crop_parameters = crop_parameters,
+        )
+
+        content_image.save()
+
+        return content_image
+
+
+    @test_settings
+    def test_get_key(self):
+
+        cache = ContentImageCache()
+        self.assertTrue(cache.cache_path.startswith(TESTS_ROOT))
+
+        content_image = self.create_content_image()
+        other_content_image = self.create_content_image()
+
+        key = cache.get_key(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS)
+
+        # same source, same rendering
+        self.assertEqual(key, cache.get_key(other_content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS))
+
+        self.assertNotEqual(key, cache.get_key(content_image, 500, OUTPUT_FORMAT, ENCODER_PARAMS))
+        self.assertNotEqual(key, cache.get_key(content_image, 250, OUTPUT_FORMAT, {'quality' : 70}))
+
+        content_image.crop_parameters = json.dumps({'x' : 10, 'y' : 10, 'width' : 100, 'height' : 100})
+        self.assertNotEqual(key, cache.get_key(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS))
+
+
+    @test_settings
+    def test_render_once(self):
+
+        release_builder = AppReleaseBuilder(self.meta_app)
+        content_image_builder = ContentImageBuilder(release_builder._app_content_images_cache_path)
+
+        absolute_path = release_builder._app_content_images_path
+        relative_path = release_builder._app_relative_content_images_path
+
+        content_image = self.create_content_image()
+        content_image_builder.build_content_image(content_image, absolute_path, relative_path,
+                                                  image_sizes=['regular'])
+
+        encoded = content_image_builder.image_report['encoded']
+        self.assertTrue(encoded > 0)
+
+        cached_image = content_image_builder.get_on_disk_cached_image(content_image, 250)
+        self.assertTrue(os.path.isfile(cached_image))
+
+        # a different content image of the same image store reuses the rendered images
+        other_content_image = self.create_content_image()
+        content_image_builder.build_content_image(other_content_image, absolute_path, relative_path,
+                                                  image_sizes=['regular'])
+
+        self.assertEqual(content_image_builder.image_report['encoded'], encoded)
+        self.assertEqual(content_image_builder.image_report['copied_from_cache'], encoded)
+
+        # changed crop parameters are rendered again
+        other_content_image.crop_parameters = json.dumps({'x' : 0, 'y' : 0, 'width' : 200, 'height' : 200})
+        other_content_image.save()
+
+        self.assertIsNone(content_image_builder.get_on_disk_cached_image(other_content_image, 250))
+
+        content_image_builder.image_cache = {}
+        content_image_builder.build_content_image(other_content_image, absolute_path, relative_path,
+                                                  image_sizes=['regular'])
+
+        self.assertEqual(content_image_builder.image_report['encoded'], encoded * 2)
+
+
+    @test_settings
+    def test_evict(self):
+
+        cache = ContentImageCache()
+
+        content_image = self.create_content_image()
+        source_image_path = self.image_store.source_image.path
+        source_size = os.path.getsize(source_image_path)
+
+        filepaths = {}
+        for index, size in enumerate([250, 500, 1000]):
+            filepaths[size] = cache.put(content_image, size, OUTPUT_FORMAT, ENCODER_PARAMS, source_image_path)
+            os.utime(filepaths[size], (1000 + index, 1000 + index))
+
+        # a missing index is built from the mtimes
+        cache.written = {}
+
+        self.assertEqual(len(cache.get_entries()), 3)
+        self.assertEqual(cache.get_size(), source_size * 3)
+        self.assertTrue(os.path.isfile(cache.index_filepath))
+
+        # a hit marks the entry as recently used
+        self.assertEqual(cache.get(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS), filepaths[250])
+
+        report = cache.evict(max_bytes=source_size * 2)
+        self.assertEqual(report['evicted'], 1)
+        self.assertEqual(report['size'], source_size * 2)
+
+        self.assertFalse(os.path.isfile(filepaths[500]))
+        self.assertTrue(os.path.isfile(filepaths[250]))
+        self.assertTrue(os.path.isfile(filepaths[1000]))
+
+        # entries are read from the index, not from the mtimes
+        os.utime(filepaths[250], (1000, 1000))
+
+        other_cache = ContentImageCache()
+        other_cache.put(content_image, 2000, OUTPUT_FORMAT, ENCODER_PARAMS, source_image_path)
+
+        report = other_cache.evict(max_bytes=source_size * 2)
+        self.assertEqual(report['evicted'], 1)
+        self.assertFalse(os.path.isfile(filepaths[1000]))
+        self.assertTrue(os.path.isfile(filepaths[250]))
+
+
+    @test_settings
+    def test_stats(self):
+
+        cache = ContentImageCache()
+        content_image = self.create_content_image()
+
+        self.assertIsNone(cache.get(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS))
+        cache.put(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS, self.image_store.source_image.path)
+        self.assertIsNotNone(cache.get(content_image, 250, OUTPUT_FORMAT, ENCODER_PARAMS))
+
+        report = cache.maintain()
+        self.assertEqual(report['hits'], 1)
+        self.assertEqual(report['misses'], 1)
+        self.assertEqual(report['writes'], 1)
+        self.assertEqual(cache.stats['hits'], 0)
+
+        report = ContentImageCache().get_report()
+        self.assertEqual(report['entries'], 1)
+        self.assertEqual(report['hit_ratio'], 0.5)
+
+
+    @test_settings
+    def test_index_of_image_workers(self):
+
+        cache = ContentImageCache(cache_path=os.path.join(TESTS_ROOT, 'image_cache_workers'))
+
+        try:
+            release_builder = AppReleaseBuilder(self.meta_app)
+            content_image_builder = ContentImageBuilder(release_builder._app_content_images_cache_path,
+                                                        shared_image_cache=cache)
+            content_image_builder.defer_image_processing()
+
+            absolute_path = release_builder._app_content_images_path
+            relative_path = release_builder._app_relative_content_images_path
+
+            for crop_size in [100, 200, 300]:
+                crop_parameters = json.dumps({'x' : 0, 'y' : 0, 'width' : crop_size, 'height' : crop_size})
+                content_image_builder.build_content_image(self.create_content_image(crop_parameters),
+                                                          absolute_path, relative_path, image_sizes=['regular'])
+
+            content_image_builder.process_image_jobs(processes=2)
+
+            self.assertTrue(content_image_builder.image_report['encoded'] > 0)
+
+            # the images written by the workers are part of the index
+            cache.evict()
+            self.assertEqual(set(cache.read_index().keys()), set(cache.scan_index().keys()))
+            self.assertEqual(len(cache.read_index()), content_image_builder.image_report['encoded'])
+
+        finally:
+            shutil.rmtree(cache.cache_path, ignore_errors=True)
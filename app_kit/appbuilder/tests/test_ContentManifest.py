@@ -0,0 +1,132 @@
+from django.test import TestCase, override_settings
+
+from app_kit.tests.common import TESTS_ROOT
+from app_kit.appbuilder.ContentManifest import ContentManifest, MANIFEST_FILENAME, get_hashed_path
+from app_kit.appbuilder.JSONWriter import JSONWriter
+
+import os, shutil, json, hashlib, base64
+
+
+class TestContentManifest(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'content_manifest')
+        self.www_folder = os.path.join(self.folder, 'www')
+
+        os.makedirs(os.path.join(self.www_folder, 'localcosmos'))
+
+        self.index_html = b'<html></html>'
+        with open(os.path.join(self.www_folder, 'index.html'), 'wb') as f:
+            f.write(self.index_html)
+
+        self.json_writer = JSONWriter()
+        self.json_writer.record_written_files()
+
+        self.features_filepath = os.path.join(self.www_folder, 'localcosmos', 'features.json')
+        self.json_writer.write(self.features_filepath, {'NatureGuide' : []})
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def get_expected_entry(self, content):
+        digest = hashlib.sha256(content).digest()
+        entry = {
+            'sha256' : digest.hex(),
+            'size' : len(content),
+            'integrity' : 'sha256-{0}'.format(base64.b64encode(digest).decode()),
+        }
+        return entry
+
+
+    def read_file(self, filepath):
+        with open(filepath, 'rb') as f:
+            return f.read()
+
+
+    def test_build(self):
+
+        content_manifest = ContentManifest(self.www_folder, 2, json_writer=self.json_writer)
+        files = content_manifest.build()
+
+        self.assertEqual(list(files.keys()), ['index.html', 'localcosmos/features.json'])
+        self.assertEqual(files['index.html'], self.get_expected_entry(self.index_html))
+        self.assertEqual(files['localcosmos/features.json'],
+                         self.get_expected_entry(self.read_file(self.features_filepath)))
+
+        # the hash of features.json has been computed while writing
+        report = content_manifest.get_report()
+        self.assertEqual(report['files'], 2)
+        self.assertEqual(report['hashed'], 1)
+        self.assertEqual(report['reused'], 1)
+        self.assertFalse(report['written'])
+
+
+    def test_build_modified_file(self):
+
+        with open(self.features_filepath, 'w') as f:
+            f.write('{"changed": true}')
+
+        content_manifest = ContentManifest(self.www_folder, 2, json_writer=self.json_writer)
+        files = content_manifest.build()
+
+        self.assertEqual(content_manifest.get_report()['reused'], 0)
+        self.assertEqual(files['localcosmos/features.json'], self.get_expected_entry(b'{"changed": true}'))
+
+
+    def test_build_source_folders(self):
+
+        # the browser app is a copy of the www folder written by JSONWriter
+        browser_www_folder = os.path.join(self.folder, 'browser', 'www')
+        shutil.copytree(self.www_folder, browser_www_folder)
+
+        content_manifest = ContentManifest(browser_www_folder, 2, json_writer=self.json_writer,
+            source_folders=[self.www_folder])
+        files = content_manifest.build()
+
+        self.assertEqual(content_manifest.get_report()['reused'], 1)
+        self.assertEqual(files['localcosmos/features.json'],
+                         self.get_expected_entry(self.read_file(self.features_filepath)))
+
+
+    @override_settings(APP_KIT_CONTENT_MANIFEST=True)
+    def test_create(self):
+
+        content_manifest = ContentManifest(self.www_folder, 2, json_writer=self.json_writer)
+        report = content_manifest.create()
+
+        self.assertTrue(report['written'])
+        self.assertFalse(report['hashed_filenames'])
+
+        with open(content_manifest.manifest_filepath, 'r') as f:
+            manifest = json.load(f)
+
+        self.assertEqual(manifest['version'], 2)
+        self.assertEqual(manifest['files'], content_manifest.files)
+
+        # the manifest is not part of the manifest
+        content_manifest = ContentManifest(self.www_folder, 2)
+        files = content_manifest.build()
+        self.assertNotIn(MANIFEST_FILENAME, files)
+
+
+    @override_settings(APP_KIT_CONTENT_MANIFEST=True, APP_KIT_HASHED_FILENAMES=True)
+    def test_create_hashed_filenames(self):
+
+        content_manifest = ContentManifest(self.www_folder, 2, json_writer=self.json_writer)
+        content_manifest.create()
+
+        entry = content_manifest.files['index.html']
+        self.assertEqual(entry['hashedPath'], 'index.{0}.html'.format(entry['sha256'][:12]))
+        self.assertEqual(get_hashed_path('index.html', entry['sha256']), entry['hashedPath'])
+
+        hashed_filepath = os.path.join(self.www_folder, entry['hashedPath'])
+        self.assertEqual(self.read_file(hashed_filepath), self.index_html)
+
+        features_entry = content_manifest.files['localcosmos/features.json']
+        self.assertTrue(features_entry['hashedPath'].startswith('localcosmos/features.'))
+        self.assertTrue(os.path.isfile(os.path.join(self.www_folder, features_entry['hashedPath'])))
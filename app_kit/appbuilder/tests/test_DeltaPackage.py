@@ -0,0 +1,173 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.DeltaPackage import DeltaPackageBuilder, get_tree_manifest, compare_manifests, hash_file
+
+import os, shutil, json, zipfile, hashlib
+
+
+class WithWwwFolder:
+
+    def create_www_folder(self, folder, files):
+
+        for relative_path, content in files.items():
+
+            filepath = os.path.join(folder, relative_path)
+
+            if not os.path.isdir(os.path.dirname(filepath)):
+                os.makedirs(os.path.dirname(filepath))
+
+            with open(filepath, 'wb') as f:
+                f.write(content)
+
+
+class TestManifests(WithWwwFolder, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'delta_manifests')
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def test_get_tree_manifest(self):
+
+        files = {
+            'index.html' : b'<html></html>',
+            'localcosmos/features.json' : b'{}',
+        }
+
+        self.create_www_folder(self.folder, files)
+
+        manifest = get_tree_manifest(self.folder)
+
+        self.assertEqual(set(manifest.keys()), set(files.keys()))
+
+        for relative_path, content in files.items():
+            self.assertEqual(manifest[relative_path]['size'], len(content))
+            self.assertEqual(manifest[relative_path]['sha256'], hashlib.sha256(content).hexdigest())
+            self.assertEqual(hash_file(os.path.join(self.folder, relative_path)),
+                             hashlib.sha256(content).hexdigest())
+
+
+    def test_compare_manifests(self):
+
+        previous_files = {
+            'index.html' : {'sha256' : 'a', 'size' : 1},
+            'profile.json' : {'sha256' : 'b', 'size' : 1},
+            'removed.json' : {'sha256' : 'c', 'size' : 1},
+        }
+
+        files = {
+            'index.html' : {'sha256' : 'a', 'size' : 1},
+            'profile.json' : {'sha256' : 'd', 'size' : 2},
+            'added.json' : {'sha256' : 'e', 'size' : 3},
+        }
+
+        delta = compare_manifests(previous_files, files)
+
+        self.assertEqual(delta['added'], {'added.json' : files['added.json']})
+        self.assertEqual(delta['changed'], {'profile.json' : files['profile.json']})
+        self.assertEqual(delta['removed'], ['removed.json'])
+
+
+class TestDeltaPackageBuilder(WithWwwFolder, WithMetaApp, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.meta_app.published_version = 1
+        self.meta_app.current_version = 2
+        self.meta_app.save()
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+        self.www_folder = os.path.join(TESTS_ROOT, 'delta_www')
+
+
+    def tearDown(self):
+        if os.path.isdir(self.www_folder):
+            shutil.rmtree(self.www_folder)
+        super().tearDown()
+
+
+    @test_settings
+    def test_create_without_published_version(self):
+
+        self.meta_app.published_version = None
+        self.meta_app.save()
+
+        self.create_www_folder(self.www_folder, {'index.html' : b'<html></html>'})
+
+        delta_package_builder = DeltaPackageBuilder(self.release_builder)
+        report = delta_package_builder.create(self.www_folder)
+
+        self.assertTrue(delta_package_builder.get_delta_path().startswith(TESTS_ROOT))
+        self.assertTrue(os.path.isfile(delta_package_builder.get_manifest_filepath()))
+        self.assertFalse(os.path.isfile(delta_package_builder.delta_package_filepath))
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(report['added'], 0)
+
+
+    @test_settings
+    def test_create(self):
+
+        previous_files = {
+            'index.html' : b'<html></html>',
+            'localcosmos/profile.json' : b'{"text" : "old"}',
+            'localcosmos/removed.json' : b'{}',
+        }
+
+        previous_www_folder = os.path.join(self.www_folder, 'previous')
+        self.create_www_folder(previous_www_folder, previous_files)
+
+        delta_package_builder = DeltaPackageBuilder(self.release_builder)
+
+        # the manifest written by the build of the published version
+        previous_manifest_filepath = delta_package_builder.get_manifest_filepath(1)
+        os.makedirs(os.path.dirname(previous_manifest_filepath))
+        with open(previous_manifest_filepath, 'w') as f:
+            json.dump({'version' : 1, 'files' : get_tree_manifest(previous_www_folder)}, f)
+
+        files = {
+            'index.html' : b'<html></html>',
+            'localcosmos/profile.json' : b'{"text" : "new"}',
+            'localcosmos/added.json' : b'{}',
+        }
+
+        current_www_folder = os.path.join(self.www_folder, 'current')
+        self.create_www_folder(current_www_folder, files)
+
+        report = delta_package_builder.create(current_www_folder)
+
+        self.assertEqual(report['files'], 3)
+        self.assertEqual(report['added'], 1)
+        self.assertEqual(report['changed'], 1)
+        self.assertEqual(report['removed'], 1)
+        self.assertEqual(report['previous_version'], 1)
+        self.assertEqual(report['version'], 2)
+        self.assertEqual(report['delta_bytes'], len(files['localcosmos/profile.json']) + 2)
+        self.assertEqual(report['package_bytes'], os.path.getsize(delta_package_builder.delta_package_filepath))
+
+        with zipfile.ZipFile(delta_package_builder.delta_package_filepath, 'r') as delta_zip:
+
+            self.assertEqual(delta_zip.namelist(), ['delta.json', 'www/localcosmos/added.json',
+                                                    'www/localcosmos/profile.json'])
+
+            delta = json.loads(delta_zip.read('delta.json'))
+            self.assertEqual(delta['fromVersion'], 1)
+            self.assertEqual(delta['toVersion'], 2)
+            self.assertEqual(delta['removed'], ['localcosmos/removed.json'])
+            self.assertEqual(delta_zip.read('www/localcosmos/profile.json'), files['localcosmos/profile.json'])
+
+        with open(delta_package_builder.get_manifest_filepath(), 'r') as f:
+            manifest = json.load(f)
+
+        self.assertEqual(manifest['version'], 2)
+        self.assertEqual(manifest['files'], get_tree_manifest(current_www_folder))
@@ -0,0 +1,217 @@
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+
+from app_kit.tests.common import test_settings
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.BuildCache import FeatureBuildCache
+from app_kit.appbuilder.FeatureBuildScheduler import FeatureBuildScheduler, get_taxon_slug_assignments
+
+from app_kit.features.glossary.models import Glossary
+from app_kit.features.backbonetaxonomy.models import BackboneTaxonomy
+from app_kit.features.generic_forms.models import GenericForm
+from app_kit.features.nature_guides.models import NatureGuide
+from app_kit.features.maps.models import Map
+
+import os, copy, uuid, logging
+
+
+class HomonymTaxon:
+
+    def __init__(self):
+        self.taxon_latname = 'Lacerta agilis'
+        self.name_uuid = uuid.uuid4()
+
+
+class TestFeatureBuildScheduler(WithMetaApp, WithUser, WithMedia, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_all_generic_contents(self.meta_app)
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+
+        self.release_builder.build_features = {}
+        self.release_builder.licence_registry = {'licences' : {}}
+        self.release_builder.taxon_slugs = {'taxon_latname' : {}, 'vernacular' : {}}
+        self.release_builder.app_settings = {}
+        self.release_builder.aggregated_node_filter_space_cache = {}
+        self.release_builder.inactivated_nuids = set([])
+        self.release_builder.feature_build_cache = FeatureBuildCache(self.release_builder)
+        self.release_builder.logger = logging.getLogger(__name__)
+
+
+    @test_settings
+    def test_build_sequential(self):
+
+        scheduler = FeatureBuildScheduler(self.release_builder)
+        self.assertEqual(scheduler.processes, 1)
+
+        built = []
+        def build_method(app_generic_content):
+            built.append(app_generic_content)
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        backbone_taxonomy_link = self.get_generic_content_link(BackboneTaxonomy)
+        nature_guide_link = self.get_generic_content_link(NatureGuide)
+
+        feature_links = [
+            (glossary_link, build_method),
+            (backbone_taxonomy_link, build_method),
+            (nature_guide_link, build_method),
+        ]
+
+        scheduler.build(feature_links)
+
+        # the backbone taxonomy assigns the taxon slugs before all other features
+        self.assertEqual(built, [glossary_link, backbone_taxonomy_link, nature_guide_link])
+        self.assertEqual(len(scheduler.get_report()['main_process']), 3)
+        self.assertEqual(scheduler.get_report()['workers'], [])
+
+
+    @test_settings
+    def test_get_schedule(self):
+
+        scheduler = FeatureBuildScheduler(self.release_builder)
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        backbone_taxonomy_link = self.get_generic_content_link(BackboneTaxonomy)
+        nature_guide_link = self.get_generic_content_link(NatureGuide)
+        generic_form_link = self.get_generic_content_link(GenericForm)
+
+        feature_links = [(link, None) for link in [backbone_taxonomy_link, nature_guide_link, glossary_link,
+                                                   generic_form_link]]
+
+        schedule = scheduler.get_schedule(feature_links)
+
+        self.assertEqual([[link for link, method in stage] for stage in schedule],
+                         [[backbone_taxonomy_link, glossary_link], [nature_guide_link, generic_form_link], []])
+
+
+    @test_settings
+    @override_settings(APP_KIT_BUILD_PROCESSES=4)
+    def test_run_in_worker(self):
+
+        scheduler = FeatureBuildScheduler(self.release_builder)
+        feature_build_cache = self.release_builder.feature_build_cache
+
+        nature_guide_link = self.get_generic_content_link(NatureGuide)
+        self.assertTrue(scheduler.run_in_worker(nature_guide_link, feature_build_cache))
+
+        # the glossary and the backbone taxonomy are built before all other features
+        for generic_content_class in [Glossary, BackboneTaxonomy]:
+            link = self.get_generic_content_link(generic_content_class)
+            self.assertFalse(scheduler.run_in_worker(link, feature_build_cache))
+
+        generic_form_link = self.get_generic_content_link(GenericForm)
+        self.assertFalse(scheduler.run_in_worker(generic_form_link, feature_build_cache))
+
+
+    @test_settings
+    def test_merge(self):
+
+        scheduler = FeatureBuildScheduler(self.release_builder)
+        glossary_link = self.get_generic_content_link(Glossary)
+
+        relative_filepath = os.path.join('localcosmos', 'features', 'Glossary', 'test.json')
+        worker_filepath = os.path.join(scheduler.get_worker_www_path(glossary_link), relative_filepath)
+        os.makedirs(os.path.dirname(worker_filepath), exist_ok=True)
+
+        with open(worker_filepath, 'w') as f:
+            f.write('{}')
+
+        record = {
+            'files' : [relative_filepath],
+            'deltas' : {
+                'build_features' : [[['Glossary'], 'set', {'path' : '/test.json'}]],
+                'inactivated_nuids' : [[[], 'update', ['001']]],
+            },
+            'locale_additions' : [],
+            'image_licences' : {},
+        }
+
+        self.assertTrue(scheduler.merge(glossary_link, record))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.release_builder._app_www_path, relative_filepath)))
+        self.assertFalse(os.path.isfile(worker_filepath))
+        self.assertEqual(self.release_builder.build_features['Glossary'], {'path' : '/test.json'})
+        self.assertEqual(self.release_builder.inactivated_nuids, set(['001']))
+
+
+    def test_get_taxon_slug_assignments(self):
+
+        delta = [
+            [['taxon_latname', 'lacerta-agilis'], 'set', '1'],
+            [['vernacular', 'de'], 'set', {'zauneidechse' : '1', 'waldeidechse' : '2'}],
+        ]
+
+        self.assertEqual(get_taxon_slug_assignments(delta), [
+            [['taxon_latname', 'lacerta-agilis'], '1'],
+            [['vernacular', 'de', 'zauneidechse'], '1'],
+            [['vernacular', 'de', 'waldeidechse'], '2'],
+        ])
+
+
+    @test_settings
+    def test_homonym_taxon_slugs(self):
+
+        taxa = [HomonymTaxon() for index in range(3)]
+
+        def get_build_method(feature_taxa):
+            def build_method(app_generic_content):
+                for taxon in feature_taxa:
+                    self.release_builder._build_taxon_latname_slug(taxon)
+            return build_method
+
+        glossary_link = self.get_generic_content_link(Glossary)
+        backbone_taxonomy_link = self.get_generic_content_link(BackboneTaxonomy)
+        nature_guide_link = self.get_generic_content_link(NatureGuide)
+        map_link = self.get_generic_content_link(Map)
+
+        feature_links = [
+            (glossary_link, get_build_method([])),
+            (backbone_taxonomy_link, get_build_method([taxa[0]])),
+            (nature_guide_link, get_build_method([taxa[1], taxa[0]])),
+            (map_link, get_build_method([taxa[2]])),
+        ]
+
+        # the order of the baseline: glossary, backbone taxonomy, then the other features
+        expected_slugs = {
+            'lacerta-agilis' : str(taxa[0].name_uuid),
+            'lacerta-agilis-2' : str(taxa[1].name_uuid),
+            'lacerta-agilis-3' : str(taxa[2].name_uuid),
+        }
+
+        scheduler = FeatureBuildScheduler(self.release_builder)
+        scheduler.build(feature_links)
+
+        self.assertEqual(self.release_builder.taxon_slugs['taxon_latname'], expected_slugs)
+
+        # parallel: both workers start from the state after the first stage
+        self.release_builder.taxon_slugs = {'taxon_latname' : {}, 'vernacular' : {}}
+        scheduler = FeatureBuildScheduler(self.release_builder)
+
+        first_links, independent_links, last_links = scheduler.get_schedule(feature_links)
+        for link, build_method in first_links:
+            scheduler.build_in_main_process(link, build_method)
+
+        forked_taxon_slugs = copy.deepcopy(self.release_builder.taxon_slugs)
+        feature_build_cache = self.release_builder.feature_build_cache
+
+        results = []
+        for link, build_method in independent_links:
+            main_taxon_slugs = self.release_builder.taxon_slugs
+            self.release_builder.taxon_slugs = copy.deepcopy(forked_taxon_slugs)
+            record = feature_build_cache.record(link, build_method)
+            self.release_builder.taxon_slugs = main_taxon_slugs
+            results.append((link, build_method, (record, {}, {'accessed' : {}, 'written' : {}}, [])))
+
+        for link, build_method, result in results:
+            scheduler.add_worker_result(link, build_method, result)
+
+        self.assertEqual(self.release_builder.taxon_slugs['taxon_latname'], expected_slugs)
+
+        # the map worker assigned lacerta-agilis-2 to another taxon
+        self.assertEqual(scheduler.get_report()['workers'], [feature_build_cache.get_report_entry(nature_guide_link)])
+        self.assertEqual(scheduler.get_report()['main_process'][-1], feature_build_cache.get_report_entry(map_link))
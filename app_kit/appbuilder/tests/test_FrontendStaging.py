@@ -0,0 +1,148 @@
+from django.test import TestCase
+
+from app_kit.tests.common import TESTS_ROOT
+from app_kit.appbuilder.FrontendStaging import FrontendStaging, break_link
+from app_kit.appbuilder.JSONWriter import JSONWriter
+
+import os, shutil, json
+
+
+class TestFrontendStaging(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'frontend_staging')
+        self.source_folder = os.path.join(self.folder, 'frontend', 'www')
+        self.target_folder = os.path.join(self.folder, 'build', 'www')
+
+        os.makedirs(os.path.join(self.source_folder, 'js'))
+        os.makedirs(os.path.join(self.source_folder, 'locales', 'en'))
+
+        self.files = {
+            'index.html' : '<html></html>',
+            'js/app.js' : 'var app = {};',
+            'settings.json' : '{}',
+            'locales/en/plain.json' : '{"welcome": "Welcome"}',
+        }
+
+        for relative_path, content in self.files.items():
+            with open(os.path.join(self.source_folder, relative_path), 'w') as source_file:
+                source_file.write(content)
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def is_linked(self, relative_path):
+        source_stat = os.stat(os.path.join(self.source_folder, relative_path))
+        target_stat = os.stat(os.path.join(self.target_folder, relative_path))
+        return source_stat.st_ino == target_stat.st_ino
+
+
+    def read_source_file(self, relative_path):
+        with open(os.path.join(self.source_folder, relative_path), 'r') as source_file:
+            return source_file.read()
+
+
+    def test_copy(self):
+
+        staging = FrontendStaging(self.source_folder, self.target_folder, mode='copy')
+        report = staging.stage()
+
+        self.assertEqual(report['files'], 4)
+        self.assertEqual(report['copied'], 2)
+        self.assertEqual(report['materialized'], 2)
+        self.assertEqual(report['linked'], 0)
+
+        for relative_path, content in self.files.items():
+            with open(os.path.join(self.target_folder, relative_path), 'r') as target_file:
+                self.assertEqual(target_file.read(), content)
+            self.assertFalse(self.is_linked(relative_path))
+
+
+    def test_hardlink(self):
+
+        staging = FrontendStaging(self.source_folder, self.target_folder, mode='hardlink')
+        report = staging.stage()
+
+        self.assertEqual(report['files'], 4)
+        self.assertEqual(report['linked'], 2)
+        self.assertEqual(report['materialized'], 2)
+
+        self.assertTrue(self.is_linked('index.html'))
+        self.assertTrue(self.is_linked('js/app.js'))
+        self.assertFalse(self.is_linked('settings.json'))
+        self.assertFalse(self.is_linked('locales/en/plain.json'))
+
+        # rewritten files do not alter the frontend
+        with open(os.path.join(self.target_folder, 'settings.json'), 'w') as settings_file:
+            settings_file.write('{"name": "Test App"}')
+
+        self.assertEqual(self.read_source_file('settings.json'), '{}')
+
+        json_writer = JSONWriter()
+        json_writer.write(os.path.join(self.target_folder, 'js', 'app.js'), {'rewritten' : True})
+
+        self.assertFalse(self.is_linked('js/app.js'))
+        self.assertEqual(self.read_source_file('js/app.js'), 'var app = {};')
+
+        with open(os.path.join(self.target_folder, 'js', 'app.js'), 'r') as target_file:
+            self.assertEqual(json.loads(target_file.read()), {'rewritten' : True})
+
+        # staging again replaces the existing build files without writing through them
+        report = staging.stage()
+        self.assertTrue(self.is_linked('js/app.js'))
+        self.assertEqual(self.read_source_file('settings.json'), '{}')
+
+
+    def test_hardlink_fallback(self):
+
+        staging = FrontendStaging(self.source_folder, self.target_folder, mode='hardlink')
+
+        def link(source_filepath, target_filepath):
+            raise OSError('Invalid cross-device link')
+
+        staging.link = link
+        report = staging.stage()
+
+        self.assertEqual(report['linked'], 0)
+        self.assertEqual(report['copied'], 2)
+        self.assertFalse(staging.link_supported)
+        self.assertFalse(self.is_linked('index.html'))
+
+
+    def test_reflink(self):
+
+        # falls back to copying on filesystems without reflinks
+        staging = FrontendStaging(self.source_folder, self.target_folder, mode='reflink')
+        report = staging.stage()
+
+        self.assertEqual(report['linked'] + report['copied'], 2)
+
+        for relative_path, content in self.files.items():
+            with open(os.path.join(self.target_folder, relative_path), 'r') as target_file:
+                self.assertEqual(target_file.read(), content)
+
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            FrontendStaging(self.source_folder, self.target_folder, mode='symlink')
+
+
+    def test_break_link(self):
+
+        source_filepath = os.path.join(self.source_folder, 'index.html')
+        linked_filepath = os.path.join(self.folder, 'index.html')
+        os.link(source_filepath, linked_filepath)
+
+        break_link(linked_filepath)
+
+        self.assertFalse(os.path.exists(linked_filepath))
+        self.assertTrue(os.path.isfile(source_filepath))
+
+        # unlinked files are kept
+        break_link(source_filepath)
+        self.assertTrue(os.path.isfile(source_filepath))
@@ -0,0 +1,149 @@
+from django.test import TestCase, override_settings
+
+from app_kit.tests.common import TESTS_ROOT
+from app_kit.appbuilder.JSONWriter import JSONWriter
+
+import os, json, gzip, shutil
+
+
+class TestJSONWriter(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'json_writer')
+        os.makedirs(self.folder, exist_ok=True)
+
+        self.data = {
+            'name' : 'Überblick',
+            'list' : [1, 2, 3],
+        }
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def test_write(self):
+
+        writer = JSONWriter()
+        self.assertFalse(writer.minify)
+
+        filepath = os.path.join(self.folder, 'test.json')
+        writer.write(filepath, self.data)
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        self.assertEqual(content, json.dumps(self.data, indent=4, ensure_ascii=False))
+
+        self.assertEqual(writer.files_written, 1)
+        self.assertEqual(writer.bytes_written, len(content.encode('utf-8')))
+
+
+    @override_settings(APP_KIT_MINIFY_JSON=True)
+    def test_write_minified(self):
+
+        writer = JSONWriter()
+        self.assertTrue(writer.minify)
+
+        filepath = os.path.join(self.folder, 'test.json')
+        writer.write(filepath, self.data)
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        self.assertNotIn(' ', content.replace('Überblick', ''))
+        self.assertEqual(json.loads(content), self.data)
+
+
+    @override_settings(APP_KIT_MINIFY_JSON=True, APP_KIT_PRECOMPRESS_JSON=True)
+    def test_compress_folder(self):
+
+        writer = JSONWriter()
+
+        filepath = os.path.join(self.folder, 'test.json')
+        writer.write(filepath, self.data)
+
+        report = writer.compress_folder(self.folder)
+
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(report['bytes'], os.path.getsize(filepath))
+        self.assertTrue(report['indented_bytes'] > report['bytes'])
+
+        gzip_filepath = '{0}.gz'.format(filepath)
+        self.assertTrue(os.path.isfile(gzip_filepath))
+        self.assertEqual(report['gzip_bytes'], os.path.getsize(gzip_filepath))
+
+        with open(gzip_filepath, 'rb') as f:
+            self.assertEqual(json.loads(gzip.decompress(f.read())), self.data)
+
+        # the output does not depend on the time of the build
+        with open(gzip_filepath, 'rb') as f:
+            gzip_content = f.read()
+
+        writer.compress_folder(self.folder)
+
+        with open(gzip_filepath, 'rb') as f:
+            self.assertEqual(f.read(), gzip_content)
+
+
+    @override_settings(APP_KIT_MINIFY_JSON=False, APP_KIT_PRECOMPRESS_JSON=False)
+    def test_compress_folder_disabled(self):
+
+        writer = JSONWriter()
+        writer.write(os.path.join(self.folder, 'test.json'), self.data)
+
+        report = writer.compress_folder(self.folder)
+
+        self.assertEqual(report['files'], 0)
+        self.assertNotIn('indented_bytes', report)
+        self.assertEqual(os.listdir(self.folder), ['test.json'])
+
+
+    @override_settings(APP_KIT_PRECOMPRESS_JSON=True)
+    def test_compress_folder_without_minify(self):
+
+        writer = JSONWriter()
+        writer.write(os.path.join(self.folder, 'test.json'), self.data)
+
+        report = writer.compress_folder(self.folder)
+
+        self.assertEqual(report['files'], 1)
+        self.assertNotIn('indented_bytes', report)
+
+
+    def test_open_array(self):
+
+        items = [self.data, {'text' : 'line\nbreak'}, []]
+
+        for minify in [False, True]:
+
+            writer = JSONWriter()
+            writer.minify = minify
+            writer.record_written_files()
+
+            filepath = os.path.join(self.folder, 'written.json')
+            writer.write(filepath, items)
+
+            streamed_filepath = os.path.join(self.folder, 'streamed.json')
+            array_stream = writer.open_array(streamed_filepath)
+            for item in items:
+                array_stream.append(item)
+            array_stream.close()
+
+            with open(filepath, 'rb') as f:
+                content = f.read()
+
+            with open(streamed_filepath, 'rb') as f:
+                self.assertEqual(f.read(), content)
+
+            self.assertEqual(writer.written_files[os.path.normpath(streamed_filepath)][:2],
+                             writer.written_files[os.path.normpath(filepath)][:2])
+
+        # empty arrays
+        array_stream = writer.open_array(streamed_filepath)
+        array_stream.close()
+
+        with open(streamed_filepath, 'r') as f:
+            self.assertEqual(json.load(f), [])
@@ -0,0 +1,74 @@
+from django.test import TestCase
+
+from app_kit.tests.common import TESTS_ROOT
+from app_kit.appbuilder.LocaleStore import LocaleStore
+
+import os, json, shutil
+
+
+class TestLocaleStore(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'locale_store')
+        os.makedirs(self.folder, exist_ok=True)
+
+        self.filepath = os.path.join(self.folder, 'plain.json')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def write_locale(self, locale):
+        with open(self.filepath, 'w') as locale_file:
+            locale_file.write(json.dumps(locale))
+
+
+    def test_load(self):
+
+        locale_store = LocaleStore()
+
+        self.assertEqual(locale_store.load(self.filepath), {})
+
+        self.write_locale({'Key' : 'Value'})
+
+        locale = locale_store.load(self.filepath)
+        self.assertEqual(locale, {'Key' : 'Value'})
+
+        # the parsed locale is reused
+        self.assertIs(locale_store.load(self.filepath), locale)
+
+        # files changed by other writers are parsed again
+        self.write_locale({'Key' : 'Value', 'Other key' : 'Other value'})
+
+        locale = locale_store.load(self.filepath)
+        self.assertEqual(locale, {'Key' : 'Value', 'Other key' : 'Other value'})
+
+
+    def test_write(self):
+
+        locale_store = LocaleStore()
+
+        locale = {'Key' : 'Value'}
+        locale_store.write(self.filepath, locale)
+
+        with open(self.filepath, 'r') as locale_file:
+            self.assertEqual(json.load(locale_file), locale)
+
+        self.assertIs(locale_store.load(self.filepath), locale)
+
+
+    def test_remember(self):
+
+        locale_store = LocaleStore()
+
+        locale = {'Key' : 'Value'}
+        self.write_locale(locale)
+
+        locale_store.remember(self.filepath, locale)
+        self.assertIs(locale_store.load(self.filepath), locale)
+
+        locale_store.clear()
+        self.assertIsNot(locale_store.load(self.filepath), locale)
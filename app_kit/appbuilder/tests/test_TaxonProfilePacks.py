@@ -0,0 +1,83 @@
+from django.test import TestCase, override_settings
+
+from app_kit.tests.common import TESTS_ROOT
+from app_kit.appbuilder.JSONWriter import JSONWriter
+from app_kit.appbuilder.TaxonProfilePacks import TaxonProfilePackWriter, get_pack_name
+
+import os, json, shutil, types
+
+
+class TestTaxonProfilePackWriter(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'taxon_profile_packs')
+
+        self.lacerta_agilis = types.SimpleNamespace(taxon_source='taxonomy.sources.col',
+            taxon_latname='Lacerta agilis', name_uuid='2a4f6a4c-5f8a-4c3b-8f1c-3c6f1a0b2d11')
+        self.larus_fuscus = types.SimpleNamespace(taxon_source='taxonomy.sources.col',
+            taxon_latname='Larus fuscus', name_uuid='5b1c0e3d-8e4a-4f6b-9a2d-7d8e9f0a1b22')
+        self.bufo_bufo = types.SimpleNamespace(taxon_source='taxonomy.sources.col',
+            taxon_latname='Bufo bufo', name_uuid='1541aa08-7c23-4de0-9898-80d87e9227b3')
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def test_get_pack_name(self):
+        self.assertEqual(get_pack_name('Lacerta agilis'), 'L')
+        self.assertEqual(get_pack_name('lacerta agilis'), 'L')
+        self.assertEqual(get_pack_name('×Festulolium'), '_')
+        self.assertEqual(get_pack_name(None), '_')
+
+
+    def test_is_enabled(self):
+        self.assertFalse(TaxonProfilePackWriter.is_enabled())
+
+        with override_settings(APP_KIT_TAXON_PROFILE_PACKS=True):
+            self.assertTrue(TaxonProfilePackWriter.is_enabled())
+
+
+    def test_add_and_close(self):
+
+        writer = TaxonProfilePackWriter(self.folder, 'features/TaxonProfiles/1/packs/en', JSONWriter())
+
+        profiles = {
+            self.lacerta_agilis.name_uuid : {'taxonLatname' : 'Lacerta agilis', 'vernacular' : 'Zauneidechse'},
+            self.larus_fuscus.name_uuid : {'taxonLatname' : 'Larus fuscus', 'vernacular' : 'Heringsmöwe'},
+            self.bufo_bufo.name_uuid : {'taxonLatname' : 'Bufo bufo', 'vernacular' : 'Erdkröte'},
+        }
+
+        for taxon in [self.lacerta_agilis, self.larus_fuscus, self.bufo_bufo]:
+            writer.add(taxon, taxon.name_uuid, profiles[taxon.name_uuid])
+
+        index_path = writer.close()
+        self.assertEqual(index_path, '/features/TaxonProfiles/1/packs/en/index.json')
+
+        with open(os.path.join(self.folder, 'index.json'), 'r') as index_file:
+            index = json.load(index_file)
+
+        self.assertEqual(index['packs'], {
+            'L' : '/features/TaxonProfiles/1/packs/en/L.ndjson',
+            'B' : '/features/TaxonProfiles/1/packs/en/B.ndjson',
+        })
+
+        # each profile can be read by its byte range
+        for name_uuid, profile in profiles.items():
+
+            pack_name, offset, length = index['profiles']['taxonomy.sources.col'][name_uuid]
+
+            with open(os.path.join(self.folder, '{0}.ndjson'.format(pack_name)), 'rb') as pack_file:
+                pack_file.seek(offset)
+                content = pack_file.read(length)
+
+            self.assertEqual(json.loads(content.decode('utf-8')), profile)
+
+        # a pack can be read as a whole, one profile per line
+        with open(os.path.join(self.folder, 'L.ndjson'), 'r', encoding='utf-8') as pack_file:
+            pack = [json.loads(line) for line in pack_file]
+
+        self.assertEqual(pack, [profiles[self.lacerta_agilis.name_uuid], profiles[self.larus_fuscus.name_uuid]])
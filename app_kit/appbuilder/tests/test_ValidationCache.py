@@ -0,0 +1,113 @@
+from django_tenants.test.cases import TenantTestCase
+from django.test import override_settings
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp, WithMedia, WithUser
+
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.ValidationCache import (FeatureValidationCache, CachedValidationError,
+    CachedValidationWarning, UNCACHED_FEATURES)
+
+from app_kit.models import MetaAppGenericContent
+from app_kit.features.generic_forms.models import GenericForm
+from app_kit.features.glossary.models import Glossary, GlossaryEntry
+
+import os
+
+
+class TestFeatureValidationCache(WithMetaApp, WithUser, WithMedia, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_all_generic_contents(self.meta_app)
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+
+
+    def get_feature_links(self):
+        feature_links = MetaAppGenericContent.objects.filter(meta_app=self.meta_app).order_by('pk')
+        return [feature_link for feature_link in feature_links if feature_link.publication_status == 'publish']
+
+
+    def get_result_counts(self, results):
+        return [[len(result['errors']), len(result['warnings'])] for result in results]
+
+
+    @test_settings
+    def test_disabled(self):
+
+        feature_links = self.get_feature_links()
+
+        cache = FeatureValidationCache(self.release_builder)
+        self.assertFalse(cache.enabled)
+        self.assertTrue(cache.cache_path.startswith(TESTS_ROOT))
+
+        results = cache.validate(feature_links)
+
+        self.assertEqual(len(results), len(feature_links))
+        self.assertEqual(len(cache.get_report()['validated']), len(feature_links))
+        self.assertEqual(cache.get_report()['cached'], [])
+        self.assertFalse(os.path.isfile(cache.records_filepath))
+
+        expected_results = [self.release_builder._validate_feature(link.generic_content)
+                            for link in feature_links]
+        self.assertEqual(self.get_result_counts(results), self.get_result_counts(expected_results))
+
+
+    @test_settings
+    @override_settings(APP_KIT_VALIDATION_CACHE=True)
+    def test_validate(self):
+
+        feature_links = self.get_feature_links()
+
+        cache = FeatureValidationCache(self.release_builder)
+        results = cache.validate(feature_links)
+
+        self.assertEqual(len(cache.get_report()['validated']), len(feature_links))
+        self.assertTrue(os.path.isfile(cache.records_filepath))
+
+        # nothing changed, only the frontend is validated again
+        cache = FeatureValidationCache(self.release_builder)
+        cached_results = cache.validate(feature_links)
+
+        report = cache.get_report()
+        for entry in report['validated']:
+            self.assertIn(entry['type'], UNCACHED_FEATURES)
+        self.assertTrue(len(report['cached']) > 0)
+        self.assertEqual(len(report['cached']) + len(report['validated']), len(feature_links))
+
+        self.assertEqual(self.get_result_counts(cached_results), self.get_result_counts(results))
+
+        for link, result, cached_result in zip(feature_links, results, cached_results):
+
+            if link.generic_content.__class__.__name__ in UNCACHED_FEATURES:
+                continue
+
+            for error, cached_error in zip(result['errors'], cached_result['errors']):
+                dumped_error = cached_error.dump()
+                self.assertTrue(dumped_error.pop('cached'))
+                self.assertEqual(dumped_error, error.dump())
+
+        generic_form_link = self.get_generic_content_link(GenericForm)
+        generic_form_index = feature_links.index(generic_form_link)
+        for error in cached_results[generic_form_index]['errors']:
+            self.assertTrue(isinstance(error, CachedValidationError))
+        for warning in cached_results[generic_form_index]['warnings']:
+            self.assertTrue(isinstance(warning, CachedValidationWarning))
+
+        # a changed glossary is validated again
+        glossary = self.get_generic_content_link(Glossary).generic_content
+
+        entry = GlossaryEntry(
+            glossary=glossary,
+            term='Test term',
+            definition='Test definition',
+        )
+        entry.save()
+
+        cache = FeatureValidationCache(self.release_builder)
+        cache.validate(feature_links)
+
+        validated_types = [entry['type'] for entry in cache.get_report()['validated']]
+        self.assertIn('Glossary', validated_types)
+        self.assertNotIn('GenericForm', validated_types)
@@ -0,0 +1,154 @@
+from django.test import TestCase
+from django_tenants.test.cases import TenantTestCase
+
+from app_kit.tests.common import test_settings, TESTS_ROOT
+from app_kit.tests.mixins import WithMetaApp
+from app_kit.appbuilder import AppReleaseBuilder
+from app_kit.appbuilder.ZipArchiver import ZipArchiver, is_compressed_media
+
+import os, shutil, zipfile, logging
+
+
+class TestZipArchiver(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.folder = os.path.join(TESTS_ROOT, 'zip_archiver')
+        self.source_folder = os.path.join(self.folder, 'www')
+        self.zip_filepath = os.path.join(self.folder, 'www.zip')
+
+        os.makedirs(os.path.join(self.source_folder, 'features', 'TaxonProfiles'))
+        os.makedirs(os.path.join(self.source_folder, 'img'))
+
+        self.files = {
+            'index.html' : b'<html></html>' * 100,
+            'features/TaxonProfiles/profile.json' : b'{"taxonLatname":"Lacerta agilis"}' * 100,
+            'img/lacerta.webp' : os.urandom(2048),
+        }
+
+        for relative_path, content in self.files.items():
+            self.write_file(relative_path, content)
+
+
+    def tearDown(self):
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+        super().tearDown()
+
+
+    def write_file(self, relative_path, content):
+        with open(os.path.join(self.source_folder, relative_path), 'wb') as source_file:
+            source_file.write(content)
+
+
+    def read_archive(self):
+        with open(self.zip_filepath, 'rb') as zip_file:
+            return zip_file.read()
+
+
+    def test_is_compressed_media(self):
+        self.assertTrue(is_compressed_media('img/lacerta.webp'))
+        self.assertTrue(is_compressed_media('img/lacerta.JPG'))
+        self.assertFalse(is_compressed_media('index.html'))
+        self.assertFalse(is_compressed_media('profile.json'))
+
+
+    def test_create(self):
+
+        report = ZipArchiver(self.zip_filepath, threads=2).create(self.source_folder, prefix='www')
+
+        self.assertEqual(report['files'], 3)
+        self.assertEqual(report['stored'], 1)
+        self.assertEqual(report['deflated'], 2)
+        self.assertEqual(report['reused'], 0)
+
+        with zipfile.ZipFile(self.zip_filepath, 'r') as zip_file:
+
+            self.assertIsNone(zip_file.testzip())
+
+            self.assertEqual(zip_file.namelist(), ['www/index.html', 'www/features/TaxonProfiles/profile.json',
+                                                   'www/img/lacerta.webp'])
+
+            self.assertEqual(zip_file.getinfo('www/img/lacerta.webp').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zip_file.getinfo('www/index.html').compress_type, zipfile.ZIP_DEFLATED)
+
+            for relative_path, content in self.files.items():
+                self.assertEqual(zip_file.read('www/{0}'.format(relative_path)), content)
+
+        self.assertFalse(os.path.isfile('{0}.tmp'.format(self.zip_filepath)))
+
+
+    def test_create_reuses_unchanged_entries(self):
+
+        ZipArchiver(self.zip_filepath).create(self.source_folder)
+        archive = self.read_archive()
+
+        # identical input, byte-identical archive
+        report = ZipArchiver(self.zip_filepath, threads=1).create(self.source_folder)
+        self.assertEqual(report['reused'], 2)
+        self.assertEqual(self.read_archive(), archive)
+
+        changed_content = b'<html><body></body></html>' * 100
+        self.write_file('index.html', changed_content)
+
+        report = ZipArchiver(self.zip_filepath).create(self.source_folder)
+        self.assertEqual(report['reused'], 1)
+
+        with zipfile.ZipFile(self.zip_filepath, 'r') as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.read('index.html'), changed_content)
+            self.assertEqual(zip_file.read('features/TaxonProfiles/profile.json'),
+                             self.files['features/TaxonProfiles/profile.json'])
+
+
+class TestPreviousArchives(WithMetaApp, TenantTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.meta_app.build_number = 1
+        self.meta_app.save()
+
+        self.release_builder = AppReleaseBuilder(self.meta_app)
+        self.release_builder.logger = logging.getLogger(__name__)
+
+
+    def tearDown(self):
+        with test_settings:
+            app_version_root_path = self.release_builder._app_version_root_path
+            if os.path.isdir(app_version_root_path):
+                shutil.rmtree(app_version_root_path)
+        super().tearDown()
+
+
+    def create_sources(self):
+
+        www_path = self.release_builder._app_www_path
+        os.makedirs(www_path)
+
+        with open(os.path.join(www_path, 'index.html'), 'wb') as f:
+            f.write(b'<html></html>' * 100)
+
+        os.makedirs(self.release_builder._app_build_jobs_path)
+
+
+    @test_settings
+    def test_build_jobs_zipfile_of_previous_build(self):
+
+        self.create_sources()
+        report = self.release_builder._create_build_jobs_zipfile()
+        self.assertEqual(report['reused'], 0)
+
+        # the next build deletes the builder path and has a new build number
+        self.meta_app.build_number = 2
+        self.meta_app.save()
+
+        self.release_builder._keep_previous_archives()
+        self.release_builder.deletecreate_folder(self.release_builder._app_builder_path)
+        self.assertTrue(os.path.isfile(self.release_builder._previous_build_jobs_zipfile_filepath))
+
+        self.create_sources()
+        report = self.release_builder._create_build_jobs_zipfile()
+        self.assertEqual(report['reused'], 1)
+
+        with zipfile.ZipFile(self.release_builder._build_jobs_zipfile_filepath, 'r') as zip_file:
+            self.assertEqual(zip_file.read('www/index.html'), b'<html></html>' * 100)
@@ -2,6 +2,8 @@ import pstats
 from django_tenants.test.cases import TenantTestCase
 from django.test import RequestFactory
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from django.contrib.contenttypes.models import ContentType
 
@@ -34,7 +36,7 @@ from taxonomy.lazy import LazyTaxon
 
 from django.conf import settings
 
-import os
+import os, json
 
 TEST_PRIVATE_API_URL = 'http://localhost/private-api-test/'
 
@@ -765,6 +767,53 @@ class TestReleaseBuilder(WithPublicDomain, WithMetaApp, WithUser, WithMedia, Wit
         self.assertIn('Image is missing', result['warnings'][1].messages[0])
 
 
+    @test_settings
+    def test_validate_NatureGuide_inactive_branches_and_queries(self):
+
+        self.create_all_generic_contents(self.meta_app)
+
+        link = self.get_generic_content_link(NatureGuide)
+        nature_guide = link.generic_content
+
+        generic_form = self.get_generic_content_link(GenericForm).generic_content
+        link.options = {
+            'result_action' : self.meta_app.make_option_from_instance(generic_form),
+        }
+        link.save()
+
+        active_node = self.create_node(nature_guide.root_node, 'Active node')
+        self.create_node(active_node, 'Active result', **{'node_type':'result'})
+
+        inactive_node = self.create_node(nature_guide.root_node, 'Inactive node')
+        inactive_node.additional_data = {'is_active' : False}
+        inactive_node.save()
+
+        # empty groups in inactive branches are not reported
+        self.create_node(inactive_node, 'Empty group')
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.release_builder.validate_NatureGuide(nature_guide)
+
+        query_count = len(queries)
+
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(len(result['warnings']), 2)
+        self.assertEqual(set([str(warning.instance) for warning in result['warnings']]),
+                         set(['Active node', 'Active result']))
+
+        # the number of queries does not depend on the number of nodes
+        for counter in range(5):
+            group = self.create_node(active_node, 'Group {0}'.format(counter))
+            self.create_node(group, 'Result {0}'.format(counter), **{'node_type':'result'})
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.release_builder.validate_NatureGuide(nature_guide)
+
+        self.assertEqual(len(queries), query_count)
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(len(result['warnings']), 12)
+
+
     @test_settings
     def test_validate_TaxonProfiles(self):
         
@@ -845,6 +894,39 @@ class TestReleaseBuilder(WithPublicDomain, WithMetaApp, WithUser, WithMedia, Wit
     # tests for build processes
     ##########################################################################################
 
+    @test_settings
+    def test_write_locale_files(self):
+
+        locale = {
+            'Welcome' : 'Willkommen',
+            'taxon_text_Lacerta agilis' : 'Zauneidechse "agilis"',
+            'image' : {'content_image_id' : 1, 'mediaUrl' : {'regular' : 'a.webp'}},
+            'Umlaut' : '\u00e4\u00f6\u00fc',
+        }
+
+        folder = os.path.join(TESTS_ROOT, 'write_locale_files')
+        os.makedirs(folder, exist_ok=True)
+
+        complete_locale_filepath = os.path.join(folder, 'complete.json')
+        locale_filepath = os.path.join(folder, 'plain.json')
+
+        self.release_builder._write_locale_files(locale, complete_locale_filepath, locale_filepath)
+
+        with open(complete_locale_filepath, 'r') as complete_locale_file:
+            self.assertEqual(complete_locale_file.read(), json.dumps(locale))
+
+        reduced_locale = locale.copy()
+        del reduced_locale['taxon_text_Lacerta agilis']
+
+        with open(locale_filepath, 'r') as locale_file:
+            self.assertEqual(locale_file.read(), json.dumps(reduced_locale))
+
+        self.release_builder._write_locale_files({}, complete_locale_filepath, locale_filepath)
+
+        with open(locale_filepath, 'r') as locale_file:
+            self.assertEqual(json.loads(locale_file.read()), {})
+
+
     @test_settings
     def test_build(self):
 
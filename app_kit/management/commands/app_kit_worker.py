@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection, connections, close_old_connections
+
+from app_kit.app_kit_api.task_queue import get_worker_name, claim_task, run_task, requeue_stale_tasks
+
+import time, multiprocessing
+
+
+def run_worker(poll_interval, once):
+
+    worker_name = get_worker_name()
+
+    while True:
+
+        connection.set_schema_to_public()
+        task = claim_task(worker_name)
+
+        if task:
+            run_task(task)
+            close_old_connections()
+
+        elif once == True:
+            break
+
+        else:
+            time.sleep(poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run worker processes which execute the queued tasks of the app kit: validation, builds, previews and zip imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=getattr(settings, 'APP_KIT_WORKER_PROCESSES', 1),
+            help='Number of worker processes. Defaults to settings.APP_KIT_WORKER_PROCESSES or 1.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2,
+            help='Seconds to wait before checking the queue again if it is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit as soon as the queue is empty.',
+        )
+
+    def handle(self, *args, **options):
+
+        processes = options['processes']
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        connection.set_schema_to_public()
+
+        requeued, failed = requeue_stale_tasks()
+        if requeued:
+            self.stdout.write('Queued {0} tasks of terminated workers again'.format(len(requeued)))
+        if failed:
+            self.stdout.write('{0} tasks of terminated workers failed'.format(len(failed)))
+
+        if processes <= 1:
+            run_worker(poll_interval, once)
+            return
+
+        # forked workers must not inherit open database connections
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        workers = []
+
+        for index in range(processes):
+            worker = context.Process(target=run_worker, args=(poll_interval, once))
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import connection
+
+from django_tenants.utils import get_tenant_model
+
+from app_kit.models import MetaApp
+from app_kit.appbuilder.BuildBenchmark import (SyntheticAppGenerator, BuildBenchmark, DEFAULT_SIZES,
+    compare_results)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Time validate() and the build phases of the release builder on a synthetic app and store the results as json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', type=str, help='Schema name of the app kit (tenant).')
+        parser.add_argument('subdomain', type=str, help='Subdomain of the benchmark app.')
+        parser.add_argument(
+            '--generate',
+            action='store_true',
+            help='Create the synthetic app first. The subdomain must not exist yet.',
+        )
+
+        for size_name, default in DEFAULT_SIZES.items():
+            parser.add_argument(
+                '--{0}'.format(size_name.replace('_', '-')),
+                type=int,
+                default=default,
+                dest=size_name,
+                help='Used by --generate. Defaults to {0}.'.format(default),
+            )
+
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Run the complete build(), including the browser app and the platforms.',
+        )
+        parser.add_argument('--label', type=str, default=None, help='Stored with the result, e.g. a git revision.')
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Path of the result json. Defaults to {APP_KIT_ROOT}/benchmarks/{app uid}/{timestamp}.json.',
+        )
+        parser.add_argument('--compare', type=str, default=None, help='Path of a previous result json.')
+
+
+    def handle(self, *args, **options):
+
+        tenant = get_tenant_model().objects.filter(schema_name=options['schema_name']).first()
+        if not tenant:
+            raise CommandError('App kit {0} does not exist'.format(options['schema_name']))
+
+        connection.set_tenant(tenant)
+
+        subdomain = options['subdomain']
+
+        if options['generate']:
+
+            api_user_username = settings.APP_KIT_APIUSER_USERNAME
+            user = User.objects.filter(is_superuser=True).exclude(username=api_user_username).first()
+
+            sizes = dict([(size_name, options[size_name]) for size_name in DEFAULT_SIZES.keys()])
+
+            self.stdout.write('Generating app {0}: {1}'.format(subdomain, sizes))
+            generator = SyntheticAppGenerator(tenant, user, subdomain, sizes=sizes)
+            meta_app = generator.generate()
+
+        else:
+            meta_app = MetaApp.objects.filter(app__uid=subdomain).first()
+            if not meta_app:
+                raise CommandError('App {0} does not exist, use --generate'.format(subdomain))
+
+        benchmark = BuildBenchmark(meta_app, label=options['label'])
+        result = benchmark.run(full=options['full'])
+        filepath = benchmark.save(result, filepath=options['output'])
+
+        self.stdout.write('Sizes: {0}'.format(result['app']['sizes']))
+        self.stdout.write('Validation: {0}'.format(result['validation']))
+
+        for phase in result['phases']:
+            self.stdout.write('{0}{1}: {2}s, {3} queries'.format('  ' * phase['depth'], phase['name'],
+                phase.get('wall_time'), phase.get('queries')))
+
+        self.stdout.write('Total: {0}s, {1} queries'.format(result['wall_time'], result['queries']))
+        self.stdout.write('Result: {0}'.format(filepath))
+
+        if options['compare']:
+
+            previous_result = BuildBenchmark.load(options['compare'])
+
+            self.stdout.write('Compared to {0}:'.format(options['compare']))
+
+            for row in compare_results(previous_result, result):
+
+                change = '-'
+                if row['wall_time_change'] is not None:
+                    change = '{0:+.1f}%'.format(row['wall_time_change'] * 100)
+
+                self.stdout.write('{0}{1}: {2}s -> {3}s ({4}), {5} -> {6} queries'.format('  ' * row['depth'],
+                    row['name'], row['previous_wall_time'], row['wall_time'], change, row['previous_queries'],
+                    row['queries']))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from django_tenants.utils import get_tenant_model
+
+from app_kit.models import MetaApp
+from app_kit.appbuilder.BuildStorage import BuildStorage
+from app_kit.utils import format_bytes
+
+
+class Command(BaseCommand):
+    help = 'Remove old version folders and replace identical files of different app versions by hardlinks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema_name', type=str, help='Schema name of the app kit (tenant).')
+        parser.add_argument('--app', type=str, default=None, help='Subdomain of the app. Defaults to all apps.')
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=None,
+            help='Number of latest versions kept per app, the current and the published version are always kept. Defaults to settings.APP_KIT_KEEP_VERSIONS.',
+        )
+
+    def handle(self, *args, **options):
+
+        tenant = get_tenant_model().objects.filter(schema_name=options['schema_name']).first()
+        if not tenant:
+            raise CommandError('App kit {0} does not exist'.format(options['schema_name']))
+
+        connection.set_tenant(tenant)
+
+        meta_apps = MetaApp.objects.all().order_by('pk')
+
+        if options['app']:
+            meta_apps = meta_apps.filter(app__uid=options['app'])
+            if not meta_apps.exists():
+                raise CommandError('App {0} does not exist'.format(options['app']))
+
+        removed_bytes = 0
+        reclaimed_bytes = 0
+
+        for meta_app in meta_apps:
+
+            build_storage = BuildStorage(meta_app.get_release_builder(), keep_versions=options['keep'])
+            report = build_storage.maintain()
+
+            self.stdout.write('{0}: removed versions {1} ({2}), linked {3} of {4} files ({5})'.format(
+                meta_app.app.uid, report['removed_versions'], format_bytes(report['removed_bytes']),
+                report['linked'], report['files'], format_bytes(report['reclaimed_bytes'])))
+
+            removed_bytes += report['removed_bytes']
+            reclaimed_bytes += report['reclaimed_bytes']
+
+        self.stdout.write('Removed: {0}, deduplicated: {1}, total: {2}'.format(format_bytes(removed_bytes),
+            format_bytes(reclaimed_bytes), format_bytes(removed_bytes + reclaimed_bytes)))
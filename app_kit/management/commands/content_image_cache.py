@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from app_kit.appbuilder.ContentImageCache import ContentImageCache
+from app_kit.utils import format_bytes
+
+
+class Command(BaseCommand):
+    help = 'Report the size and the hit ratio of the shared content image cache, optionally evict entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Evict the least recently used entries until the cache fits into the byte budget.',
+        )
+        parser.add_argument(
+            '--max-bytes',
+            type=int,
+            default=None,
+            help='Byte budget used by --evict. Defaults to settings.APP_KIT_IMAGE_CACHE_MAX_BYTES.',
+        )
+
+    def handle(self, *args, **options):
+
+        cache = ContentImageCache()
+
+        if options['evict']:
+            eviction_report = cache.evict(max_bytes=options['max_bytes'])
+            cache.save_stats()
+            self.stdout.write('Evicted {0} entries, {1}'.format(eviction_report['evicted'],
+                format_bytes(eviction_report['evicted_bytes'])))
+
+        report = cache.get_report()
+
+        hit_ratio = '-'
+        if report['hit_ratio'] is not None:
+            hit_ratio = '{0:.1f}%'.format(report['hit_ratio'] * 100)
+
+        self.stdout.write('Cache path: {0}'.format(report['cache_path']))
+        self.stdout.write('Entries: {0}'.format(report['entries']))
+        self.stdout.write('Size: {0} of {1}'.format(format_bytes(report['size']),
+            format_bytes(report['max_bytes'])))
+        self.stdout.write('Hits: {0}, misses: {1}, hit ratio: {2}'.format(report['hits'], report['misses'],
+            hit_ratio))
+        self.stdout.write('Writes: {0}'.format(report['writes']))
+        self.stdout.write('Evicted: {0} entries, {1}'.format(report['evicted'],
+            format_bytes(report['evicted_bytes'])))
@@ -247,7 +247,7 @@ class LazyTaxon(LazyTaxonBase):
             if language == meta_app.primary_language:
                 preferred_vernacular_name = primary_locale_vernacular_name
             else:
-                localization = self.meta_app.localizations.get(language, {})
+                localization = meta_app.localizations.get(language, {})
                 preferred_vernacular_name = localization.get(primary_locale_vernacular_name, None)
                 
         if not preferred_vernacular_name:
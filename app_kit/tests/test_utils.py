@@ -1,11 +1,12 @@
 from django_tenants.test.cases import TenantTestCase
+from django.test import TestCase
 
 from django.contrib.contenttypes.models import ContentType
 
 from app_kit.tests.common import test_settings
 from app_kit.tests.mixins import (WithMetaApp, WithUser)
 
-from app_kit.utils import get_generic_content_meta_app, get_content_instance_meta_app
+from app_kit.utils import get_generic_content_meta_app, get_content_instance_meta_app, format_bytes
 
 from app_kit.generic import AppContentTaxonomicRestriction
 from app_kit.models import MetaAppGenericContent
@@ -21,6 +22,15 @@ from app_kit.features.glossary.models import Glossary
 from taxonomy.models import TaxonomyModelRouter
 from taxonomy.lazy import LazyTaxon
 
+class TestFormatBytes(TestCase):
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(512), '512.0 B')
+        self.assertEqual(format_bytes(1536), '1.5 KB')
+        self.assertEqual(format_bytes(3 * 1024 ** 3), '3.0 GB')
+        self.assertEqual(format_bytes(2 * 1024 ** 4), '2.0 TB')
+
+
 class TestGetGenericContentMetaApp(WithMetaApp, WithUser, TenantTestCase):
     
     @test_settings
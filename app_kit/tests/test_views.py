@@ -3,6 +3,7 @@ from django_tenants.test.cases import TenantTestCase
 from django.contrib.contenttypes.models import ContentType
 
 from django.urls import reverse
+from django.db import connection
 
 from app_kit.tests.common import test_settings
 
@@ -28,6 +29,8 @@ from app_kit.forms import (CreateGenericContentForm, CreateAppForm, EditGenericC
                            GenericContentStatusForm)
 
 from app_kit.models import MetaApp, MetaAppGenericContent, ContentImage, LocalizedContentImage
+from app_kit.app_kit_api.models import AppKitTasks
+from app_kit.app_kit_api.task_queue import run_task
 from app_kit.features.nature_guides.models import NatureGuide
 from app_kit.features.backbonetaxonomy.models import BackboneTaxonomy
 from app_kit.features.generic_forms.models import GenericForm, GenericField, GenericFieldToGenericForm
@@ -939,10 +942,13 @@ class TestStartNewAppVersion(ViewTestMixin, WithAjaxAdminOnly, WithLoggedInUser,
     url_name = 'start_new_app_version'
     view_class = StartNewAppVersion
 
-    def tearDown(self):
-        super().tearDown()
-        # wait for thread to complete
-        time.sleep(10)
+    # the view only enqueues the task, run it like app_kit_worker does
+    def run_queued_tasks(self):
+        for task in AppKitTasks.objects.filter(status='queued'):
+            run_task(task)
+            self.assertEqual(task.status, 'success')
+
+        connection.set_tenant(self.tenant)
 
 
     def get_url_kwargs(self):
@@ -1004,6 +1010,9 @@ class TestStartNewAppVersion(ViewTestMixin, WithAjaxAdminOnly, WithLoggedInUser,
         self.assertEqual(response.status_code, 302) 
         self.assertIn('manage-app', response.url)
 
+        self.assertEqual(AppKitTasks.objects.filter(action='start_new_app_version').count(), 1)
+        self.run_queued_tasks()
+
         self.meta_app.refresh_from_db()
         self.assertEqual(self.meta_app.current_version, 2)
         self.assertEqual(self.meta_app.build_number, None)
@@ -1032,6 +1041,7 @@ class TestStartNewAppVersion(ViewTestMixin, WithAjaxAdminOnly, WithLoggedInUser,
         response = view.post(view.request, **view.kwargs)
         self.assertEqual(response.status_code, 302) 
         self.assertIn('manage-app', response.url)
+        self.run_queued_tasks()
 
         self.meta_app.refresh_from_db()
         self.assertEqual(self.meta_app.current_version, 2)
@@ -1041,6 +1051,7 @@ class TestStartNewAppVersion(ViewTestMixin, WithAjaxAdminOnly, WithLoggedInUser,
 
         self.meta_app.published_version = self.meta_app.current_version
         response = view.post(view.request, **view.kwargs)
+        self.run_queued_tasks()
         
         version_3_folder = appbuilder._app_version_root_path
         self.assertIn('version/3', version_3_folder)
@@ -78,6 +78,13 @@ def underscore_to_camelCase(string):
     under_pat = re.compile(r'_([a-z])')
     return under_pat.sub(lambda x: x.group(1).upper(), string)
 
+def format_bytes(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return '{0:.1f} {1}'.format(size, unit)
+        size = size / 1024
+    return '{0:.1f} TB'.format(size)
+
 
 '''
     given a model instance, check which app it belongs to
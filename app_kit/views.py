@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.shortcuts import redirect
-from django.views.generic import TemplateView, FormView
+from django.views.generic import TemplateView, FormView, View
 from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
@@ -8,9 +8,6 @@ from django.contrib.sites.shortcuts import get_current_site
 from django.utils.translation import gettext as _
 from django.views.decorators.csrf import csrf_exempt, requires_csrf_token
 
-# do not use connection.close in threads
-from django.db import close_old_connections
-
 from django.core import mail
 
 from .models import (MetaApp, MetaAppGenericContent, ImageStore, ContentImage, LocalizedContentImage,
@@ -28,8 +25,8 @@ from django_tenants.utils import get_tenant_domain_model
 Domain = get_tenant_domain_model()
 
 from app_kit.app_kit_api.models import AppKitJobs, AppKitStatus
+from app_kit.app_kit_api.task_queue import enqueue_task, get_open_task
 
-from app_kit.appbuilder import AppBuilder, AppPreviewBuilder
 from app_kit.appbuilder.ContentImageBuilder import ContentImageBuilder
 
 from .view_mixins import ViewClassMixin, MetaAppMixin, MetaAppFormLanguageMixin
@@ -47,8 +44,7 @@ from localcosmos_server.generic_views import AjaxDeleteView, ManageSeoParameters
 
 import deepl
 
-import traceback, threading
-from django.db import connection
+import traceback
 
 # activate permission rules
 from .permission_rules import *
@@ -206,24 +202,8 @@ class CreateApp(CreateGenericContent):
         self.created_content = meta_app
 
         # MetaApp and all required features have been created
-
-        def run_in_thread():
-            # threading resets the connection -> set to tenant
-            connection.set_tenant(self.request.tenant)
-
-            # create the version specific folder on disk
-            # fails if the version already exists
-            app_builder = AppBuilder(meta_app)
-            app_builder.create_app_version()
-
-            # create preview
-            app_preview_builder = AppPreviewBuilder(meta_app)
-            app_preview_builder.build()
-
-            close_old_connections()
-
-        thread = threading.Thread(target=run_in_thread)
-        thread.start()
+        # the version folder and the preview are created by manage.py app_kit_worker
+        enqueue_task(self.request.tenant, 'create_app_version', meta_app=meta_app)
         
         context = self.get_context_data(**self.kwargs)
         context['meta_app'] = self.created_content
@@ -837,6 +817,12 @@ class BuildApp(FormView):
 
         context['localcosmos_private'] = self.meta_app.get_global_option('localcosmos_private')
 
+        # set by CancelAppBuild
+        context['cancel_result'] = self.request.GET.get('cancel', None)
+
+        # queued or running validation or build of manage.py app_kit_worker
+        context['open_task'] = get_open_task(self.meta_app, ['validate', 'build'])
+
         # include review urls, if any present
         if not self.meta_app.published_version or self.meta_app.published_version != self.meta_app.current_version:
             context['aab_review_url'] = app_release_builder.aab_review_url(self.request)
@@ -884,22 +870,9 @@ class BuildApp(FormView):
                 release_result = app_release_builder.release()
             else:
                 return HttpResponseForbidden('Releasing requires payment')
-        else:
-
-            def run_in_thread():
-
-                # threading resets the connection -> set to tenant
-                connection.set_tenant(self.request.tenant)
-                
-                if action == 'validate':
-                    validation_result = app_release_builder.validate()
-                elif action == 'build':
-                    build_result = app_release_builder.build()
-
-                close_old_connections()
-
-            thread = threading.Thread(target=run_in_thread)
-            thread.start()
+        elif action in ['validate', 'build']:
+            # executed by manage.py app_kit_worker
+            enqueue_task(self.request.tenant, action, meta_app=self.meta_app)
             
 
         context = self.get_context_data(**self.kwargs)
@@ -908,6 +881,23 @@ class BuildApp(FormView):
 
         
 
+# a queued build is removed, the running build stops at the next check of the cancel flag,
+# see AppReleaseBuilder.cancel_build
+class CancelAppBuild(View):
+
+    def dispatch(self, request, *args, **kwargs):
+        self.meta_app = MetaApp.objects.get(pk=kwargs['meta_app_id'])
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+
+        app_release_builder = self.meta_app.get_release_builder()
+        cancel_result = app_release_builder.cancel_build()
+
+        url = reverse('build_app', kwargs={'meta_app_id' : self.meta_app.id})
+        return redirect('{0}?cancel={1}'.format(url, cancel_result or 'none'))
+
+
 class StartNewAppVersion(TemplateView):
 
     template_name = 'app_kit/start_new_app.html'
@@ -938,26 +928,12 @@ class StartNewAppVersion(TemplateView):
 
             self.meta_app.save()
 
-            def run_in_thread():
-                # threading resets the connection -> set to tenant
-                connection.set_tenant(self.request.tenant)
-
-                app_builder = self.meta_app.get_app_builder()
-                app_builder.create_app_version()
-
-
-                app_preview_builder = self.meta_app.get_preview_builder()
-                app_preview_builder.build()
-
-                delete_version = new_version - 2
-                while delete_version > 0:
-                    app_builder.delete_app_version(delete_version)
-                    delete_version = delete_version - 1
-
-                close_old_connections()
-                
-            thread = threading.Thread(target=run_in_thread)
-            thread.start()
+            # executed by manage.py app_kit_worker
+            parameters = {
+                'new_version' : new_version,
+            }
+            enqueue_task(self.request.tenant, 'start_new_app_version', meta_app=self.meta_app,
+                         parameters=parameters)
 
         
         content_type = ContentType.objects.get_for_model(self.meta_app)
@@ -1179,14 +1155,14 @@ class ManageContentImageMixin(MetaAppMixin, ContentImageViewMixin):
     def save_image(self, form):
         super().save_image(form)
 
-        # add to cache
+        # render into the shared image cache, the cache key contains the crop parameters and the features
         release_builder = self.meta_app.get_release_builder()
 
         cache_path = release_builder._app_content_images_cache_path
 
         content_image_builder = ContentImageBuilder(cache_path)
 
-        image_urls = content_image_builder.build_cached_images(self.content_image, force_build=True)
+        content_image_builder.build_cached_images(self.content_image)
 
     '''
         optionally, an image can have a taxon assigned
@@ -1512,54 +1488,20 @@ class ImportFromZip(MetaAppMixin, FormView):
             zip_file.extractall(unzip_path)
             
 
-        def run_in_thread():
-
-            # threading resets the connection -> set to tenant
-            connection.set_tenant(self.request.tenant)
-
-            self.generic_content.lock('zip_import')
-
-            try:
-                ignore_nonexistent_images = form.cleaned_data['ignore_nonexistent_images']
-                
-                # validate the zipfile, then import, maybe use threading in form_valid
-                zip_importer = self.generic_content.zip_import_class(self.request.user, self.generic_content,
-                                                                     unzip_path, ignore_nonexistent_images=ignore_nonexistent_images)
-                zip_is_valid = zip_importer.validate()
-
-                if zip_is_valid == True:
-                    zip_importer.import_generic_content()
-
-                # store errors in self.generic_content.messages
-                self.generic_content.messages['last_zip_import_errors'] = [str(error) for error in zip_importer.errors]
-
-                # unlock saves messages
-                self.generic_content.unlock()
-
-                # remove zipfile and unzipped
-                shutil.rmtree(unzip_path)
-                shutil.rmtree(zip_destination_dir)
-
-                close_old_connections()
-                
-            
-            except Exception as e:
-
-                self.generic_content.messages['last_zip_import_errors'] = [str(e)]
-
-                # unlock generic content
-                self.generic_content.unlock()
-
-                # remove zipfile and unzipped
-                shutil.rmtree(unzip_path)
-                shutil.rmtree(zip_destination_dir)
+        # locked until the import has finished
+        self.generic_content.lock('zip_import')
 
-                # send error email
-                raise e
+        # validation and import are executed by manage.py app_kit_worker
+        parameters = {
+            'content_type_id' : self.generic_content_type.id,
+            'generic_content_id' : self.generic_content.id,
+            'user_id' : self.request.user.id,
+            'unzip_path' : unzip_path,
+            'zip_destination_dir' : zip_destination_dir,
+            'ignore_nonexistent_images' : form.cleaned_data['ignore_nonexistent_images'],
+        }
 
-        # run validation and import in thread
-        thread = threading.Thread(target=run_in_thread)
-        thread.start()
+        enqueue_task(self.request.tenant, 'zip_import', meta_app=self.meta_app, parameters=parameters)
 
         context = self.get_context_data(**self.kwargs)
         context['form'] = form